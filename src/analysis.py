@@ -18,16 +18,24 @@ along with this program.  If not, see <http://www.gnu.org/licenses/>.
 
 
 import logging
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
 
 import numpy as np
 import scipy.signal as signal
-from numpy.lib.stride_tricks import as_strided
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.fft import next_fast_len, rfft
 
 from .params import ap_coeffs, fir_coeffs, kfilter_coeffs, channel_layouts_params
-from .utils import Steps, Timer
+from .utils import Steps, Timer, gcd
 
 log = logging.getLogger(__package__)
 
+# Samples per block for the filters that carry their state between blocks.
+BLOCK_SIZE = 2**16
+
 
 def rms(data, axis=0):
     return np.sqrt((data**2).mean(axis))
@@ -45,9 +53,7 @@ def db(a, b):
     return c
 
 
-def itu1770(data, fs, cl, gated=False):
-    nc = data.shape[0]
-    ns = data.shape[1]
+def channel_weights(cl, nc):
     # g array of Weightings for the individual audio channels, see itu1770 standard.
     g = np.array([1.0, 1.0, 1.0, 0.0, 1.41, 1.41, 1.0, 1.0]) # FL+FR+FC+LFE+BL+BR+FLC+FRC
     if cl in channel_layouts_params:
@@ -56,46 +62,108 @@ def itu1770(data, fs, cl, gated=False):
         # Guessing layout.
         g = np.array(channel_layouts_params['22.2'][0:nc])
 
-    g = g[0:nc].reshape(nc, 1)
-    b, a = kfilter_coeffs(fs)
-    data_k = signal.lfilter(b, a, data, 1)
+    return g[0:nc].reshape(nc, 1)
+
+
+def gated_loudness(z):
+    '''
+    Gated loudness from the channel weighted mean square of overlapping 400 ms blocks
+    '''
+    l = loudness(z)  # noqa
+    gamma_a = -70
+    j_a = np.flatnonzero(l > gamma_a)
+    gamma_r = loudness(z[j_a].mean()) - 10
+    j_r = np.flatnonzero(l > gamma_r)
+    l_kg = loudness(z[j_r].mean())
+    return l_kg
+
+
+def loudness(z):
+    with np.errstate(divide='ignore'):
+        return -0.691 + 10.0 * np.log10(z)
+
+
+class LoudnessIndex:
+    '''
+    Channel weighted energy of the K-filtered signal, summed per hop
+
+    The track is K-filtered once, block by block. The hop divides the
+    400 ms gate, its 100 ms step and the second, so every window of the
+    gated, momentary and short term loudness is a sum of whole hops.
+    '''
+
+    def __init__(self, fs, nc, cl):
+        self.fs = fs
+        self.g = channel_weights(cl, nc)
+        # Second order sections keep the filter accurate in single precision.
+        self.sos = signal.tf2sos(*kfilter_coeffs(fs))
+        self.zi = np.zeros((self.sos.shape[0], nc, 2))
+        self.ns_gate = int(fs * 0.4)
+        self.ns_step = int((1 - 0.75) * self.ns_gate)
+        self.hop = gcd(gcd(self.ns_gate, self.ns_step), fs)
+        self.rest = np.zeros(0, dtype=self.zi.dtype) # energy of the unfinished hop
+        self.energy = []
+
+    def update(self, data):
+        if self.zi.dtype != data.dtype:
+            # Filter in the precision of the data.
+            self.sos, self.zi, self.g = (x.astype(data.dtype) for x in (self.sos, self.zi, self.g))
+        data_k, self.zi = signal.sosfilt(self.sos, data, 1, zi=self.zi)
+        e = np.concatenate((self.rest, (self.g * data_k**2).sum(0)))
+        n = e.size - e.size % self.hop
+        self.energy.append(e[:n].reshape(-1, self.hop).sum(1, dtype=np.float64))
+        self.rest = e[n:].copy()
+
+    def windows(self, size, step, steps):
+        '''
+        Mean energy of steps windows of size samples, hopping step samples
+        '''
+        energy = np.concatenate(self.energy)
+        self.energy = [energy]
+        k = size // self.hop
+        if steps < 1 or energy.size < k:
+            return np.zeros(0)
+        return sliding_window_view(energy, k)[:: step // self.hop][:steps].sum(1) / size
+
+    def finish(self, ns):
+        fs = self.fs
+        z = self.windows(self.ns_gate, self.ns_step, int((ns - self.ns_gate) / self.ns_step) + 1)
+        l_kg = gated_loudness(z)
+        stl = loudness(self.windows(3 * fs, fs, int((ns - 3 * fs) / fs) + 1))
+        mtl = loudness(z)
+        return l_kg, stl, loudness_range(stl), mtl
+
+
+def itu1770(data, fs, cl, gated=False):
+    nc = data.shape[0]
+    ns = data.shape[1]
     if gated:
-        ns_gate = int(fs * 0.4)
-        ns_step = int((1 - 0.75) * ns_gate)
-        steps = int((ns - ns_gate) / (ns_step)) + 1
-        z = np.zeros((nc, steps), dtype=float)
-        for i in range(steps):
-            j = i * ns_step
-            z[:, i : i + 1] = (data_k[:, j : j + ns_gate] ** 2).mean(1, keepdims=True)
-        with np.errstate(divide='ignore'):
-            l = -0.691 + 10.0 * np.log10((g * z).sum(0))  # noqa
-        gamma_a = -70
-        j_a = np.flatnonzero(l > gamma_a)
-        gamma_r = (
-            -0.691
-            + 10.0 * np.log10((g * (np.take(z, j_a, 1).mean(1, keepdims=1))).sum())
-            - 10
-        )
-        j_r = np.flatnonzero(l > gamma_r)
-        l_kg = -0.691 + 10.0 * np.log10(
-            (g * (np.take(z, j_r, 1).mean(1, keepdims=1))).sum()
-        )
-        return l_kg
+        return ebu_r128(data, fs, ns, nc, cl)[0]
     else:
+        g = channel_weights(cl, nc)
+        b, a = kfilter_coeffs(fs)
+        data_k = signal.lfilter(b, a, data, 1)
         z = (data_k**2).mean(1, keepdims=1)
-        with np.errstate(divide='ignore'):
-            l_k = -0.691 + 10.0 * np.log10((g * z).sum())
-        return l_k
+        return loudness((g * z).sum())
 
 
-def peak_and_rms(data):
+def peak_and_rms(data, stats=None):
     '''
     Calculate peak and RMS per channel
     '''
-    data_rms = rms(data, 1)
-    data_total_rms = rms(data.reshape(1, -1), 1)
-    data_peak = np.abs(data).max(1)
+    if stats is None:
+        stats = block_stats(data, data.shape[1])
+    b_max, b_min, b_sumsq, n = stats
+    ns = n.sum()
+    sumsq = b_sumsq.sum(1)
+    data_rms = np.sqrt(sumsq / ns)
+    data_total_rms = np.sqrt(sumsq.sum(keepdims=True) / (ns * sumsq.size))
+    data_peak = np.maximum(b_max.max(1), -b_min.min(1))
+
+    return levels(data_peak, data_rms, data_total_rms)
+
 
+def levels(data_peak, data_rms, data_total_rms):
     # Peak dBFS
     peak_dbfs = db(data_peak, 1.0)
 
@@ -109,70 +177,190 @@ def peak_and_rms(data):
     return data_peak, data_rms, peak_dbfs, rms_dbfs, crest_db, crest_total_db
 
 
-def loudest(data, fs, ns, nc, peaks):
+def loudest(data, fs, ns, nc, peaks, stats=None):
     '''
     Find loudest sample
     '''
+    if stats is None:
+        stats = block_stats(data, fs)
     window = fs // 50
     peak = peaks.max()
-    c_max, s_max, ns_cur, ns_max = 0, 0, 0, 0
-    for c in range(nc):
-        # Find the indices where the sample value
-        # is 95% of track peak value
-        peaks = np.flatnonzero(np.abs(data[c]) > 0.95 * peak)
-        if len(peaks) == 0:
-            continue
-        ns_cur = 0
-        it = np.nditer(peaks, flags=['buffered', 'c_index'], op_flags=['readonly'])
-        for s in it:
-            i = it.iterindex
-            # Count the number of samples (indices) within the window
-            ns_cur = (peaks[i : i + window] < s + window).sum()
-            if ns_cur > ns_max:
-                c_max = c
-                ns_max = ns_cur
-                s_max = s
+    # Find the indices where the sample value
+    # is 95% of track peak value, only in seconds that reach it
+    limit = 0.95 * peak
+    b_peak = np.maximum(stats[0], -stats[1])
+    candidates = [[np.zeros(0, dtype=np.intp)] for c in range(nc)]
+    for c, j in zip(*np.nonzero(b_peak > limit)):
+        i = j * fs
+        candidates[c].append(np.flatnonzero(np.abs(data[c, i : i + fs]) > limit) + i)
+    log.debug('Loudest: searched %d of %d seconds', np.count_nonzero(b_peak > limit), b_peak.size)
+    c_max, s_max, ns_max = loudest_search([np.concatenate(x) for x in candidates], window)
+
+    return c_max, s_max, ns_max, loudest_window(s_max, fs, ns)
+
+
+def loudest_search(candidates, window):
+    '''
+    Find the candidate with the most candidates following it within window
+    '''
+    # Shift every channel past the previous one, so a single sorted
+    # search over all channels never counts across them.
+    n = max((p[-1] for p in candidates if len(p)), default=0) + window + 1
+    channel = np.concatenate([np.full(len(p), c, dtype=np.intp) for c, p in enumerate(candidates)])
+    peaks = np.concatenate(candidates).astype(np.intp) + channel * n
+    if peaks.size == 0:
+        return 0, 0, 0
+    # Candidates are sorted, so the ones within the window of the next
+    # window candidates form a prefix of them.
+    ns_cur = np.minimum(np.searchsorted(peaks, peaks + window) - np.arange(peaks.size), window)
+    i = ns_cur.argmax()
+    c_max = int(channel[i])
+
+    return c_max, int(peaks[i] - c_max * n), int(ns_cur[i])
+
+
+def loudest_window(s_max, fs, ns):
     w_max = (s_max - fs // 20, s_max + fs // 20)
     if w_max[0] < 0:
         w_max = (0, fs // 10)
     if w_max[1] > ns:
         w_max = (ns - fs // 10, ns)
 
-    return c_max, s_max, ns_max, w_max
+    return w_max
 
 
-def true_peaks(data, fs, ns, nc, data_peak):
-    fir = fir_coeffs()
-    fir_phases, fir_size = fir.shape
-    d_size = data.itemsize
-    strides = ns - fir_size
-    true_peak = np.copy(data_peak)
-    steps = int((ns - 3 * fs) / fs) + 1
-    sttp = np.zeros((nc, steps))
-    for c in range(nc):
-        fir_strides = as_strided(
-            data[c], (strides, fir_size, 1), (d_size, d_size, d_size)
-        )
-        peaks = np.abs(np.dot(fir, fir_strides))
-        peak = peaks.max()
-        if peak > true_peak[c]:
-            true_peak[c] = peak
-        peaks_strided = as_strided(
-            peaks, (steps, fir_phases * 3 * fs), (fir_phases * fs, d_size)
-        )
-        sttp[c, :] = peaks_strided.max(1)
-    true_peak_dbtp = db(true_peak, 1.0)
+class TruePeakMeter:
+    '''
+    Oversampled peaks from the polyphase filter, block by block
+
+    The samples are cut into units of a tenth of a second (a second where
+    the rate does not allow it). The interpolated signal of a unit can
+    never exceed its sample peak times the largest sum of absolute taps of
+    a phase, so a unit is only oversampled when that bound could raise the
+    maximum of a 3 s window it belongs to, or the true peak of its channel.
+    Units stay buffered until their windows are decided, which keeps the
+    working set at a few seconds.
+    '''
 
-    return sttp, true_peak_dbtp
+    def __init__(self, fs, nc, oversampling=4):
+        self.fs = fs
+        self.nc = nc
+        self.fir = fir_coeffs(oversampling)
+        self.fir_size = self.fir.shape[1]
+        self.gain = np.abs(self.fir).sum(1).max()
+        self.units = 10 if fs % 10 == 0 else 1 # units per second
+        self.size = fs // self.units
+        self.rest = np.zeros((nc, 0))
+        self.segments = {} # samples of units still needed
+        self.bound = []
+        self.peak = [] # per unit, zero where not oversampled
+        self.done = [] # per unit, True where oversampled
+        self.w = 0 # next 3 s window to decide
+
+    def update(self, data):
+        if self.fir.dtype != data.dtype:
+            # Interpolate in the precision of the data.
+            self.fir = self.fir.astype(data.dtype)
+            self.rest = self.rest.astype(data.dtype)
+        x = np.concatenate((self.rest, data), 1)
+        i = 0
+        # One position less than the samples allow.
+        while x.shape[1] - i >= self.size + self.fir_size:
+            self.add_unit(x[:, i : i + self.size + self.fir_size - 1].copy())
+            i += self.size
+        self.rest = x[:, i:].copy()
+        while (self.w + 3) * self.units <= len(self.bound):
+            self.decide(self.w)
+            self.w += 1
+
+    def add_unit(self, segment):
+        self.segments[len(self.bound)] = segment
+        self.bound.append(self.gain * np.abs(segment).max(1))
+        self.peak.append(np.zeros(self.nc))
+        self.done.append(np.zeros(self.nc, dtype=bool))
+
+    def oversample(self, j, c):
+        windows = sliding_window_view(self.segments[j][c], self.fir_size)
+        # Maximum of all phases at each interpolated position.
+        self.peak[j][c] = np.abs(windows @ self.fir.T).max()
+        self.done[j][c] = True
+
+    def search(self, js, c, cur):
+        '''
+        Oversample the units js in order of their bound until no bound exceeds cur
+        '''
+        bound = np.array([self.bound[j][c] for j in js])
+        for k in np.argsort(-bound, kind='stable'):
+            if bound[k] <= cur:
+                break
+            j = js[k]
+            if not self.done[j][c]:
+                self.oversample(j, c)
+            cur = max(cur, self.peak[j][c])
+
+    def decide(self, w):
+        js = range(w * self.units, min((w + 3) * self.units, len(self.bound)))
+        for c in range(self.nc):
+            self.search(js, c, max(self.peak[j][c] for j in js))
+        # Later windows start after this one.
+        for j in range(w * self.units, (w + 1) * self.units):
+            self.segments.pop(j, None)
+
+    def finish(self, ns, data_peak):
+        fs = self.fs
+        n = ns - self.fir_size - len(self.bound) * self.size
+        if n > 0:
+            self.add_unit(self.rest[:, : n + self.fir_size - 1].copy())
+        steps = int((ns - 3 * fs) / fs) + 1
+        for w in range(self.w, steps):
+            self.decide(w)
+        # Units outside of any window only count for the true peak.
+        js = range((steps + 2) * self.units if steps > 0 else 0, len(self.bound))
+        for c in range(self.nc):
+            self.search(js, c, max([data_peak[c]] + [p[c] for p in self.peak]))
+        self.segments = {}
+
+        peak = np.array(self.peak).reshape(-1, self.nc)
+        done = np.array(self.done).reshape(-1, self.nc)
+        log.debug('True peak: oversampled %d of %d blocks', done.sum(), done.size)
+        pad = -len(peak) % self.units
+        m_1s = np.append(peak, np.zeros((pad, self.nc)), 0).reshape(-1, self.units, self.nc).max(1).T
+        if m_1s.shape[1] == 0:
+            m_1s = np.zeros((self.nc, 1))
+        sttp = np.zeros((self.nc, steps))
+        true_peak = np.maximum(data_peak, m_1s.max(1))
+        for c in range(self.nc):
+            sttp[c, :] = short_term_max(m_1s[c], steps)
+        return sttp, db(true_peak, 1.0)
+
+
+def true_peaks(data, fs, ns, nc, data_peak, oversampling=4):
+    meter = TruePeakMeter(fs, nc, oversampling)
+    for i in range(0, ns, BLOCK_SIZE):
+        meter.update(data[:, i : i + BLOCK_SIZE])
+
+    return meter.finish(ns, data_peak)
+
+
+def short_term_max(m_1s, steps):
+    '''
+    Maxima of 3 s windows, hopping 1 s, from 1 s maxima
+    '''
+    return np.maximum(np.maximum(m_1s[:steps], m_1s[1 : steps + 1]), m_1s[2 : steps + 2])
 
 
 def ebu_r128(data, fs, ns, nc, cl):
-    l_kg = itu1770(data, fs, cl, gated=True)
-    steps = int((ns - 3 * fs) / fs) + 1
-    stl = np.zeros(steps)
-    for i in range(steps):
-        j = i * fs
-        stl[i] = itu1770(data[:, j : j + 3 * fs], fs, cl, gated=False)
+    '''
+    Integrated, short term (3 s) and momentary (400 ms) loudness and LRA
+    '''
+    index = LoudnessIndex(fs, nc, cl)
+    for i in range(0, ns, BLOCK_SIZE):
+        index.update(data[:, i : i + BLOCK_SIZE])
+
+    return index.finish(ns)
+
+
+def loudness_range(stl):
     stl_abs = stl[stl >= -70.0]
     stl_power = (10.0 ** (stl_abs / 10.0)).mean()
     stl_int = 10 * np.log10(stl_power)
@@ -181,9 +369,8 @@ def ebu_r128(data, fs, ns, nc, cl):
     n_stl = stl_rel.size - 1
     stl_low = stl_rel_sort[int(round(n_stl * 0.1))]
     stl_high = stl_rel_sort[int(round(n_stl * 0.95))]
-    lra = stl_high - stl_low
 
-    return l_kg, stl, lra
+    return stl_high - stl_low
 
 
 def plr(true_peak_dbtp, l_kg, sttp, stl):
@@ -193,86 +380,229 @@ def plr(true_peak_dbtp, l_kg, sttp, stl):
     return plr_lu, stplr_lu
 
 
-def spectrum(data, fs, ns, nc, data_rms):
+def spectrum(data, fs, ns, nc, data_rms, workers=None):
     frames = ns // fs
+    n = next_fast_len(fs)
     wfunc = np.blackman(fs)
-    norm_spec = np.zeros((nc, fs))
-    for c in range(nc):
-        for i in np.arange(0, frames * fs, fs):
-            norm_spec[c] += (
-                np.abs(np.fft.fft(np.multiply(data[c, i : i + fs], wfunc), fs)) / fs
-            ) ** 2
-        norm_spec[c] = 20 * np.log10((np.sqrt(norm_spec[c] / frames)) / (data_rms[c]))
+    spec = np.zeros((nc, n // 2 + 1))
+    # 1 s frames of all channels, a batch at a time
+    batch = 16
+    for i in range(0, frames, batch):
+        j = min(i + batch, frames)
+        spec += power_spectrum(data[:, i * fs : j * fs].reshape(nc, -1, fs), wfunc, n, workers)
+
+    return norm_spectrum(spec, frames, fs, n, data_rms)
+
+
+def power_spectrum(frames, wfunc, n, workers=None):
+    '''
+    Power of windowed frames summed over the frame axis, non-negative half
 
-    return norm_spec
+    The FFTs run on up to workers threads, one per CPU by default.
+    '''
+    x = rfft(frames * wfunc.astype(frames.dtype, copy=False), n, workers=workers or -1)
+    return (x.real**2 + x.imag**2).sum(-2, dtype=np.float64)
+
+
+def norm_spectrum(spec, frames, fs, n, data_rms):
+    if n != fs:
+        # The renderers index the spectrum by frequency, in 1 Hz bins.
+        f = np.arange(fs // 2 + 1)
+        spec = np.array([np.interp(f, np.arange(n // 2 + 1) * fs / n, s) for s in spec])
+
+    return 20 * np.log10(np.sqrt(spec / fs**2 / frames) / data_rms.reshape(-1, 1))
+
+
+class AllpassBank:
+    '''
+    First order allpass filter bank, block by block
+
+    The bands are independent, so every block is filtered by all of them
+    on a thread pool (lfilter releases the GIL) and reduced to peak and
+    sum of squares right away.
+    '''
+
+    def __init__(self, fs, nc, workers=None):
+        self.ap_freqs = np.array([20, 60, 200, 600, 2000, 6000, 20000])
+        self.coeffs = [np.array(ap_coeffs(fc, fs)) for fc in self.ap_freqs]
+        self.zi = np.zeros((len(self.ap_freqs), nc, 1))
+        self.peak = np.full((len(self.ap_freqs), nc), -np.inf)
+        self.sumsq = np.zeros((len(self.ap_freqs), nc))
+        self.n = 0
+        self.pool = ThreadPoolExecutor(min(len(self.ap_freqs), workers or os.cpu_count() or 1))
+
+    def band(self, i, data):
+        b, a = self.coeffs[i]
+        y, self.zi[i] = signal.lfilter(b, a, data, 1, zi=self.zi[i])
+        self.peak[i] = np.maximum(self.peak[i], y.max(1))
+        self.sumsq[i] += np.einsum('ij,ij->i', y, y, dtype=np.float64)
+
+    def update(self, data):
+        if self.zi.dtype != data.dtype:
+            # Filter in the precision of the data.
+            self.coeffs = [x.astype(data.dtype) for x in self.coeffs]
+            self.zi = self.zi.astype(data.dtype)
+        bands = range(len(self.coeffs))
+        list(self.pool.map(self.band, bands, [data] * len(bands)))
+        self.n += data.shape[1]
 
+    def finish(self):
+        self.pool.shutdown()
+        ap_rms = np.sqrt(self.sumsq / self.n)
+        return self.ap_freqs, db(self.peak, ap_rms)
 
-def allpass(data, fs, ns, nc):
-    ap_freqs = np.array([20, 60, 200, 600, 2000, 6000, 20000])
-    ap_crest = np.zeros((len(ap_freqs), nc))
-    ap_rms = np.zeros((len(ap_freqs), nc))
-    ap_peak = np.zeros((len(ap_freqs), nc))
-    for i in range(len(ap_freqs)):
-        fc = ap_freqs[i]
-        b, a = ap_coeffs(fc, fs)
-        y = signal.lfilter(b, a, data, 1)
-        ap_peak[i] = y.max(1)
-        ap_rms[i] = rms(y, 1)
-        ap_crest[i] = db(ap_peak[i], ap_rms[i])
 
-    return ap_freqs, ap_crest
+def allpass(data, fs, ns, nc, workers=None):
+    bank = AllpassBank(fs, nc, workers)
+    for i in range(0, ns, BLOCK_SIZE):
+        bank.update(data[:, i : i + BLOCK_SIZE])
+
+    return bank.finish()
 
 
 def histogram(raw_data, bits, nc):
     hbits = bits
     if bits > 16:
         hbits = 18
-    hist = np.zeros((nc, 2**hbits))
-    hist_bins = np.zeros((nc, 2**hbits + 1))
+    hist = np.zeros((nc, 2**hbits), dtype=np.int64)
+    hist_bits = np.zeros(nc)
     for c in range(nc):
-        hist[c], hist_bins[c] = np.histogram(
-            raw_data[c],
-            bins=2**hbits,
-            range=(-(2.0 ** (bits - 1)), 2.0 ** (bits - 1) - 1),
-        )
-    hist_bits = np.log2((hist > 0).sum(1))
-    if bits > hbits:
-        # fake but counting 2**24 bins take way too long to be worth it
-        hist_bits *= bits / float(hbits)
+        hist[c] = sample_counts(raw_data[c], bits, hbits)
+        hist_bits[c] = effective_bits(*bit_usage(raw_data[c]))
 
     return hist, hist_bits
 
 
-def peak_vs_rms(data, fs, ns, nc):
+def sample_counts(x, bits, hbits):
+    '''
+    Histogram of integer samples in 2**hbits equal bins
+    '''
+    return np.bincount((x.astype(np.intp) + 2 ** (bits - 1)) >> (bits - hbits), minlength=2**hbits)
+
+
+def bit_usage(x):
+    '''
+    Highest magnitude bit and the union of all bits of integer samples
+    '''
+    return max(int(x.max()), ~int(x.min())).bit_length(), int(np.bitwise_or.reduce(x))
+
+
+def effective_bits(top, used):
+    '''
+    Bits from the lowest one ever set up to the highest, sign included
+    '''
+    if used == 0:
+        return 0.0
+    return float(top + 1 - ((used & -used).bit_length() - 1))
+
+
+def block_stats(data, size):
+    '''
+    Maximum, minimum and sum of squares per block of size samples
+
+    A partial block at the end is kept as the last block; n holds the
+    number of samples of every block.
+    '''
+    nc, ns = data.shape
+    k = ns // size
+    blocks = data[:, : k * size].reshape(nc, k, size)
+    b_max, b_min, b_sumsq = frame_stats(blocks)
+    n = np.full(k, size)
+    if ns > k * size:
+        tail = frame_stats(data[:, k * size :].reshape(nc, 1, -1))
+        b_max = np.append(b_max, tail[0], 1)
+        b_min = np.append(b_min, tail[1], 1)
+        b_sumsq = np.append(b_sumsq, tail[2], 1)
+        n = np.append(n, ns - k * size)
+
+    return b_max, b_min, b_sumsq, n
+
+
+def frame_stats(frames):
+    '''
+    Maximum, minimum and sum of squares over the last axis
+    '''
+    return frames.max(-1), frames.min(-1), np.einsum('...k,...k->...', frames, frames, dtype=np.float64)
+
+
+def merge_stats(stats, size, k):
+    '''
+    block_stats of k times longer blocks, from those of blocks of size samples
+    '''
+    b_max, b_min, b_sumsq, n = stats
+    full = np.count_nonzero(n == size) // k * k
+
+    def merge(x, reduce):
+        y = reduce(x[:, :full].reshape(x.shape[0], -1, k), 2)
+        if x.shape[1] > full:
+            y = np.append(y, reduce(x[:, full:], 1, keepdims=True), 1)
+        return y
+
+    return (
+        merge(b_max, np.max),
+        merge(b_min, np.min),
+        merge(b_sumsq, np.sum),
+        merge(n.reshape(1, -1), np.sum).ravel(),
+    )
+
+
+class Features:
+    '''
+    Intermediates shared by the metrics of a track, computed on first use
+
+    The squared and absolute signal are only ever needed reduced, so
+    the store keeps sums of squares and extremes per block instead of
+    full size copies.
+    '''
+
+    def __init__(self, data, fs, stats_1s=None):
+        self.data = data
+        self.fs = fs
+        self.cache = {}
+        self.lock = threading.RLock()
+        if stats_1s is not None:
+            self.cache[fs] = stats_1s
+
+    def stats(self, seconds=1):
+        '''
+        block_stats of blocks of whole seconds, longer ones merged from 1 s blocks
+        '''
+        size = seconds * self.fs
+        # Stages running side by side wait for the first to compute them.
+        with self.lock:
+            if size not in self.cache:
+                if seconds == 1:
+                    self.cache[size] = block_stats(self.data, size)
+                else:
+                    self.cache[size] = merge_stats(self.stats(), self.fs, seconds)
+            return self.cache[size]
+
+
+def peak_vs_rms(data, fs, ns, nc, stats=None):
+    if stats is None:
+        stats = block_stats(data, fs)
+    b_max, b_min, b_sumsq, n = stats
+    # Whole seconds only, a partial last second is left out.
     n_1s = ns // fs
-    peak_1s_dbfs = np.zeros((nc, n_1s))
-    rms_1s_dbfs = np.zeros((nc, n_1s))
-    crest_1s_db = np.zeros((nc, n_1s))
-    for c in range(nc):
-        for i in range(n_1s):
-            a = data[c, i * fs : (i + 1) * fs].max()
-            b = rms(data[c, i * fs : (i + 1) * fs])
-            peak_1s_dbfs[c][i] = db(a, 1.0)
-            rms_1s_dbfs[c][i] = db(b, 1.0)
-            crest_1s_db[c][i] = db(a, b)
-
-    return peak_1s_dbfs, rms_1s_dbfs, crest_1s_db
-
-
-def dynamic_range(data, fs, ns, nc):
-    dr_blocks = int(ns / (3.0 * fs))
-    dr_ns = dr_blocks * 3 * fs
-    dr_tail = ns - dr_ns
-    dr_data = data[:, :dr_ns].reshape(nc, -1, 3 * fs)
-    dr_rms = np.sqrt(2 * ((dr_data**2).mean(2)))
-    dr_peak = np.absolute(dr_data).max(2)
-    if dr_tail > 0:
-        dr_rms = np.append(
-            dr_rms, np.sqrt(2 * ((data[:, dr_ns:] ** 2).mean(1, keepdims=True))), 1
-        )
-        dr_peak = np.append(
-            dr_peak, np.absolute(data[:, dr_ns:]).max(1, keepdims=True), 1
-        )
+    a = b_max[:, :n_1s]
+    b = np.sqrt(b_sumsq[:, :n_1s] / fs)
+
+    return db(a, 1.0), db(b, 1.0), db(a, b)
+
+
+def dynamic_range(data, fs, ns, nc, stats=None):
+    '''
+    DR from 3 s blocks, the remainder making up the last block
+    '''
+    if stats is None:
+        stats = block_stats(data, 3 * fs)
+    b_max, b_min, b_sumsq, n = stats
+    dr_rms = np.sqrt(2 * b_sumsq / n)
+    dr_peak = np.maximum(b_max, -b_min)
+    return dr_from_blocks(dr_rms, dr_peak)
+
+
+def dr_from_blocks(dr_rms, dr_peak):
     dr_rms.sort()
     dr_peak.sort()
     dr_20 = int(round(dr_rms.shape[1] * 0.2))
@@ -298,10 +628,173 @@ def dynamic_range(data, fs, ns, nc):
 
 
 def energy_checksum(raw_data):
-    return (raw_data.astype('uint32') ** 2).sum()
+    checksum = np.uint64(0)
+    for i in range(0, raw_data.shape[1], BLOCK_SIZE):
+        checksum += (raw_data[:, i : i + BLOCK_SIZE].astype('uint32') ** 2).sum(dtype='uint64')
+    return checksum
+
+
+# Metrics analyze can calculate, with the metrics they depend on
+METRICS = {
+    'peak': (),
+    'loudest': ('peak',),
+    'true_peak': ('peak',),
+    'ebur128': (),
+    'plr': ('true_peak', 'ebur128'),
+    'spectrum': ('peak',),
+    'allpass': (),
+    'histogram': (),
+    'pvsr': (),
+    'dr': (),
+    'checksum': (),
+}
+
+# Fields of the analysis product, per metric
+FIELDS = {
+    'peak': ('crest_db', 'crest_total_db', 'rms_dbfs', 'peak_dbfs'),
+    'loudest': ('c_max', 'w_max', 's_max', 'ns_max'),
+    'true_peak': ('true_peak_dbtp',),
+    'ebur128': ('l_kg', 'stl', 'mtl', 'lra'),
+    'plr': ('plr_lu', 'stplr_lu'),
+    'spectrum': ('norm_spec',),
+    'allpass': ('ap_freqs', 'ap_crest'),
+    'histogram': ('hist', 'hist_bits'),
+    'pvsr': ('rms_1s_dbfs', 'peak_1s_dbfs', 'crest_1s_db'),
+    'dr': ('dr', 'dr_channels'),
+    'checksum': ('checksum',),
+}
+
+
+def resolve_metrics(metrics=None):
+    '''
+    The metrics asked for and all they depend on, every metric for None
+    '''
+    if metrics is None:
+        return set(METRICS)
+    needed = set()
+    todo = list(metrics)
+    while todo:
+        m = todo.pop()
+        if m not in METRICS:
+            raise ValueError('Unknown metric: %s' % m)
+        if m not in needed:
+            needed.add(m)
+            todo.extend(METRICS[m])
+    return needed
+
+
+def run_stages(stages, callback=None, workers=None):
+    '''
+    Run stages as soon as the METRICS they depend on are done
+
+    stages maps metric names to (description, Steps id, function). Each
+    stage is timed on its own; the chain of stages that bounds the wall
+    clock time, the critical path, is reported with the 'path' event.
+    '''
+    times = {}
+
+    def run(m):
+        desc, tid, func = stages[m]
+        with Timer(desc, tid, callback) as t:
+            func()
+        return t.start, t.end
+
+    start = time.time()
+    with ThreadPoolExecutor(workers or os.cpu_count() or 1) as pool:
+        running = {}
+        todo = dict(stages)
+        while todo or running:
+            for m in [m for m in todo if all(d in times for d in METRICS[m] if d in stages)]:
+                running[pool.submit(run, m)] = m
+                del todo[m]
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                times[running.pop(future)] = future.result()
+    wall = time.time() - start
+
+    # Walk back from the last stage to finish, through the dependency
+    # each stage waited for the longest.
+    path = []
+    m = max(times, key=lambda m: times[m][1], default=None)
+    while m is not None:
+        path.insert(0, m)
+        m = max((d for d in METRICS[m] if d in times), key=lambda d: times[d][1], default=None)
+    desc = ' > '.join(path)
+    secs = sum(times[m][1] - times[m][0] for m in path)
+    if callback:
+        callback('path', None, desc=desc, secs=secs)
+    else:
+        log.debug('Critical path %s: %7.1f ms of %7.1f ms', desc, secs * 1000, wall * 1000)
+    return times
+
+
+# Largest deviation of single from double precision results that
+# accuracy_report accepts, in the unit of each field
+TOLERANCES = {
+    'crest_db': 0.01,
+    'crest_total_db': 0.01,
+    'rms_dbfs': 0.01,
+    'peak_dbfs': 0.01,
+    'true_peak_dbtp': 0.01,
+    'c_max': 0,
+    's_max': 0,
+    'ns_max': 0,
+    'l_kg': 0.01,
+    'lra': 0.05,
+    'stl': 0.05,
+    'mtl': 0.05,
+    'plr_lu': 0.01,
+    'stplr_lu': 0.05,
+    'norm_spec': 0.1,
+    'ap_crest': 0.01,
+    'hist_bits': 0,
+    'rms_1s_dbfs': 0.01,
+    'peak_1s_dbfs': 0.01,
+    'crest_1s_db': 0.01,
+    'dr': 0.1,
+    'dr_channels': 0.02,
+    'checksum': 0,
+}
+
+
+def accuracy_report(track, metrics=None):
+    '''
+    Analyze a track in double and in single precision and compare
 
+    Returns (field, deviation, tolerance) tuples, the deviation being the
+    largest absolute difference. The spectrum is compared down to the
+    -90 dB floor of its plot.
+    '''
+    results = []
+    for dtype in (np.float64, np.float32):
+        t = dict(track)
+        t['data'] = {'fixed': track['data']['fixed'], 'float': track['data']['float'].astype(dtype)}
+        results.append(analyze(t, metrics=metrics))
+    a, b = results
+    report = []
+    for field, tolerance in TOLERANCES.items():
+        if a[field] is None or b[field] is None:
+            continue
+        x = np.asarray(a[field], dtype=np.float64)
+        y = np.asarray(b[field], dtype=np.float64)
+        if field == 'norm_spec':
+            y = y[x > -90]
+            x = x[x > -90]
+        with np.errstate(invalid='ignore'):
+            d = np.where(x == y, 0.0, np.abs(x - y))
+        report.append((field, float(d.max()) if d.size else 0.0, tolerance))
+    return report
+
+
+def analyze(track, callback=None, metrics=None, workers=None):
+    '''
+    Analyze a decoded track
 
-def analyze(track, callback=None):
+    Only the metrics given (and those they depend on) are calculated, all
+    of them by default. The fields of the others are None and listed in
+    'skipped'. Independent metrics run side by side on up to workers
+    threads, one per CPU by default.
+    '''
     data = track['data']['float']
     raw_data = track['data']['fixed']
     ns = track['samples']
@@ -313,6 +806,7 @@ def analyze(track, callback=None):
     name_ = track['metadata']['filename']
     enc = track['metadata']['encoding']
     bps = track['metadata']['bps']
+    needed = resolve_metrics(metrics)
 
     log.info("Processing %s", name_)
     log.debug(
@@ -330,91 +824,103 @@ def analyze(track, callback=None):
         bps,
     )
 
+    features = Features(data, fs)
+    # Analysis Product
+    result = {
+        # FIXME: frames and n_1s are used interchangeably to represent 1s segments of
+        #        samples which might not always be true and depends on what is analyzed
+        'frames': ns // fs,
+        'n_1s': ns // fs,
+        'skipped': [],
+    }
+    for m in METRICS:
+        result.update(dict.fromkeys(FIELDS[m]))
+        if m not in needed:
+            result['skipped'].extend(FIELDS[m])
+    # Intermediates passed from one stage to those depending on it
+    shared = {}
+
     # Peak / RMS
-    with Timer('Calculating peak and RMS...', Steps.calc_pr, callback):
+    def calc_peak():
         (
-            data_peak,
-            data_rms,
-            peak_dbfs,
-            rms_dbfs,
-            crest_db,
-            crest_total_db,
-        ) = peak_and_rms(data)
+            shared['data_peak'],
+            shared['data_rms'],
+            result['peak_dbfs'],
+            result['rms_dbfs'],
+            result['crest_db'],
+            result['crest_total_db'],
+        ) = peak_and_rms(data, features.stats())
 
     # Loudest
-    with Timer('Calculating loudest...', Steps.calc_loud, callback):
-        c_max, s_max, ns_max, w_max = loudest(data, fs, ns, nc, data_peak)
+    def calc_loudest():
+        (
+            result['c_max'],
+            result['s_max'],
+            result['ns_max'],
+            result['w_max'],
+        ) = loudest(data, fs, ns, nc, shared['data_peak'], features.stats())
 
     # True peaks
-    with Timer('Calculating true peaks...', Steps.calc_tp, callback):
-        sttp, true_peak_dbtp = true_peaks(data, fs, ns, nc, data_peak)
+    def calc_true_peak():
+        shared['sttp'], result['true_peak_dbtp'] = true_peaks(data, fs, ns, nc, shared['data_peak'])
 
     # EBU R.128
-    with Timer('Calculating EBU R 128...', Steps.calc_ebur128, callback):
-        l_kg, stl, lra = ebu_r128(data, fs, ns, nc, cl)
+    def calc_ebur128():
+        result['l_kg'], result['stl'], result['lra'], result['mtl'] = ebu_r128(data, fs, ns, nc, cl)
 
     # PLR
-    with Timer('Calculating PLR...', Steps.calc_plr, callback):
-        plr_lu, stplr_lu = plr(true_peak_dbtp, l_kg, sttp, stl)
+    def calc_plr():
+        result['plr_lu'], result['stplr_lu'] = plr(
+            result['true_peak_dbtp'], result['l_kg'], shared['sttp'], result['stl']
+        )
 
     # Spectrum
-    with Timer('Calculating spectrum...', Steps.calc_spec, callback):
-        norm_spec = spectrum(data, fs, ns, nc, data_rms)
+    def calc_spectrum():
+        result['norm_spec'] = spectrum(data, fs, ns, nc, shared['data_rms'], workers)
 
     # Allpass
-    with Timer('Calculating allpass...', Steps.calc_ap, callback):
-        ap_freqs, ap_crest = allpass(data, fs, ns, nc)
+    def calc_allpass():
+        result['ap_freqs'], result['ap_crest'] = allpass(data, fs, ns, nc, workers)
 
     # Histogram
-    with Timer('Calculating histogram...', Steps.calc_hist, callback):
-        hist, hist_bits = histogram(raw_data, bits, nc)
+    def calc_histogram():
+        result['hist'], result['hist_bits'] = histogram(raw_data, bits, nc)
 
     # Peak vs RMS
-    with Timer('Calculating peak vs RMS...', Steps.calc_pvsr, callback):
-        peak_1s_dbfs, rms_1s_dbfs, crest_1s_db = peak_vs_rms(data, fs, ns, nc)
+    def calc_pvsr():
+        (
+            result['peak_1s_dbfs'],
+            result['rms_1s_dbfs'],
+            result['crest_1s_db'],
+        ) = peak_vs_rms(data, fs, ns, nc, features.stats())
 
     # DR
-    with Timer('Calculating DR...', Steps.calc_dr, callback):
-        dr, dr_ch = dynamic_range(data, fs, ns, nc)
+    def calc_dr():
+        dr, dr_ch = dynamic_range(data, fs, ns, nc, features.stats(3))
         if dr == 0:
             dr = -1
             dr_channels = None
         else:
             dr = dr
             dr_channels = dr_ch
-
-    with Timer('Calculating checksum...', Steps.calc_csum, callback):
-        checksum = energy_checksum(raw_data)
-
-    # Analysis Product
-    return {
-        'crest_db': crest_db,
-        'crest_total_db': crest_total_db,
-        'rms_dbfs': rms_dbfs,
-        'peak_dbfs': peak_dbfs,
-        'true_peak_dbtp': true_peak_dbtp,
-        'c_max': c_max,
-        'w_max': w_max,
-        's_max': s_max,
-        'ns_max': ns_max,
-        'norm_spec': norm_spec,
-        # FIXME: frames and n_1s are used interchangeably to represent 1s segments of
-        #        samples which might not always be true and depends on what is analyzed
-        'frames': ns // fs,
-        'n_1s': ns // fs,
-        'ap_freqs': ap_freqs,
-        'ap_crest': ap_crest,
-        'hist': hist,
-        'hist_bits': hist_bits,
-        'rms_1s_dbfs': rms_1s_dbfs,
-        'peak_1s_dbfs': peak_1s_dbfs,
-        'crest_1s_db': crest_1s_db,
-        'checksum': checksum,
-        'l_kg': l_kg,
-        'stl': stl,
-        'lra': lra,
-        'dr': dr,
-        'dr_channels': dr_channels,
-        'plr_lu': plr_lu,
-        'stplr_lu': stplr_lu,
+        result['dr'], result['dr_channels'] = dr, dr_channels
+
+    def calc_checksum():
+        result['checksum'] = energy_checksum(raw_data)
+
+    stages = {
+        'peak': ('Calculating peak and RMS...', Steps.calc_pr, calc_peak),
+        'loudest': ('Calculating loudest...', Steps.calc_loud, calc_loudest),
+        'true_peak': ('Calculating true peaks...', Steps.calc_tp, calc_true_peak),
+        'ebur128': ('Calculating EBU R 128...', Steps.calc_ebur128, calc_ebur128),
+        'plr': ('Calculating PLR...', Steps.calc_plr, calc_plr),
+        'spectrum': ('Calculating spectrum...', Steps.calc_spec, calc_spectrum),
+        'allpass': ('Calculating allpass...', Steps.calc_ap, calc_allpass),
+        'histogram': ('Calculating histogram...', Steps.calc_hist, calc_histogram),
+        'pvsr': ('Calculating peak vs RMS...', Steps.calc_pvsr, calc_pvsr),
+        'dr': ('Calculating DR...', Steps.calc_dr, calc_dr),
+        'checksum': ('Calculating checksum...', Steps.calc_csum, calc_checksum),
     }
+    run_stages({m: stages[m] for m in METRICS if m in needed}, callback, workers)
+
+    return result
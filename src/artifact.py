@@ -0,0 +1,260 @@
+'''
+Copyright 2024 ITProjects
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Compact tracks, everything the renderers need without the PCM.
+
+A compact track is a track dict without 'data', with a min/max
+'waveform' pyramid and the 'loudest' part of the signal instead. Both
+renderers accept it, so drawing again takes the same time for any track
+length. save() and load() keep a compact track and its analysis in one
+file: a JSON header followed by the raw arrays, memory-mapped on load.
+rasterize() draws the waveform of overviews straight into an image.
+'''
+
+import json
+import logging
+import struct
+
+import numpy as np
+from matplotlib.colors import to_rgb
+
+log = logging.getLogger(__package__)
+
+MAGIC = b'MASVIS\x00\x01' # file type and format version
+ALIGN = 64 # bytes, start of every array in a file
+
+COLUMNS = 2**16 # blocks of the finest waveform level, at least
+MIN_COLUMNS = 1024 # blocks of the coarsest waveform level, at least
+COARSENING = 4 # blocks merged from one level to the next
+
+
+class Waveform:
+    '''
+    Min/max pyramid of the channels of a track, to draw them at any width
+
+    Level l holds the extremes of blocks of blocks[l] samples, a partial
+    block at the end included, as float32 arrays of shape (channels, n).
+    '''
+
+    def __init__(self, blocks, maxs, mins, samples):
+        self.blocks = blocks
+        self.maxs = maxs
+        self.mins = mins
+        self.samples = samples
+
+    @classmethod
+    def from_data(cls, data):
+        nc, ns = data.shape
+        block = finest_block(ns)
+        mx, mn = extremes(data, data, block)
+        return cls.from_extremes(block, mx, mn, ns)
+
+    @classmethod
+    def from_extremes(cls, block, mx, mn, samples):
+        '''
+        The pyramid over its finest level, the extremes of blocks of block samples
+        '''
+        blocks, maxs, mins = [block], [mx], [mn]
+        while mx.shape[1] > MIN_COLUMNS * COARSENING:
+            mx, mn = extremes(mx, mn, COARSENING)
+            block *= COARSENING
+            blocks.append(block)
+            maxs.append(mx)
+            mins.append(mn)
+        return cls(blocks, maxs, mins, samples)
+
+    def columns(self, c, n, span=None):
+        '''
+        Max and min of channel c in n equal columns of the samples in span
+
+        Interleaved max, min per column like pixelize(), from the coarsest
+        level with 8 blocks per column, or the finest one. Column edges are
+        rounded to whole blocks of that level.
+        '''
+        start, stop = span or (0, self.samples)
+        width = (stop - start) / n
+        level = 0
+        while level + 1 < len(self.blocks) and self.blocks[level + 1] * 8 <= width:
+            level += 1
+        block = self.blocks[level]
+        edges = np.round(np.linspace(start, stop, n + 1)).astype(np.intp) // block
+        first = edges[0]
+        last = max(-(-stop // block), first + 1)
+        mx = self.maxs[level][c, first:last]
+        mn = self.mins[level][c, first:last]
+        starts = np.minimum(edges[:-1] - first, mx.size - 1)
+        y = np.empty(2 * n)
+        y[0::2] = np.maximum.reduceat(mx, starts)
+        y[1::2] = np.minimum.reduceat(mn, starts)
+        return y
+
+
+def finest_block(ns):
+    '''
+    Samples per block of the finest level, for COLUMNS blocks of ns samples at least
+    '''
+    return 1 << max(0, (ns // COLUMNS).bit_length() - 1)
+
+
+def extremes(maxs, mins, size):
+    '''
+    Max of maxs and min of mins in blocks of size along the last axis
+    '''
+    nc, ns = maxs.shape
+    n = ns // size
+    mx = maxs[:, : n * size].reshape(nc, n, size).max(2)
+    mn = mins[:, : n * size].reshape(nc, n, size).min(2)
+    if ns % size:
+        mx = np.append(mx, maxs[:, n * size :].max(1, keepdims=True), 1)
+        mn = np.append(mn, mins[:, n * size :].min(1, keepdims=True), 1)
+    return mx.astype(np.float32), mn.astype(np.float32)
+
+
+def rasterize(waveform, w, h, colors, linewidth):
+    '''
+    RGBA image, w by h pixels, of the channels of a waveform over -1 to 1
+
+    Each column is filled from its min to its max, stretched to meet the
+    next columns and by half the line width, with antialiased ends. The
+    channels are multiplied onto white in integer arithmetic, so where
+    they overlap the colours mix like inks.
+    '''
+    rows = np.arange(h)[:, None]
+    pad = linewidth / 2.0
+    img = np.full((h, w, 3), 255, np.uint32)
+    for c, color in enumerate(colors):
+        y = waveform.columns(c, w)
+        mx, mn = y[0::2], y[1::2]
+        hi = np.maximum(mx, np.maximum(np.append(mn[1:], mn[-1]), np.append(mn[0], mn[:-1])))
+        lo = np.minimum(mn, np.minimum(np.append(mx[1:], mx[-1]), np.append(mx[0], mx[:-1])))
+        top = (1.0 - hi) * (h / 2.0) - pad
+        bottom = (1.0 - lo) * (h / 2.0) + pad
+        cover = np.clip(np.minimum(rows + 1, bottom) - np.maximum(rows, top), 0, 1)
+        alpha = np.round(cover * 255).astype(np.uint32)[:, :, None]
+        ink = np.round(np.array(to_rgb(color)) * 255).astype(np.uint32)
+        img = img * (255 * 255 - alpha * (255 - ink)) // (255 * 255)
+    rgba = np.full((h, w, 4), 255, np.uint8)
+    rgba[:, :, 0:3] = img
+    return rgba
+
+
+def compact(track, analysis):
+    '''
+    The compact form of a decoded track, compact tracks are returned as is
+    '''
+    if 'data' not in track:
+        return track
+    data = track['data']['float']
+    result = {k: v for k, v in track.items() if k != 'data'}
+    result['waveform'] = Waveform.from_data(data)
+    result['loudest'] = None
+    if analysis['c_max'] is not None:
+        result['loudest'] = np.array(data[analysis['c_max'], slice(*analysis['w_max'])])
+    return result
+
+
+def save(path, track, analysis):
+    '''
+    Write a compact track and its analysis to one file
+    '''
+    track = compact(track, analysis)
+    waveform = track['waveform']
+    arrays = {}
+    for l in range(len(waveform.blocks)):
+        arrays['waveform.max.%d' % l] = waveform.maxs[l]
+        arrays['waveform.min.%d' % l] = waveform.mins[l]
+    if track['loudest'] is not None:
+        arrays['loudest'] = track['loudest']
+    values = {}
+    for k, v in analysis.items():
+        if isinstance(v, np.ndarray):
+            arrays['analysis.' + k] = v
+        else:
+            values[k] = v
+    header = {
+        'track': {k: v for k, v in track.items() if k not in ('waveform', 'loudest')},
+        'analysis': values,
+        'tuples': [k for k, v in values.items() if isinstance(v, tuple)],
+        'waveform': {'blocks': waveform.blocks, 'samples': waveform.samples},
+        'arrays': {},
+    }
+    offset = 0
+    for name, a in arrays.items():
+        header['arrays'][name] = (a.dtype.str, a.shape, offset)
+        offset += aligned(a.nbytes)
+    header = json.dumps(header, default=to_json).encode()
+    start = aligned(len(MAGIC) + 8 + len(header))
+    with open(path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<Q', len(header)))
+        f.write(header)
+        for a in arrays.values():
+            f.seek(aligned(f.tell() - start) + start)
+            f.write(np.ascontiguousarray(a).tobytes())
+        f.truncate(start + offset)
+
+
+def load(path, mmap=True):
+    '''
+    Read a file from save(), returns (track, analysis)
+
+    The arrays are read-only views of a memory map of the file, or of
+    a copy in memory without mmap.
+    '''
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError('Not a MasVisGtk analysis file: %s' % path)
+        (n,) = struct.unpack('<Q', f.read(8))
+        header = json.loads(f.read(n))
+    start = aligned(len(MAGIC) + 8 + n)
+    if mmap:
+        buf = np.memmap(path, dtype=np.uint8, mode='r')
+    else:
+        buf = np.fromfile(path, dtype=np.uint8)
+    arrays = {}
+    for name, (dtype, shape, offset) in header['arrays'].items():
+        dtype = np.dtype(dtype)
+        size = dtype.itemsize * int(np.prod(shape))
+        arrays[name] = buf[start + offset : start + offset + size].view(dtype).reshape(shape)
+
+    analysis = header['analysis']
+    for k in header['tuples']:
+        analysis[k] = tuple(analysis[k])
+    for name, a in arrays.items():
+        if name.startswith('analysis.'):
+            analysis[name[len('analysis.') :]] = a
+    track = header['track']
+    levels = range(len(header['waveform']['blocks']))
+    track['waveform'] = Waveform(
+        header['waveform']['blocks'],
+        [arrays['waveform.max.%d' % l] for l in levels],
+        [arrays['waveform.min.%d' % l] for l in levels],
+        header['waveform']['samples'],
+    )
+    track['loudest'] = arrays.get('loudest')
+    return track, analysis
+
+
+def aligned(n):
+    return -(-n // ALIGN) * ALIGN
+
+
+def to_json(x):
+    if isinstance(x, np.integer):
+        return int(x)
+    if isinstance(x, np.floating):
+        return float(x)
+    raise TypeError('Cannot store %r' % (x,))
@@ -51,8 +51,19 @@ The content of this file was originally taken from the post:
 discourse.gnome.org/t/how-do-you-run-a-blocking-method-asynchronously-with-gio-task-in-a-python-gtk-app/10651
 '''
 
+import collections
+import logging
+import threading
+import time
+
 import gi
-from gi.repository import Gio, GObject
+from gi.repository import Gio, GLib, GObject
+
+log = logging.getLogger(__package__)
+
+# Main loop time per idle callback, in seconds. Well below the 16.7 ms
+# of a 60 Hz frame, so GTK still gets to paint between slices.
+FRAME_BUDGET = 0.008
 
 class AsyncWorker(GObject.Object):
 
@@ -159,3 +170,47 @@ class AsyncWorker(GObject.Object):
             value = {'AsyncWorkerError': error}
 
         return value
+
+
+class IdleQueue:
+    '''
+    Run jobs on the main loop, in idle callback slices of about BUDGET seconds.
+
+    Jobs are generators, added from any thread with add(), and run in the
+    order they were added. Each yield ends a slice of work; a slice is
+    never interrupted, so jobs should yield between expensive steps.
+    '''
+
+    def __init__(self, budget=FRAME_BUDGET):
+        self.budget = budget
+        self.jobs = collections.deque()
+        self.lock = threading.Lock()
+        self.source = None
+
+    def add(self, job, *args):
+        '''
+        Queue job(*args), which must be a generator function
+        '''
+        with self.lock:
+            self.jobs.append(job(*args))
+            if self.source is None:
+                self.source = GLib.idle_add(self.run)
+
+    def run(self):
+        start = time.monotonic()
+        while time.monotonic() - start < self.budget:
+            with self.lock:
+                if not self.jobs:
+                    self.source = None
+                    return GLib.SOURCE_REMOVE
+                job = self.jobs[0]
+            try:
+                next(job)
+            except StopIteration:
+                with self.lock:
+                    self.jobs.popleft()
+            except Exception as e:
+                log.warning(f'Idle job failed: {e}')
+                with self.lock:
+                    self.jobs.popleft()
+        return GLib.SOURCE_CONTINUE
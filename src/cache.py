@@ -0,0 +1,203 @@
+'''
+Copyright 2024 ITProjects
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+On-disk cache of analysis results.
+
+Compact tracks with their analysis (see artifact.py) are kept as files
+next to one SQLite index, keyed by the real path of the audio file and
+checked against its size, mtime and, optionally, a hash of its content.
+Entries written by other analysis code are ignored, and the least
+recently used ones are evicted beyond a size limit. Only complete
+analyses are stored, so one limited to some metrics never replaces a
+full one.
+
+An entry takes about 3 MB for a 4 minute stereo track at 44.1 kHz,
+mostly the waveform pyramid and the sample histogram, so the default
+size holds some 300 such tracks.
+'''
+
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from . import __version__
+from .analysis import FIELDS, resolve_metrics
+from .artifact import load, save
+
+log = logging.getLogger(__package__)
+
+MAX_BYTES = 1024 * 2**20 # default cache size
+
+# Modules whose code decides the analysis results.
+VERSIONED = ('analysis.py', 'stream.py', 'params.py', 'input.py', 'artifact.py')
+
+
+def code_version():
+    '''
+    Stamp of the analysis code, changes with any edit of it
+    '''
+    h = hashlib.sha1(__version__.encode())
+    for name in VERSIONED:
+        with open(os.path.join(os.path.dirname(__file__), name), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+
+def default_path():
+    cache_dir = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(cache_dir, 'masvisgtk', 'analysis', 'index.sqlite')
+
+
+def file_hash(infile):
+    h = hashlib.sha1()
+    with open(infile, 'rb') as f:
+        for block in iter(lambda: f.read(2**20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class AnalysisCache:
+    '''
+    Cache of analyze() results, safe to share between threads and processes
+
+    Every call opens its own connection, so instances hold no state but
+    their settings and can be pickled. With verify, a content hash of
+    the file is stored and checked on every lookup as well.
+    '''
+
+    def __init__(self, path=None, max_bytes=MAX_BYTES, verify=False):
+        self.path = path or default_path()
+        self.max_bytes = max_bytes
+        self.verify = verify
+        self.version = code_version()
+
+    def connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute(
+            'CREATE TABLE IF NOT EXISTS artifacts ('
+            'path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, hash TEXT, '
+            'version TEXT, bytes INTEGER, used REAL, file TEXT)'
+        )
+        return db
+
+    def identity(self, infile):
+        st = os.stat(infile)
+        return os.path.realpath(infile), st.st_size, st.st_mtime_ns
+
+    def artifact(self, path):
+        name = hashlib.sha1(path.encode()).hexdigest() + '.masvis'
+        return os.path.join(os.path.dirname(self.path), name)
+
+    def get(self, infile, metrics=None):
+        '''
+        The cached compact (track, analysis) of infile, None unless still valid
+
+        Entries lacking any of the metrics asked for, all by default, are
+        no hit.
+        '''
+        fields = [f for m in resolve_metrics(metrics) for f in FIELDS[m]]
+        path, size, mtime = self.identity(infile)
+        db = self.connect()
+        try:
+            with db:
+                row = db.execute(
+                    'SELECT hash, file FROM artifacts '
+                    'WHERE path = ? AND size = ? AND mtime = ? AND version = ?',
+                    (path, size, mtime, self.version),
+                ).fetchone()
+                if row is None:
+                    return None
+                if self.verify and row[0] != file_hash(infile):
+                    return None
+                track, analysis = load(row[1])
+                if set(fields) & set(analysis['skipped']):
+                    return None
+                db.execute('UPDATE artifacts SET used = ? WHERE path = ?', (time.time(), path))
+        except (sqlite3.Error, ValueError, KeyError, OSError) as e:
+            log.warning('Analysis cache lookup failed: %s', e)
+            return None
+        finally:
+            db.close()
+        log.info('Using cached analysis of %s', infile)
+        return track, analysis
+
+    def put(self, infile, track, analysis):
+        '''
+        Store the analysis and compact track of infile, then evict beyond max_bytes
+
+        Analyses with skipped metrics are not stored.
+        '''
+        if analysis['skipped']:
+            return
+        path, size, mtime = self.identity(infile)
+        digest = file_hash(infile) if self.verify else None
+        file = self.artifact(path)
+        # Written aside and renamed, readers never see a partial file,
+        # and writers of the same file in other threads or processes
+        # each have their own.
+        part = '%s.%d.%d.part' % (file, os.getpid(), threading.get_ident())
+        db = self.connect()
+        try:
+            save(part, track, analysis)
+            os.replace(part, file)
+            with db:
+                db.execute(
+                    'INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                    (path, size, mtime, digest, self.version, os.path.getsize(file), time.time(), file),
+                )
+                self.evict(db)
+        except (sqlite3.Error, OSError) as e:
+            log.warning('Analysis cache update failed: %s', e)
+            try:
+                os.remove(part)
+            except OSError:
+                pass
+        finally:
+            db.close()
+
+    def evict(self, db):
+        '''
+        Drop entries of other analysis code and the least recently used ones
+        '''
+        rows = db.execute('SELECT path, file FROM artifacts WHERE version != ?', (self.version,)).fetchall()
+        for path, file in rows:
+            self.remove(db, path, file)
+        total = 0
+        rows = db.execute('SELECT path, bytes, file FROM artifacts ORDER BY used DESC').fetchall()
+        for path, nbytes, file in rows:
+            total += nbytes
+            if total > self.max_bytes:
+                self.remove(db, path, file)
+
+    def remove(self, db, path, file):
+        db.execute('DELETE FROM artifacts WHERE path = ?', (path,))
+        try:
+            os.remove(file)
+        except OSError:
+            pass
+
+    def clear(self):
+        db = self.connect()
+        try:
+            with db:
+                for path, file in db.execute('SELECT path, file FROM artifacts').fetchall():
+                    self.remove(db, path, file)
+        finally:
+            db.close()
@@ -0,0 +1,83 @@
+'''
+Copyright 2024 ITProjects
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Memory budget of the plot canvases of tabs.
+
+Tabs are rendered when first selected, and their live canvases are
+counted here in the order they were viewed. Beyond the budget, the
+least recently viewed ones give up their canvas for a compressed
+snapshot, and the oldest snapshots are dropped after them. The tabs
+themselves keep their compact analysis, to be drawn again at any time.
+'''
+
+import collections
+import logging
+
+log = logging.getLogger(__package__)
+
+
+class CanvasBudget:
+    '''
+    Bytes held by tabs, the least recently viewed ones released beyond max_bytes
+
+    release(tab) frees the canvas of a tab and returns the bytes of the
+    snapshot kept instead, 0 for none. drop(tab) frees that snapshot.
+    '''
+
+    def __init__(self, max_bytes, release, drop):
+        self.max_bytes = max_bytes
+        self.release = release
+        self.drop = drop
+        self.canvases = collections.OrderedDict() # tab: bytes, oldest view first
+        self.snapshots = collections.OrderedDict() # tab: bytes, oldest release first
+
+    def total(self):
+        return sum(self.canvases.values()) + sum(self.snapshots.values())
+
+    def viewed(self, tab, nbytes, *keep):
+        '''
+        A canvas of nbytes shows tab, the most recently viewed one now
+        '''
+        self.snapshots.pop(tab, None)
+        self.canvases[tab] = nbytes
+        self.canvases.move_to_end(tab)
+        self.trim(tab, *keep)
+
+    def remove(self, tab):
+        self.canvases.pop(tab, None)
+        self.snapshots.pop(tab, None)
+
+    def trim(self, *keep):
+        '''
+        Release canvases, then drop snapshots, of tabs not in keep until within max_bytes
+        '''
+        for tab in list(self.canvases):
+            if self.total() <= self.max_bytes:
+                return
+            if tab in keep:
+                continue
+            del self.canvases[tab]
+            kept = self.release(tab)
+            if kept:
+                self.snapshots[tab] = kept
+        for tab in list(self.snapshots):
+            if self.total() <= self.max_bytes:
+                return
+            if tab in keep:
+                continue
+            del self.snapshots[tab]
+            self.drop(tab)
+        log.debug('Tab canvases: %d, snapshots: %d, %d bytes', len(self.canvases), len(self.snapshots), self.total())
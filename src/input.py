@@ -23,6 +23,7 @@ import os
 import re
 import gc
 import subprocess
+import threading
 from os.path import basename
 from subprocess import CalledProcessError
 
@@ -34,17 +35,25 @@ log = logging.getLogger(__package__)
 
 ffprobe_bin = None # FFPROBE binary location
 ffmpeg_bin = None # FFMPEG binary location
-file_information = None # temporary metadata storage
 
+BLOCK_SIZE = 2**16 # samples per channel, when streaming
+STREAM_BYTES = 2**30 # decoded size of a track, above which it is streamed
 
-def load_file(infile, inbuffer=None):
-    convs = {
-        8: {'format': 's8', 'codec': 'pcm_s8', 'dtype': np.dtype('i1')},
-        16: {'format': 's16le', 'codec': 'pcm_s16le', 'dtype': np.dtype('<i2')},
-        24: {'format': 's32le', 'codec': 'pcm_s32le', 'dtype': np.dtype('<i4')},
-        32: {'format': 's32le', 'codec': 'pcm_s32le', 'dtype': np.dtype('<i4')},
-    }
+convs = {
+    8: {'format': 's8', 'codec': 'pcm_s8', 'dtype': np.dtype('i1')},
+    16: {'format': 's16le', 'codec': 'pcm_s16le', 'dtype': np.dtype('<i2')},
+    24: {'format': 's32le', 'codec': 'pcm_s32le', 'dtype': np.dtype('<i4')},
+    32: {'format': 's32le', 'codec': 'pcm_s32le', 'dtype': np.dtype('<i4')},
+}
+
+
+def probe_file(infile, inbuffer=None):
+    '''
+    Probe audio stream and metadata, without decoding
+    '''
     size = -1
+    ns = 0
+    sec = 0.0
     name = os.path.splitext(basename(infile))[0]
     ext = os.path.splitext(infile)[1][1:].strip().lower()
     fmt = None
@@ -101,11 +110,7 @@ def load_file(infile, inbuffer=None):
     probe = json.loads(output)
 
     # Parse and clarify json.
-    global file_information
-    file_information = []
-    print_values(probe)
-    output_save_txt = '\n'.join(file_information) # raw ffmpeg track metadata
-    file_information = []
+    output_save_txt = '\n'.join(print_values(probe)) # raw ffmpeg track metadata
 
     if 'streams' not in probe:
         log.warning("No streams found in %s", infile)
@@ -159,13 +164,45 @@ def load_file(infile, inbuffer=None):
         track = int(tags['track'].split('/')[0])
     if 'date' in tags:
         date = tags['date']
+    if not fmt:
+        fmt = ext
+    if artist and title:
+        name = '%s - %s' % (artist, title)
+    output = {
+        'samples': ns,
+        'samplerate': fs,
+        'channels': nc,
+        'channel_layout': cl,
+        'bitdepth': bits,
+        'duration': sec,
+        'format': fmt,
+        'metadata': {
+            'size': size,
+            'filename': basename(infile),
+            'extension': ext,
+            'encoding': enc,
+            'name': name,
+            'artist': artist,
+            'title': title,
+            'album': album,
+            'track': track,
+            'date': date,
+            'bps': bps,
+        },
+        'raw_meta': output_save_txt
+    }
+    return output
+
+
+def ffmpeg_command(infile, bits, start=None):
     conv = convs[bits]
-    log.info("Converting using ffmpeg")
-    command = [
+    seek = ['-ss', '%.6f' % start] if start else []
+    return [
         ffmpeg_bin,
         '-y',
+        *seek,
         '-i',
-        _infile,
+        infile,
         '-vn',
         '-f',
         conv['format'],
@@ -175,6 +212,33 @@ def load_file(infile, inbuffer=None):
         'bitexact',
         '-',
     ]
+
+
+def to_float(raw_data, bits, dtype='float'):
+    if bits == 24:
+        raw_data //= 2**8
+    data = raw_data.astype(dtype)
+    data /= 2 ** (bits - 1)
+    return data
+
+
+def load_file(infile, inbuffer=None, dtype='float'):
+    output = probe_file(infile, inbuffer)
+    if type(output) is int:
+        return output
+    return decode_file(output, infile, inbuffer, dtype)
+
+
+def decode_file(output, infile, inbuffer=None, dtype='float'):
+    '''
+    Decode a probed file whole, into output['data']
+    '''
+    fs = output['samplerate']
+    nc = output['channels']
+    bits = output['bitdepth']
+    conv = convs[bits]
+    log.info("Converting using ffmpeg")
+    command = ffmpeg_command('-' if inbuffer else infile, bits)
     try:
         ffmpeg = subprocess.Popen(
             command,
@@ -193,41 +257,118 @@ def load_file(infile, inbuffer=None):
     raw_data = raw_data.reshape((nc, -1), order='F').copy(order='C')
     log.debug(raw_data.shape)
     ns = raw_data[0].shape[0]
-    sec = ns / float(fs)
-    if bits == 24:
-        raw_data //= 2**8
-    data = raw_data.astype('float')
-    data /= 2 ** (bits - 1)
-    if not fmt:
-        fmt = ext
-    if artist and title:
-        name = '%s - %s' % (artist, title)
-    output = {
-        'data': {'fixed': raw_data, 'float': data},
-        'samples': ns,
-        'samplerate': fs,
-        'channels': nc,
-        'channel_layout': cl,
-        'bitdepth': bits,
-        'duration': sec,
-        'format': fmt,
-        'metadata': {
-            'size': size,
-            'filename': basename(infile),
-            'extension': ext,
-            'encoding': enc,
-            'name': name,
-            'artist': artist,
-            'title': title,
-            'album': album,
-            'track': track,
-            'date': date,
-            'bps': bps,
-        },
-        'raw_meta': output_save_txt
-    }
+    data = to_float(raw_data, bits, dtype)
+    output['data'] = {'fixed': raw_data, 'float': data}
+    output['samples'] = ns
+    output['duration'] = ns / float(fs)
+    return output
+
+
+def stream_file(infile, inbuffer=None, block_size=BLOCK_SIZE, dtype='float'):
+    '''
+    Probe file and decode it lazily, as blocks of block_size samples per channel
+
+    The returned track has a 'stream' generator instead of 'data', yielding
+    (fixed, float) arrays of shape (channels, samples). 'samples' and
+    'duration' are estimates until the stream is exhausted.
+    '''
+    output = probe_file(infile, inbuffer)
+    if type(output) is int:
+        return output
+    return decode_stream(output, infile, inbuffer, block_size, dtype)
+
+
+def decode_stream(output, infile, inbuffer=None, block_size=BLOCK_SIZE, dtype='float'):
+    '''
+    Decode a probed file lazily, see stream_file
+
+    output['window'](start, stop) decodes samples start to stop once more,
+    from a seek to start.
+    '''
+    nc = output['channels']
+    bits = output['bitdepth']
+    source = '-' if inbuffer else infile
+    output['stream'] = decode_blocks(source, inbuffer, nc, bits, block_size, dtype)
+
+    def window(start, stop):
+        blocks = decode_blocks(source, inbuffer, nc, bits, stop - start, dtype, start / output['samplerate'])
+        try:
+            return next(blocks, (None, None))[1]
+        finally:
+            blocks.close()
+
+    output['window'] = window
     return output
 
+
+def open_file(infile, dtype='float', stream=None):
+    '''
+    Probe file and decode it whole, or lazily for stream.analyze_stream
+
+    With stream None, only tracks larger than STREAM_BYTES decoded are
+    streamed.
+    '''
+    output = probe_file(infile)
+    if type(output) is int:
+        return output
+    if stream is None:
+        stream = decoded_bytes(output, dtype) > STREAM_BYTES
+    if stream:
+        return decode_stream(output, infile, dtype=dtype)
+    return decode_file(output, infile, dtype=dtype)
+
+
+def decoded_bytes(output, dtype='float'):
+    '''
+    Size of the fixed and float samples of a probed file, decoded whole
+    '''
+    samples = output['duration'] * output['samplerate'] * output['channels']
+    return int(samples * (4 + np.dtype(dtype).itemsize))
+
+
+def decode_blocks(infile, inbuffer, nc, bits, block_size, dtype='float', start=None):
+    conv = convs[bits]
+    frame_bytes = nc * conv['dtype'].itemsize
+    log.info("Streaming using ffmpeg")
+    ffmpeg = subprocess.Popen(
+        ffmpeg_command(infile, bits, start),
+        stdin=subprocess.PIPE if inbuffer else subprocess.DEVNULL,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    )
+    if inbuffer:
+        # Feed stdin from another thread, so the pipes cannot deadlock.
+        feeder = threading.Thread(target=feed_stdin, args=(ffmpeg.stdin, inbuffer), daemon=True)
+        feeder.start()
+    ended = False
+    try:
+        while True:
+            buf = ffmpeg.stdout.read(block_size * frame_bytes)
+            n = len(buf) // frame_bytes
+            if n == 0:
+                ended = True
+                break
+            raw_data = np.frombuffer(buf, dtype=conv['dtype'], count=n * nc)
+            raw_data = raw_data.reshape((nc, -1), order='F').copy(order='C')
+            yield raw_data, to_float(raw_data, bits, dtype)
+    finally:
+        # Left early, ffmpeg is stopped rather than failing on the pipe.
+        if not ended:
+            ffmpeg.kill()
+        ffmpeg.stdout.close()
+        if ffmpeg.wait() > 0 and ended:
+            log.warning('Could not convert %s', infile)
+
+
+def feed_stdin(stdin, inbuffer):
+    try:
+        stdin.write(inbuffer)
+    except (BrokenPipeError, ValueError):
+        pass
+    finally:
+        stdin.close()
+
+
 def file_formats():
     foo = re.compile(r'\s+DE?\s+(\S+)\s+\S+')
     formats = []
@@ -247,15 +388,17 @@ def file_formats():
             formats.remove(foo)
     return formats
 
-# Format json audio file metadata.
-def print_values(obj, indent=0):
-    global file_information
+# Format json audio file metadata, as a list of lines.
+def print_values(obj, indent=0, lines=None):
+    if lines is None:
+        lines = []
     if isinstance(obj, dict):
         for key, value in obj.items():
-            file_information.append(' ' * indent + f'{key}:')
-            print_values(value, indent + 8)
+            lines.append(' ' * indent + f'{key}:')
+            print_values(value, indent + 8, lines)
     elif isinstance(obj, list):
         for item in obj:
-            print_values(item, indent)
+            print_values(item, indent, lines)
     else:
-        file_information.append(' ' * indent + str(obj))
+        lines.append(' ' * indent + str(obj))
+    return lines
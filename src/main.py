@@ -32,16 +32,35 @@ from gi.repository import Adw, Gtk, Gdk, Gio, GLib, Pango, GObject
 
 import locale
 import logging
+import threading
 import traceback
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from PIL import Image
 
 from . import __version__
 from .async_render import *
 from .main_gtk_window import *
 from .main_original import main_pymasvis # original module for cli
 from .analysis import analyze
-from .input import load_file
-from .output_gtk import list_styles, render, save_figure
-from .utils import Steps, Timer
+from .artifact import compact
+from .cache import AnalysisCache
+from .canvas_budget import CanvasBudget
+from .input import open_file
+from .output_gtk import (
+    RASTER_FORMATS,
+    attach,
+    figure_image,
+    forget_rows,
+    list_styles,
+    overview_figure,
+    release,
+    render,
+    save_figure,
+    snapshot,
+)
+from .stream import analyze_stream
+from .utils import SAVE_EFFORTS, Steps, Timer, save_image
 
 log = logging.getLogger('masvisgtk')
 lh = logging.StreamHandler(sys.stdout)
@@ -81,10 +100,14 @@ class MasVisGtk(Adw.Application):
     pref_custom_font_value = GObject.Property(type=str, default='FreeMono Bold 16')
     pref_open_other_files = GObject.Property(type=bool, default=False)
     pref_save_format = GObject.Property(type=int, default=0) # 0=png, 1=jpeg, 2=svg, 3=webp, 4=tiff, 5=pdf, 6=eps
+    pref_save_effort = GObject.Property(type=int, default=1) # 0=fast, 1=default, 2=small
     pref_dpi_application = GObject.Property(type=int, default=100)
     pref_dpi_image = GObject.Property(type=int, default=200)
     pref_comparison_plot_width = GObject.Property(type=int, default=606)
     pref_animation_duration = GObject.Property(type=int, default=3000)
+    pref_analysis_jobs = GObject.Property(type=int, default=2)
+    pref_analysis_cache_size = GObject.Property(type=int, default=1024)
+    pref_canvas_budget = GObject.Property(type=int, default=512)
 
     settings = None # holds Gio.Settings for schema
 
@@ -108,6 +131,9 @@ class MasVisGtk(Adw.Application):
 
         self.set_version(VERSION)
 
+        # Widget work from the processing thread, run on the main loop.
+        self.idle_queue = IdleQueue()
+
         # Override defaults with user preferences.
         self.settings = SETTINGS_in
 
@@ -120,12 +146,16 @@ class MasVisGtk(Adw.Application):
         self.pref_custom_font_value = self.settings.get_string('custom-font-value')
         self.pref_open_other_files = self.settings.get_boolean('open-other-files')
         self.pref_save_format = self.settings.get_enum('save-format')
+        self.pref_save_effort = self.settings.get_enum('save-effort')
         self.pref_dpi_application = self.settings.get_int('dpi-application')
         self.pref_dpi_image = self.settings.get_int('dpi-image')
         self.pref_comparison_plot_width = self.settings.get_int('comparison-plot-width')
         self.pref_animation_duration = self.settings.get_int('animation-duration')
+        self.pref_analysis_jobs = self.settings.get_int('analysis-jobs')
+        self.pref_analysis_cache_size = self.settings.get_int('analysis-cache-size')
+        self.pref_canvas_budget = self.settings.get_int('canvas-budget')
 
-        # app-style, save-format are not bound
+        # app-style, save-format, save-effort are not bound
         self.settings.bind('language-locale', self, 'pref_language_locale', Gio.SettingsBindFlags.DEFAULT)
         self.settings.bind('matplotlib-style', self, 'pref_matplotlib_style', Gio.SettingsBindFlags.DEFAULT)
         self.settings.bind('custom-background', self, 'pref_custom_background', Gio.SettingsBindFlags.DEFAULT)
@@ -137,6 +167,9 @@ class MasVisGtk(Adw.Application):
         self.settings.bind('dpi-image', self, 'pref_dpi_image', Gio.SettingsBindFlags.DEFAULT)
         self.settings.bind('comparison-plot-width', self, 'pref_comparison_plot_width', Gio.SettingsBindFlags.DEFAULT)
         self.settings.bind('animation-duration', self, 'pref_animation_duration', Gio.SettingsBindFlags.DEFAULT)
+        self.settings.bind('analysis-jobs', self, 'pref_analysis_jobs', Gio.SettingsBindFlags.DEFAULT)
+        self.settings.bind('analysis-cache-size', self, 'pref_analysis_cache_size', Gio.SettingsBindFlags.DEFAULT)
+        self.settings.bind('canvas-budget', self, 'pref_canvas_budget', Gio.SettingsBindFlags.DEFAULT)
 
         # Debug information.
         log.debug(f'schema language-locale: { self.pref_language_locale }')
@@ -148,10 +181,26 @@ class MasVisGtk(Adw.Application):
         log.debug(f'schema custom-font-value: { self.pref_custom_font_value }')
         log.debug(f'schema open-other-files: { self.pref_open_other_files }')
         log.debug(f'schema save-format: { self.pref_save_format }')
+        log.debug(f'schema save-effort: { self.pref_save_effort }')
         log.debug(f'schema dpi-application: { self.pref_dpi_application }')
         log.debug(f'schema dpi-image: { self.pref_dpi_image }')
         log.debug(f'schema comparison-plot-width: { self.pref_comparison_plot_width }')
         log.debug(f'schema animation-duration: { self.pref_animation_duration }')
+        log.debug(f'schema analysis-jobs: { self.pref_analysis_jobs }')
+        log.debug(f'schema analysis-cache-size: { self.pref_analysis_cache_size }')
+        log.debug(f'schema canvas-budget: { self.pref_canvas_budget }')
+
+        # Detailed tabs are drawn when selected, one at a time, and the
+        # least recently viewed ones released beyond the budget.
+        self.render_pool = ThreadPoolExecutor(1)
+        self.render_lock = threading.Lock() # pyplot is not thread safe
+        self.canvas_budget = CanvasBudget(
+            self.pref_canvas_budget * 2**20,
+            self.masvis_release_canvas,
+            self.masvis_drop_snapshot,
+        )
+        # Shared by the analysis threads, its code version stamped once.
+        self.analysis_cache = AnalysisCache(max_bytes=self.pref_analysis_cache_size * 2**20)
 
         # Set custom application language/locale.
         try:
@@ -579,17 +628,34 @@ class MasVisGtk(Adw.Application):
                 self.on_error_dialog(_('Permissions'), error)
                 return
 
-            pyplot_canvas = self.win.tab_view.get_selected_page().get_child().scrolled.get_child()
-            if pyplot_canvas == None:
-                return # Empty tab.
+            tabbox = self.win.tab_view.get_selected_page().get_child()
+            if tabbox.overview != None:
+                # Only the visible rows are drawn, all are drawn to save,
+                # on the render thread.
+                self.render_pool.submit(
+                    self.masvis_save_overview, list(tabbox.overview), save_file.get_path(), save_format
+                )
+                return
 
             # backend_gtk4agg.FigureCanvasGTK4Agg
-            pyplot_canvas = pyplot_canvas.get_child().get_last_child()
+            pyplot_canvas = tabbox.canvas
+            if pyplot_canvas == None:
+                return # Empty tab, or drawing.
 
-            save_figure(pyplot_canvas.figure, save_file.get_path(), save_format, self.pref_dpi_image)
+            save_figure(pyplot_canvas.figure, save_file.get_path(), save_format, self.pref_dpi_image, SAVE_EFFORTS[self.pref_save_effort])
         except GLib.GError:
             pass # Ignore cancel: 'gtk-dialog-error-quark: Dismissed by user'
 
+    def masvis_save_overview(self, rows, path, save_format):
+        try:
+            with self.render_lock:
+                figure = overview_figure(rows, self.win)
+                save_figure(figure, path, save_format, self.pref_dpi_image, SAVE_EFFORTS[self.pref_save_effort])
+                release(figure)
+        except Exception as e:
+            log.warning(f'{e}\n{path}\n{traceback.format_exc()}')
+            self.on_error_dialog(_('Save Error'), f'{e}\n{path}')
+
     def on_save_multiple_init(self):
         # Check we tabs exist.
         if self.win.tab_view.get_n_pages() < 1:
@@ -625,11 +691,25 @@ class MasVisGtk(Adw.Application):
             # Create folder for images.
             os.makedirs(future_folder)
 
+            # Collect the tabs here, widgets are only read on the main loop.
+            # Every tab is drawn offscreen into a figure of its own, live
+            # figures are left to GTK.
+            figures = []
+            for t in self.win.tab_view.get_pages():
+                tabbox = t.get_child()
+                if tabbox.overview != None:
+                    # Overview rows, drawn into one figure.
+                    figures.append((tabbox.a_file, None, list(tabbox.overview)))
+                elif getattr(tabbox.a_file, 'analyzed', None) != None:
+                    # At the width of its canvas, if drawn already.
+                    figures.append((tabbox.a_file, getattr(tabbox, 'canvas_width', 1080), None))
+
             # Begin saving plots asynchronously, not blocking UI.
             self.spinning_dialog()
+            self.spinbox.start(0, len(figures), '')
             self.ops_cancellable = Gio.Cancellable()
             # Pass as list, avoiding conversion of chars to args!
-            data = (future_folder, save_format)
+            data = (future_folder, save_format, figures)
             async_worker = AsyncWorker(
                 operation=self.on_save_multiple_async,
                 operation_inputs=data,
@@ -640,41 +720,66 @@ class MasVisGtk(Adw.Application):
         except GLib.GError:
             pass # Ignore cancel: 'gtk-dialog-error-quark: Dismissed by user'
 
-    def on_save_multiple_async(self, future_folder, save_format_int, *args):
+    def on_save_multiple_async(self, future_folder, save_format_int, figures, *args):
         # Get chosen format.
         save_format = self.on_parse_format(save_format_int)
-
-        # Write files.
-        n_th_file = 0
-        n_tabs = self.win.tab_view.get_n_pages()
-        for t in self.win.tab_view.get_pages():
-            pyplot_canvas = t.get_child().scrolled.get_child()
-            if pyplot_canvas == None:
-                continue # Empty tab.
-
-            # backend_gtk4agg.FigureCanvasGTK4Agg
-            pyplot_canvas = pyplot_canvas.get_child().get_last_child()
-
-            # Necessary to check width minimum.
-            # If less than 1080, figure is broken.
-            # Set plot page, and wait for plot to display.
-            if pyplot_canvas.figure.get_figwidth() * self.pref_dpi_application < 1080:
-                self.win.tab_view.set_selected_page(t)
-                time.sleep(2.0)
-
-            n_th_file += 1
-
-            # Go up, to get tabbox a_file.
-            a_file_name = t.get_child().scrolled.get_child().get_parent().get_parent().a_file.file_name
-            save_file = f'{n_th_file}. {a_file_name}'
-
-            if n_th_file == 1:
-                GLib.idle_add(self.spinbox.start, n_th_file, n_tabs, a_file_name)
-            else:
-                if self.spinbox != None:
-                    self.spinbox.set_label(n_th_file, n_tabs, a_file_name)
-
-            save_figure(pyplot_canvas.figure, f'{future_folder}/{save_file}.{save_format}', save_format, self.pref_dpi_image)
+        effort = SAVE_EFFORTS[self.pref_save_effort]
+        n_tabs = len(figures)
+        n_saved = 0
+        n_saved_lock = threading.Lock()
+
+        # Called from the pool threads as well.
+        def saved(a_file_name):
+            nonlocal n_saved
+            with n_saved_lock:
+                n_saved += 1
+                n = n_saved
+            if self.spinbox != None:
+                GLib.idle_add(self.spinbox.set_label, n, n_tabs, a_file_name)
+
+        # Figures are drawn one by one here, under the render lock as
+        # matplotlib is not thread safe, and encoded by a pool meanwhile.
+        # A few images wait at most.
+        jobs = max(1, self.pref_analysis_jobs)
+        pool = ThreadPoolExecutor(jobs)
+        pending = set()
+        try:
+            for n_th_file, (a_file, width, rows) in enumerate(figures, 1):
+                if self.check_cancellations():
+                    break
+                a_file_name = a_file.file_name
+                path = f'{future_folder}/{n_th_file}. {a_file_name}.{save_format}'
+                size = None
+                if rows != None:
+                    with self.render_lock:
+                        figure = overview_figure(rows, self.win)
+                else:
+                    plot = self.masvis_render_file(*a_file.analyzed, a_file.file_r128_unit, None)
+                    if plot == None:
+                        continue
+                    figure = plot['figure']
+                    width = width / self.pref_dpi_application
+                    size = (width, width / plot['aspect_ratio'])
+                if save_format not in RASTER_FORMATS:
+                    with self.render_lock:
+                        save_figure(figure, path, save_format, self.pref_dpi_image, effort, size)
+                        release(figure)
+                    saved(a_file_name)
+                else:
+                    while len(pending) >= 2 * jobs:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                    with self.render_lock:
+                        image = figure_image(figure, self.pref_dpi_image, size)
+                        release(figure)
+                    future = pool.submit(save_image, image, path, save_format, effort)
+                    future.add_done_callback(lambda f, name=a_file_name: saved(name))
+                    pending.add(future)
+            for future in pending:
+                future.result()
+        finally:
+            pool.shutdown(cancel_futures=True)
 
     def on_parse_format(self, save_format_int):
         match save_format_int:
@@ -796,6 +901,9 @@ class MasVisGtk(Adw.Application):
         obj.get_object('dropdown_format').set_selected(self.pref_save_format)
         obj.get_object('dropdown_format').connect('notify::selected', self.on_schema_changed_save_format)
 
+        obj.get_object('dropdown_effort').set_selected(self.pref_save_effort)
+        obj.get_object('dropdown_effort').connect('notify::selected', self.on_schema_changed_save_effort)
+
         obj.get_object('dpi_application').set_value(self.pref_dpi_application)
         obj.get_object('dpi_application').get_adjustment().connect('value-changed', self.on_schema_changed_dpi_application)
 
@@ -808,6 +916,15 @@ class MasVisGtk(Adw.Application):
         obj.get_object('animation_duration').set_value(self.pref_animation_duration)
         obj.get_object('animation_duration').get_adjustment().connect('value-changed', self.on_schema_changed_animation_duration)
 
+        obj.get_object('analysis_jobs').set_value(self.pref_analysis_jobs)
+        obj.get_object('analysis_jobs').get_adjustment().connect('value-changed', self.on_schema_changed_analysis_jobs)
+
+        obj.get_object('analysis_cache_size').set_value(self.pref_analysis_cache_size)
+        obj.get_object('analysis_cache_size').get_adjustment().connect('value-changed', self.on_schema_changed_analysis_cache_size)
+
+        obj.get_object('canvas_budget').set_value(self.pref_canvas_budget)
+        obj.get_object('canvas_budget').get_adjustment().connect('value-changed', self.on_schema_changed_canvas_budget)
+
     def on_schema_changed_language_locale(self, gtk_dropdown, param):
         value = self.language_dict[gtk_dropdown.get_selected_item().get_string()]
         self.settings.set_string('language-locale', value)
@@ -854,6 +971,11 @@ class MasVisGtk(Adw.Application):
         self.settings.set_enum('save-format', value)
         self.pref_save_format = value
 
+    def on_schema_changed_save_effort(self, gtk_dropdown, param):
+        value = gtk_dropdown.get_selected()
+        self.settings.set_enum('save-effort', value)
+        self.pref_save_effort = value
+
     def on_schema_changed_dpi_application(self, adw_spinrow):
         value = adw_spinrow.get_value()
         self.settings.set_int('dpi-application', value)
@@ -874,6 +996,25 @@ class MasVisGtk(Adw.Application):
         self.settings.set_int('animation-duration', value)
         self.pref_animation_duration = value
 
+    def on_schema_changed_analysis_jobs(self, adw_spinrow):
+        value = adw_spinrow.get_value()
+        self.settings.set_int('analysis-jobs', value)
+        self.pref_analysis_jobs = value
+
+    def on_schema_changed_analysis_cache_size(self, adw_spinrow):
+        value = adw_spinrow.get_value()
+        self.settings.set_int('analysis-cache-size', value)
+        self.pref_analysis_cache_size = value
+        self.analysis_cache.max_bytes = value * 2**20
+
+    def on_schema_changed_canvas_budget(self, adw_spinrow):
+        value = adw_spinrow.get_value()
+        self.settings.set_int('canvas-budget', value)
+        self.pref_canvas_budget = value
+        self.canvas_budget.max_bytes = value * 2**20
+        page = self.win.tab_view.get_selected_page()
+        self.canvas_budget.trim(page.get_child() if page else None)
+
     def rgba_to_text(self, rgba):
         r = int(rgba.red * 255)
         g = int(rgba.green * 255)
@@ -927,6 +1068,11 @@ class MasVisGtk(Adw.Application):
         return True
 
     def masvis_process(self, infiles, n_infiles, overview_mode, app):
+        infile = None
+        # Up to jobs files are decoded and analyzed at once, ahead of
+        # the one being rendered; rendering follows the tab order.
+        jobs = max(1, self.pref_analysis_jobs)
+        pool = ThreadPoolExecutor(jobs)
         try:
             dirs = []
             files = []
@@ -946,16 +1092,30 @@ class MasVisGtk(Adw.Application):
                 dirs = [f.file_parent_folder for f in files]
                 dirs = list(dict.fromkeys(dirs)) # remove duplicates
 
+            # Files in the order their plots are added.
+            queue = [
+                audio_file
+                for dir in dirs
+                for audio_file in files
+                if overview_mode != 'dir' or audio_file.file_parent_folder == dir
+            ]
+            # Share the CPUs between the files analyzed at once.
+            workers = max(1, (os.cpu_count() or 1) // jobs)
+            futures = [pool.submit(self.masvis_analyze_file, audio_file, workers) for audio_file in queue[:jobs]]
+
+            # Tabs are FileDetails here; their pages are only created,
+            # and plots attached, by jobs on the main loop.
             tab = None
             n_th_file = 0
+            select = True # the first detailed tab of these files
             for dir in dirs:
                 # Add new overview folder tab.
                 if overview_mode == 'dir':
-                    audio_folder = FileDetails(dir, os.path.basename(dir), '', self.r128_unit)
-                    tab = self.win.add_tab(audio_folder, 'dir')
+                    tab = FileDetails(dir, os.path.basename(dir), '', self.r128_unit)
+                    self.idle_queue.add(self.masvis_add_tab, tab, 'dir')
                 elif overview_mode == 'flat' and tab == None:
-                    audio_folder = FileDetails('', 'overview', '', self.r128_unit)
-                    tab = self.win.add_tab(audio_folder, 'flat')
+                    tab = FileDetails('', 'overview', '', self.r128_unit)
+                    self.idle_queue.add(self.masvis_add_tab, tab, 'flat')
 
                 # Start processing files.
                 for audio_file in files:
@@ -964,6 +1124,7 @@ class MasVisGtk(Adw.Application):
                         continue
 
                     n_th_file += 1
+                    infile = audio_file.file_path
 
                     if self.check_cancellations():
                         return
@@ -973,15 +1134,28 @@ class MasVisGtk(Adw.Application):
                     else:
                         GLib.idle_add(self.spinbox.set_label, n_th_file, n_infiles, audio_file.file_name)
 
-                    # Add new detailed tab.
+                    analyzed = futures[n_th_file - 1].result()
+                    futures[n_th_file - 1] = None # free RAM, once rendered
+                    if n_th_file - 1 + jobs < len(queue):
+                        futures.append(pool.submit(self.masvis_analyze_file, queue[n_th_file - 1 + jobs], workers))
+                    if analyzed == None or self.check_cancellations():
+                        continue
+
+                    # Add new detailed tab, drawn once selected.
                     if overview_mode == None:
-                        tab = self.win.add_tab(audio_file, None)
-                    log.debug('Opening file %s', infile)
-                    self.masvis_process_file(audio_file, self.r128_unit, overview_mode, tab)
+                        audio_file.analyzed = analyzed
+                        self.idle_queue.add(self.masvis_add_tab, audio_file, None, select)
+                        select = False
+                        continue
+                    log.debug('Rendering file %s', infile)
+                    plot = self.masvis_render_file(*analyzed, self.r128_unit, overview_mode)
+                    analyzed = None
+                    if plot == None:
+                        continue
+                    self.idle_queue.add(self.masvis_attach, tab, plot)
 
             # Remove attention/highlighting from selected (already visible) tab.
-            if self.win.tab_view.get_selected_page():
-                self.win.tab_view.get_selected_page().set_needs_attention(False)
+            self.idle_queue.add(self.masvis_done)
         except Exception as e:
             trace = traceback.format_exc()
             error = f'{e}\n{infile}\n{trace}'
@@ -991,37 +1165,49 @@ class MasVisGtk(Adw.Application):
 
             # Change spinning dialog for error.
             self.on_error_dialog(_('Opening File Error'), error)
-            error_label = Gtk.Label(
-                label='<span color="red" size="x-large" weight="bold">' + _('Errors in Processing!') + '</span>',
-                use_markup=True, hexpand=True, halign=Gtk.Align.CENTER, margin_start=15, margin_end=15, margin_top=15, margin_bottom=15
-            )
-            box = self.dialog_spinner.get_child()
-            box.append(error_label)
-
-    def masvis_process_file(self, audio_file, r128_unit, overview_mode=False, tab=None, attention=True):
+            GLib.idle_add(self.masvis_error_label)
+        finally:
+            # Analyses already running finish, queued ones are dropped.
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    # Decode and analyze one file, on a thread of the analysis pool.
+    # Returns (audio_file, track, analysis, header), None on failure.
+    def masvis_analyze_file(self, audio_file, workers=None):
         header = None
         loader = None
         loader_args = []
 
+        if self.check_cancellations():
+            return None
+
         if os.path.isfile(audio_file.file_path):
             log.debug('Selecting file loader')
-            loader = load_file # load_file function
+            loader = open_file # streams large files
             loader_args = [audio_file.file_path]
         else:
             log.warning(_('Unable to open input ') + audio_file.file_path)
             self.on_error_dialog(_('Cannot Open File'), audio_file.file_path)
-            return
-        track = loader(*loader_args)
+            return None
 
-        if type(track) is int:
-            return
+        # Reuse the analysis of files opened before, unless disabled.
+        cache = self.analysis_cache if self.pref_analysis_cache_size > 0 else None
+
+        # A cached compact track is drawn without decoding.
+        cached = cache.get(audio_file.file_path) if cache else None
+        if cached:
+            track, analysis = cached
+        else:
+            track = loader(*loader_args)
+
+            if type(track) is int:
+                return None
 
         # Minimum track duration => 3 seconds.
         if track['duration'] < 3:
             err_duration = _('The minimum file duration is 3 seconds.') + f'\n[{audio_file.file_path}]'
             log.warning(_('Unable to open input ') + f': {audio_file.file_path}')
             self.on_error_dialog(_('File Error'), err_duration)
-            return
+            return None
 
         # File output from FFMPEG.
         audio_file.track = track['raw_meta']
@@ -1029,29 +1215,208 @@ class MasVisGtk(Adw.Application):
         if not header:
             header = '%s' % (track['metadata']['name'])
 
-        with Timer('Running...', Steps.total, Steps.callback):
+        if not cached:
             with Timer('Analyzing...'):
-                analysis = analyze(track, callback=Steps.callback)
+                if 'stream' in track:
+                    analysis = analyze_stream(track, callback=Steps.callback, workers=workers)
+                else:
+                    analysis = analyze(track, callback=Steps.callback, workers=workers)
+            # Free the PCM, only the compact track is drawn.
+            track = compact(track, analysis)
+            if cache:
+                cache.put(audio_file.file_path, track, analysis)
+
+        return audio_file, track, analysis, header
+
+    # Prepare the figure of one file, off the main loop.
+    # Returns the plot for output_gtk.attach, None if cancelled.
+    def masvis_render_file(self, audio_file, track, analysis, header, r128_unit, overview_mode=False, cancelled=None):
+        with self.render_lock, Timer('Running...', Steps.total, Steps.callback):
             with Timer('Rendering...'):
-                # Main rendering on canvas.
-                render(
+                plot = render(
                     track,
                     analysis,
                     header,
                     r128_unit=r128_unit,
                     overview_mode=overview_mode,
                     callback=Steps.callback,
-                    tab_page=tab, # Gtk.Widget for plotted figure
                     win=self.win,
+                    cancelled=cancelled,
                 )
         Steps.report()
 
+        gc.collect() # free RAM
+        return plot
+
+    #
+    # Main loop jobs for self.idle_queue, each yield ends a time slice.
+    #
+
+    def masvis_add_tab(self, a_file, overview_mode, select=False):
+        a_file.page = self.win.add_tab(a_file, overview_mode)
+        if overview_mode == None:
+            if select:
+                self.win.tab_view.set_selected_page(a_file.page)
+            else:
+                a_file.page.set_needs_attention(True) # new tabs need attention
+        yield
+
+    def masvis_attach(self, a_file, plot):
+        tab = a_file.page
+        yield from attach(plot, tab, self.win)
+        if self.check_cancellations():
+            return
+
         # Required, otherwise risks low-resolution image, or not tab.
         self.win.tab_view.set_selected_page(tab)
         tab.set_needs_attention(True) # new tabs need attention
-        self.win.tab_view.connect_after("notify::selected-page", self.win.on_attention_changed)
+        yield
+
+    # Draw a selected detailed tab, unless its canvas is alive.
+    # A released canvas shows its snapshot meanwhile.
+    def masvis_tab_selected(self, tabbox):
+        analyzed = getattr(tabbox.a_file, 'analyzed', None)
+        if analyzed == None or tabbox.closed:
+            return # Overview, or not a file tab.
+        if tabbox.canvas != None:
+            self.canvas_budget.viewed(tabbox, self.masvis_canvas_bytes(tabbox))
+            return
+        if tabbox.rendering:
+            return
+        tabbox.rendering = True
+        if tabbox.snapshot != None:
+            self.win.show_snapshot(tabbox)
+        self.render_pool.submit(self.masvis_render_tab, tabbox, analyzed)
+
+    # Render one tab, on the thread of the render pool.
+    def masvis_render_tab(self, tabbox, analyzed):
+        plot = None
+        try:
+            log.debug('Rendering file %s', tabbox.a_file.file_path)
+            plot = self.masvis_render_file(
+                *analyzed, tabbox.a_file.file_r128_unit, None, cancelled=lambda: tabbox.closed
+            )
+        except Exception as e:
+            error = f'{e}\n{tabbox.a_file.file_path}\n{traceback.format_exc()}'
+            log.warning(error)
+            self.on_error_dialog(_('Opening File Error'), error)
+        self.idle_queue.add(self.masvis_attach_tab, tabbox, plot)
 
-        gc.collect() # free RAM
+    def masvis_attach_tab(self, tabbox, plot):
+        tabbox.rendering = False
+        if plot == None:
+            return
+        page = self.win.tab_view.get_page(tabbox) if not tabbox.closed else None
+        if page != None:
+            yield from attach(plot, page, self.win, lambda: tabbox.closed)
+        if tabbox.canvas == None: # closed meanwhile
+            self.render_pool.submit(self.masvis_release_figure, plot['figure'])
+            return
+        tabbox.snapshot = None
+
+        # The selected tab may be another one by now.
+        selected = self.win.tab_view.get_selected_page().get_child()
+        self.canvas_budget.viewed(tabbox, self.masvis_canvas_bytes(tabbox), selected)
+        self.win.on_tab_changed(self.win.tab_view, None)
+        yield
+
+    # Agg buffer and its texture, 4 bytes per pixel each.
+    def masvis_canvas_bytes(self, tabbox):
+        w = tabbox.canvas_width * self.win.get_scale_factor()
+        return int(w * (w / tabbox.aspect_ratio) * 4 * 2)
+
+    # Close a figure on the render thread, never waiting for the render
+    # lock on the main loop. Pyplot's figures are shared with the thread.
+    def masvis_release_figure(self, figure):
+        with self.render_lock:
+            release(figure)
+
+    # Called by the budget, returns the bytes of the snapshot kept.
+    def masvis_release_canvas(self, tabbox):
+        canvas = tabbox.canvas
+        tabbox.canvas = None
+        tabbox.snapshot = snapshot(canvas)
+        tabbox.scrolled.set_child(None)
+        self.render_pool.submit(self.masvis_release_figure, canvas.figure)
+        return len(tabbox.snapshot) if tabbox.snapshot else 0
+
+    def masvis_drop_snapshot(self, tabbox):
+        tabbox.snapshot = None
+
+    # Images of tabs for compare and animate, {tabbox: PIL image}.
+    # Live canvases are read here, other tabs are drawn offscreen on the
+    # render thread, then done(images) is called on the main loop.
+    def masvis_tab_images(self, tabboxes, done):
+        images = {}
+        offscreen = []
+        for tabbox in tabboxes:
+            try:
+                w, h = tabbox.canvas.get_width_height()
+                images[tabbox] = Image.frombytes('RGBA', (w, h), tabbox.canvas.buffer_rgba().tobytes())
+                continue
+            except AttributeError:
+                pass # No canvas, or not drawn yet.
+            if tabbox.overview != None:
+                offscreen.append((tabbox, list(tabbox.overview), None))
+            elif getattr(tabbox.a_file, 'analyzed', None) != None:
+                offscreen.append((tabbox, None, tabbox.a_file.analyzed))
+
+        def draw():
+            for tabbox, rows, analyzed in offscreen:
+                try:
+                    image = self.masvis_offscreen_image(tabbox, rows, analyzed)
+                    if image != None:
+                        images[tabbox] = image
+                except Exception as e:
+                    log.warning(f'{e}\n{tabbox.a_file.file_path}\n{traceback.format_exc()}')
+            GLib.idle_add(done, images)
+
+        self.render_pool.submit(draw)
+
+    # Draw a tab without its canvas, at the width it would be shown.
+    def masvis_offscreen_image(self, tabbox, rows, analyzed):
+        dpi = self.pref_dpi_application
+        size = None
+        if rows != None:
+            with self.render_lock:
+                figure = overview_figure(rows, self.win)
+        else:
+            plot = self.masvis_render_file(*analyzed, tabbox.a_file.file_r128_unit, None)
+            if plot == None:
+                return None
+            figure = plot['figure']
+            width = getattr(tabbox, 'canvas_width', 1080) / dpi
+            size = (width, width / plot['aspect_ratio'])
+        with self.render_lock:
+            try:
+                return figure_image(figure, dpi, size)
+            finally:
+                release(figure)
+
+    def masvis_tab_closed(self, tabbox):
+        tabbox.closed = True
+        self.canvas_budget.remove(tabbox)
+        if tabbox.canvas != None:
+            self.render_pool.submit(self.masvis_release_figure, tabbox.canvas.figure)
+            tabbox.canvas = None
+        tabbox.snapshot = None
+        tabbox.a_file.analyzed = None
+        if tabbox.overview != None:
+            forget_rows(tabbox.overview)
+
+    def masvis_done(self):
+        if self.win.tab_view.get_selected_page():
+            self.win.tab_view.get_selected_page().set_needs_attention(False)
+        yield
+
+    def masvis_error_label(self):
+        error_label = Gtk.Label(
+            label='<span color="red" size="x-large" weight="bold">' + _('Errors in Processing!') + '</span>',
+            use_markup=True, hexpand=True, halign=Gtk.Align.CENTER, margin_start=15, margin_end=15, margin_top=15, margin_bottom=15
+        )
+        box = self.dialog_spinner.get_child()
+        box.append(error_label)
+        return False
 
 def main(VERSION, SETTINGS_in):
     if len(sys.argv) > 1 and sys.argv[1] == '--pymasvis':
@@ -34,11 +34,11 @@ class StringPath(GObject.GObject):
     name = GObject.Property(type=str)
     path = GObject.Property(type=str)
 
-    def __init__(self, path, name, canvas=None, checked=None):
+    def __init__(self, path, name, tabbox=None, checked=None):
         super().__init__()
         self.path = path
         self.name = name
-        self.canvas = canvas # canvas
+        self.tabbox = tabbox # tab to draw
         self.checked = checked # enabled/disabled state
 
 class FileDetails:
@@ -300,6 +300,8 @@ class PyPlotWindow(Adw.ApplicationWindow):
         # Called after changes in selected pages,
         # to show or hide DR Meter and zoom widgets.
         self.tab_view.connect("notify::selected-page", self.on_tab_changed)
+        self.tab_view.connect_after("notify::selected-page", self.on_attention_changed)
+        self.tab_view.connect('close-page', self.on_close_page)
 
         box_tabs.append(self.tab_bar)
         box_tabs.append(self.tab_view)
@@ -320,6 +322,11 @@ class PyPlotWindow(Adw.ApplicationWindow):
         tabbox.scrolled = Gtk.ScrolledWindow(vexpand=True)
         tabbox.scrolled.set_policy(Gtk.PolicyType.AUTOMATIC, Gtk.PolicyType.AUTOMATIC)
         tabbox.append(tabbox.scrolled)
+        tabbox.canvas = None # detailed plot canvas, once drawn
+        tabbox.overview = None # Gio.ListStore of overview rows
+        tabbox.snapshot = None # PNG of a released canvas
+        tabbox.rendering = False
+        tabbox.closed = False
 
         page = self.tab_view.append(tabbox)
         page.tabbox = tabbox
@@ -343,7 +350,10 @@ class PyPlotWindow(Adw.ApplicationWindow):
                 page.set_needs_attention(False)
 
     def on_tab_changed(self, tab_view, item):
-        tabbox = tab_view.get_selected_page().get_child()
+        page = tab_view.get_selected_page()
+        if page == None:
+            return # Last tab closed.
+        tabbox = page.get_child()
 
         # Change DR Meter.
         self.dr_change(tabbox)
@@ -353,6 +363,23 @@ class PyPlotWindow(Adw.ApplicationWindow):
             self.int_zoom_scale = tabbox.canvas_width
             self.btn_zoom_indicator.set_label(str(self.int_zoom_scale))
 
+        # Detailed tabs are drawn once selected.
+        self.app.masvis_tab_selected(tabbox)
+
+    def on_close_page(self, tab_view, page):
+        self.app.masvis_tab_closed(page.get_child())
+        return False # closed by the default handler
+
+    # Picture of a released canvas, shown until it is drawn again.
+    def show_snapshot(self, tabbox):
+        texture = Gdk.Texture.new_from_bytes(GLib.Bytes.new(tabbox.snapshot))
+        picture = Gtk.Picture.new_for_paintable(texture)
+        picture.set_size_request(tabbox.canvas_width, tabbox.canvas_width//tabbox.aspect_ratio)
+        aspect_frame = Gtk.AspectFrame()
+        aspect_frame.set_ratio(tabbox.aspect_ratio)
+        aspect_frame.set_child(picture)
+        tabbox.scrolled.set_child(aspect_frame)
+
     # Set style light or dark.
     def dark_light_css(self, dark_or_light):
         if dark_or_light:
@@ -444,7 +471,7 @@ class PyPlotWindow(Adw.ApplicationWindow):
         page = self.tab_view.get_selected_page()
         if page != None:
             tabbox = page.get_child()
-            if tabbox and not tabbox.overview_or_detailed:
+            if tabbox and not tabbox.overview_or_detailed and tabbox.canvas != None:
                 # Direct towards specific option.
                 new_canvas_width = None
                 if which_option == 66: # Best fit zoom.
@@ -496,6 +523,9 @@ class PyPlotWindow(Adw.ApplicationWindow):
                     for yt in yticklabels_:
                         yt.set_fontsize(round(10.0 * scale_factor))
 
+                # Larger canvases take more of the memory budget.
+                self.app.masvis_tab_selected(tabbox)
+
     def on_show_dynamic_range_chart(self, btn):
         dialog = Adw.Dialog()
         dialog.set_follows_content_size(True) # Adw size problems.
@@ -831,10 +861,13 @@ class PyPlotWindow(Adw.ApplicationWindow):
         # Process the list of tabs.
         for tab in self.tab_view.get_pages():
             try:
+                tabbox = tab.get_child()
+                if tabbox.canvas == None and tabbox.overview == None and getattr(tabbox.a_file, 'analyzed', None) == None:
+                    continue # Nothing to draw yet.
                 list_store.append(StringPath(
-                        tab.get_child().a_file.file_path,
-                        tab.get_child().a_file.file_name,
-                        tab.get_child().scrolled.get_child().get_child().get_child() # canvas
+                        tabbox.a_file.file_path,
+                        tabbox.a_file.file_name,
+                        tabbox
                     )
                 )
             except Exception as e:
@@ -933,6 +966,14 @@ class PyPlotWindow(Adw.ApplicationWindow):
 
         dialog_compare.close()
 
+        # Tabs not drawn, or released, are drawn offscreen first.
+        self.app.masvis_tab_images(
+            [item.tabbox for item in comparable_items],
+            lambda images: self.on_go_compare_show(comparable_items, images)
+        )
+
+    # Show the compared tabs, once drawn.
+    def on_go_compare_show(self, comparable_items, images):
         self.n_th_comparison += 1
 
         # Comparison dialog.
@@ -955,10 +996,12 @@ class PyPlotWindow(Adw.ApplicationWindow):
         box_of_pictures.set_homogeneous(False)
 
         for item in comparable_items:
-            buff_w, buff_h = item.canvas.get_width_height()
+            if item.tabbox not in images:
+                continue # Closed, or failed to draw.
+            buff_w, buff_h = images[item.tabbox].size
             aspect_ratio = buff_w/buff_h
             pixbuf = GdkPixbuf.Pixbuf.new_from_data(
-                item.canvas.buffer_rgba().tobytes(),
+                images[item.tabbox].tobytes(),
                 GdkPixbuf.Colorspace.RGB,
                 True,
                 8,
@@ -1011,10 +1054,13 @@ class PyPlotWindow(Adw.ApplicationWindow):
         # Process the list of tabs.
         for tab in self.tab_view.get_pages():
             try:
+                tabbox = tab.get_child()
+                if tabbox.canvas == None and tabbox.overview == None and getattr(tabbox.a_file, 'analyzed', None) == None:
+                    continue # Nothing to draw yet.
                 list_store.append(StringPath(
-                        tab.get_child().a_file.file_path,
-                        tab.get_child().a_file.file_name,
-                        tab.get_child().scrolled.get_child().get_child().get_child() # canvas
+                        tabbox.a_file.file_path,
+                        tabbox.a_file.file_name,
+                        tabbox
                     )
                 )
             except Exception as e:
@@ -1142,18 +1188,21 @@ class PyPlotWindow(Adw.ApplicationWindow):
 
         dialog_animation_save.spinner_animate_save.start()
 
-        # Indirect call, protecting UI.
-        GLib.idle_add(self.on_animate_tabs_process, dialog_animation_save)
-
-    # Convert canvas into RGBA Image array.
-    def on_animate_tabs_process(self, dialog_animation_save):
+        # Tabs not drawn, or released, are drawn offscreen first.
         dialog_animation_save.label_animation_status.set_label(_('Processing images.'))
+        self.app.masvis_tab_images(
+            [item.tabbox for item in comparable_items],
+            lambda images: self.on_animate_tabs_process(dialog_animation_save, images)
+        )
+
+    # Collect the RGBA images of the tabs.
+    def on_animate_tabs_process(self, dialog_animation_save, images):
         try:
             self.animated_pil_images = []
             for item in dialog_animation_save.comparable_items:
-                buff_w, buff_h = item.canvas.get_width_height()
-                aspect_ratio = buff_w/buff_h
-                self.animated_pil_images.append(Image.frombytes('RGBA', (buff_w, buff_h), item.canvas.buffer_rgba().tobytes()))
+                if item.tabbox not in images:
+                    continue # Closed, or failed to draw.
+                self.animated_pil_images.append(images[item.tabbox])
                 dialog_animation_save.label_animation_status.set_label(_('Animated image ready for saving.'))
         except Exception as e:
             self.app.on_error_dialog(
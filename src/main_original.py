@@ -22,14 +22,20 @@ import logging
 import operator
 import os
 import sys
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
 
+import numpy as np
 from PIL import Image
 
 from . import __version__
-from .analysis import analyze
-from .input import file_formats, load_file
+from .analysis import METRICS, accuracy_report, analyze
+from .artifact import compact
+from .cache import AnalysisCache
+from .input import BLOCK_SIZE, STREAM_BYTES, decoded_bytes, file_formats, open_file, probe_file
 from .output import render
-from .utils import Steps, Timer
+from .stream import analyze_stream
+from .utils import SAVE_EFFORTS, Steps, Timer, save_image
 
 DEBUG = False
 
@@ -46,10 +52,17 @@ def run(
     overviewfile=None,
     overviews=None,
     fmt='png',
+    effort='small',
     destdir='',
     update=True,
     header=None,
     r128_unit='LUFS',
+    metrics=None,
+    dtype='float',
+    accuracy=False,
+    workers=None,
+    cache=None,
+    stream=None,
 ):
     loader = None
     loader_args = []
@@ -59,8 +72,9 @@ def run(
         os.mkdir(destdir)
     if os.path.isfile(infile):
         log.debug("Selecting file loader")
-        loader = load_file
-        loader_args = [infile]
+        loader = open_file
+        # The accuracy report compares against the whole PCM.
+        loader_args = [infile, dtype, False if accuracy else stream]
         if not outfile:
             filename = os.path.basename(infile)
             filename = "%s-masvisgtk.%s" % (filename, fmt)
@@ -82,9 +96,18 @@ def run(
     else:
         log.warning("Unable to open input %s", infile)
         return
-    track = loader(*loader_args)
-    if type(track) is int:
-        return
+    # The cache only holds double precision results, and no PCM for
+    # the accuracy report.
+    if dtype != 'float' or accuracy:
+        cache = None
+    # A cached compact track is drawn without decoding.
+    cached = cache.get(infile, metrics) if cache else None
+    if cached:
+        track, analysis = cached
+    else:
+        track = loader(*loader_args)
+        if type(track) is int:
+            return
     # Minimum track duration => 3 seconds.
     if track['duration'] < 3:
         err_duration = f'The minimum file duration is 3 seconds.\n[{infile}]'
@@ -93,8 +116,25 @@ def run(
     if not header:
         header = "%s" % (track['metadata']['name'])
     with Timer('Running...', Steps.total, Steps.callback):
-        with Timer('Analyzing...'):
-            analysis = analyze(track, callback=Steps.callback)
+        if not cached:
+            with Timer('Analyzing...'):
+                if 'stream' in track:
+                    analysis = analyze_stream(track, callback=Steps.callback, metrics=metrics, workers=workers)
+                else:
+                    analysis = analyze(track, callback=Steps.callback, metrics=metrics, workers=workers)
+            if accuracy:
+                for field, deviation, tolerance in accuracy_report(track, metrics):
+                    log.warning(
+                        "%-16s %10.6f  (tolerance %g)%s",
+                        field,
+                        deviation,
+                        tolerance,
+                        '' if deviation <= tolerance else '  EXCEEDED',
+                    )
+            # Free the PCM, only the compact track is drawn.
+            track = compact(track, analysis)
+            if cache:
+                cache.put(infile, track, analysis)
         with Timer('Rendering...'):
             render_overview = False
             if overviewfile:
@@ -107,13 +147,8 @@ def run(
                 render_overview=render_overview,
                 callback=Steps.callback,
             )
-            img = Image.open(detailed)
             log.info("Writing %s", outfile)
-            if fmt == 'png':
-                img = img.convert(mode='P', palette='ADAPTIVE', colors=256)
-                img.save(outfile, 'PNG', optimize=True)
-            elif fmt == 'jpg':
-                img.save(outfile, 'JPEG', quality=80, optimize=True)
+            save_image(detailed, outfile, fmt, effort)
             if overview:
                 img_o = Image.open(overview)
                 if overviewfile:
@@ -124,6 +159,114 @@ def run(
     Steps.report()
 
 
+def run_file(infile, options):
+    '''
+    run() on one file, returning the overview images it collected
+
+    Any failure is logged and only loses this file.
+    '''
+    overviews = collections.OrderedDict()
+    log.warning(infile)
+    try:
+        run(infile, overviews=overviews, **options)
+    except Exception:
+        log.exception("Failed to process %s", infile)
+    return overviews
+
+
+def memory_estimate(infile, dtype='float', stream=None):
+    '''
+    Rough peak memory of run() on infile in bytes, 0 if it cannot be probed
+    '''
+    track = probe_file(infile)
+    if type(track) is int:
+        return 0
+    if stream or (stream is None and decoded_bytes(track, dtype) > STREAM_BYTES):
+        samples = BLOCK_SIZE * track['channels']
+    else:
+        samples = track['duration'] * track['samplerate'] * track['channels']
+    # The decoded buffer and its copy, the float data and about two
+    # more float arrays of intermediates.
+    return int(samples * (2 * 4 + 3 * np.dtype(dtype).itemsize))
+
+
+def available_memory():
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def run_batch(infiles, options, jobs=1, memory=None):
+    '''
+    Yield the overviews of run_file for every input, in input order
+
+    Up to jobs files are processed at once in worker processes, fewer
+    while their estimated memory would exceed memory bytes. A file is
+    always started once nothing else is running, however large.
+    '''
+    if jobs == 1:
+        for infile in infiles:
+            yield run_file(infile, options)
+        return
+
+    def new_pool():
+        return ProcessPoolExecutor(jobs, initializer=log.setLevel, initargs=(log.level,))
+
+    # Probed when a file is next in line, not all before the first one.
+    estimates = {}
+
+    def estimate(i):
+        if i not in estimates:
+            stream = False if options['accuracy'] else options['stream']
+            estimates[i] = memory_estimate(infiles[i], options['dtype'], stream) if memory else 0
+        return estimates[i]
+
+    pending = list(range(len(infiles)))
+    alone = set() # files retried on their own, after a worker died
+    results = {}
+    running = {}
+    done = 0
+    pool = new_pool()
+    try:
+        while pending or running:
+            i = pending[0] if pending else None
+            if i is not None and (
+                not running
+                or len(running) < jobs
+                and not alone.intersection(running.values())
+                and i not in alone
+                and (not memory or sum(estimate(j) for j in running.values()) + estimate(i) <= memory)
+            ):
+                running[pool.submit(run_file, infiles[pending.pop(0)], options)] = i
+                continue
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            if any(isinstance(f.exception(), BrokenProcessPool) for f in finished):
+                # A dead worker, most likely killed for memory, breaks the
+                # pool and every file on it. Retry those on their own, so
+                # only the culprit is lost.
+                finished, _ = wait(running)
+                pool.shutdown(wait=False)
+                pool = new_pool()
+            for future in finished:
+                j = running.pop(future)
+                try:
+                    results[j] = future.result()
+                except BrokenProcessPool:
+                    if j in alone:
+                        log.error("Failed to process %s, its worker process died", infiles[j])
+                        results[j] = {}
+                    else:
+                        alone.add(j)
+                        pending.insert(0, j)
+            pending.sort()
+            while done in results:
+                yield results.pop(done)
+                done += 1
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
 def main_pymasvis():
     import argparse
     from functools import reduce
@@ -161,6 +304,14 @@ def main_pymasvis():
         choices=['png', 'jpg'],
         help="selects output format, default: png",
     )
+    parser.add_argument(
+        '--effort',
+        default='small',
+        type=str,
+        choices=SAVE_EFFORTS,
+        help="selects encoder effort: fast, default (every colour kept) "
+        "or small (png quantised to 256 colours), default: small",
+    )
     parser.add_argument(
         '--overview',
         action='store_const',
@@ -185,6 +336,59 @@ def main_pymasvis():
         const='LU',
         help="Use LU instead of LUFS when displaying R128 values",
     )
+    parser.add_argument(
+        '--metrics',
+        metavar='metrics',
+        type=lambda s: s.split(','),
+        default=None,
+        help=(
+            "comma separated metrics to calculate, along with those they "
+            "depend on: %s; default: all" % ', '.join(METRICS)
+        ),
+    )
+    parser.add_argument(
+        '--float32',
+        dest='dtype',
+        default='float',
+        action='store_const',
+        const='float32',
+        help="process audio in single instead of double precision",
+    )
+    parser.add_argument(
+        '--accuracy-report',
+        action='store_true',
+        help="compare single with double precision results per file",
+    )
+    parser.add_argument(
+        '--stream',
+        action='store_true',
+        default=None,
+        help=(
+            "decode and analyze files block by block, in little memory; "
+            "default: only files over %d MiB decoded" % (STREAM_BYTES // 2**20)
+        ),
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help="neither use nor store cached analysis results",
+    )
+    parser.add_argument(
+        '--cache-verify',
+        action='store_true',
+        help="check cached results against a hash of the file content",
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        metavar='jobs',
+        type=int,
+        default=1,
+        help=(
+            "number of files to process at once, 0 for one per CPU; fewer "
+            "run while memory is short, default: 1"
+        ),
+    )
     parser.add_argument(
         'inputs',
         metavar='input',
@@ -199,6 +403,8 @@ def main_pymasvis():
         log.setLevel(logging.INFO)
     if args.debug:
         log.setLevel(logging.DEBUG)
+    if args.metrics and not set(args.metrics) <= set(METRICS):
+        parser.error("unknown metrics: %s" % ', '.join(set(args.metrics) - set(METRICS)))
     if args.overview and args.update != 'yes':
         log.error("Update must be set to 'yes' to enable overviews")
         exit(1)
@@ -220,22 +426,29 @@ def main_pymasvis():
     if len(infiles) == 0:
         log.warning("No valid files for analysis found: " + " ".join(args.inputs))
 
+    jobs = args.jobs or os.cpu_count() or 1
+    options = {
+        'overviewfile': args.overview,
+        'fmt': args.format,
+        'effort': args.effort,
+        'destdir': args.destdir,
+        'update': args.update,
+        'r128_unit': args.r128_unit,
+        'metrics': args.metrics,
+        'dtype': args.dtype,
+        'accuracy': args.accuracy_report,
+        'stream': args.stream,
+        # Share the CPUs between the files processed at once.
+        'workers': max(1, (os.cpu_count() or 1) // jobs),
+        'cache': None if args.no_cache else AnalysisCache(verify=args.cache_verify),
+    }
+    memory = available_memory()
+    if memory:
+        memory = memory * 3 // 4
     overviews = collections.OrderedDict()
-    for infile in infiles:
-        outfile = None
-        header = None
-        log.warning(infile)
-        run(
-            infile,
-            outfile,
-            args.overview,
-            overviews,
-            args.format,
-            args.destdir,
-            args.update,
-            header,
-            args.r128_unit,
-        )
+    for result in run_batch(infiles, options, jobs, memory):
+        for overviewindex, images in result.items():
+            overviews.setdefault(overviewindex, []).extend(images)
     if args.overview:
         if args.overview_mode == 'flat':
             if args.destdir:
@@ -251,9 +464,5 @@ def main_pymasvis():
             for i, image in enumerate(images):
                 out.paste(image, (0, h * i))
             log.info("Writing overview %s", overviewfile)
-            if args.format == 'png':
-                out = out.convert(mode='P', palette='ADAPTIVE', colors=256)
-                out.save(overviewfile, 'PNG', optimize=True)
-            elif args.format == 'jpg':
-                out.save(overviewfile, 'JPEG', quality=80, optimize=True)
+            save_image(out, overviewfile, args.format, args.effort)
 
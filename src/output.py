@@ -24,6 +24,7 @@ import matplotlib
 import matplotlib.pyplot as plt
 import numpy as np
 from matplotlib import gridspec, rc
+from PIL import Image
 from matplotlib.pyplot import (
     plot,
     semilogx,
@@ -44,6 +45,7 @@ from matplotlib.ticker import FormatStrFormatter, MaxNLocator, ScalarFormatter
 
 
 from . import __version__
+from .artifact import compact, rasterize
 from .utils import Steps, Timer
 from .params import c_color
 
@@ -109,80 +111,47 @@ def positions(nc=1):
     }
 
 
-def render(
-    track, analysis, header, r128_unit='LUFS', render_overview=False, callback=None
-):
-    #
-    # Plot
-    #
-    nc = track['channels']
-    fs = track['samplerate']
-    crest_db = analysis['crest_db']
-    crest_total_db = analysis['crest_total_db']
-    dr = analysis['dr']
-    l_kg = analysis['l_kg']
-    lra = analysis['lra']
-    plr = analysis['plr_lu']
-    checksum = analysis['checksum']
-    lufs_to_lu = 23.0
-    if r128_unit == 'LUFS':
-        r128_offset = 0
-    else:
-        r128_offset = R128_OFFSET
-    c_name = ['left', 'right', 'center', 'LFE', 'surr left', 'surr right']
-    nc_max = len(c_color)
-    with Timer("Drawing plot...", Steps.draw_plot, callback):
-        subtitle_analysis = (
-            'Crest: %.2f dB,  DR: %s,  L$_K$: %.1f %s,  ' 'LRA: %.1f LU,  PLR: %.1f LU'
-        ) % (crest_total_db, dr if dr > 0 else "??.?", l_kg + r128_offset, r128_unit, lra, plr)
-        subtitle_source = (
-            'Encoding: %s,  Channels: %d,  Bits: %d,  '
-            'Sample rate: %d Hz,  Bitrate: %s kbps,  '
-            'Duration: %s, Size: %.2f MB'
-        ) % (
-            track['metadata']['encoding'],
-            track['channels'],
-            track['bitdepth'],
-            fs,
-            int(round(track['metadata']['bps'] / 1000.0)),
-            time.strftime('%M:%S', time.gmtime(track['duration'])),
-            track['metadata']['size'] / (1024 * 1024), # MB file size
-        )
-        subtitle_meta = []
-        if track['metadata']['album']:
-            subtitle_meta.append('Album: %.*s' % (50, track['metadata']['album']))
-        if track['metadata']['track']:
-            subtitle_meta.append('Track: %s' % track['metadata']['track'])
-        if track['metadata']['date']:
-            subtitle_meta.append('Date: %s' % track['metadata']['date'])
-        subtitle_meta = ',  '.join(subtitle_meta)
-        subtitle = '\n'.join([subtitle_analysis, subtitle_source, subtitle_meta])
+class DetailedTemplate:
+    '''
+    The detailed figure for a channel count and loudness unit
+
+    Built once with its axes, ticks, labels and reference lines, and empty
+    artists for the data. render() only sets their data and texts, so a
+    track costs little more than drawing the figure.
+    '''
+
+    def __init__(self, nc, r128_unit):
+        if r128_unit == 'LUFS':
+            r128_offset = 0
+        else:
+            r128_offset = R128_OFFSET
+        nc_max = len(c_color)
         pos = positions(nc)
-        fig_d = plt.figure(
-            'detailed',
+        self.fig = plt.figure(
+            'detailed %d %s' % (nc, r128_unit),
             figsize=(pos['w'] / DPI, pos['h'] / DPI),
             facecolor='white',
             dpi=DPI,
         )
-        fig_d.suptitle(header, fontsize='medium', y=pos['header_y'])
-        fig_d.text(
+        self.header = self.fig.suptitle('', fontsize='medium', y=pos['header_y'])
+        self.subtitle = self.fig.text(
             0.5,
             pos['subheader_y'],
-            subtitle,
+            '',
             fontsize='small',
             horizontalalignment='center',
             verticalalignment='top',
             linespacing=1.6,
         )
-        fig_d.text(
+        self.checksum = self.fig.text(
             pos['left'],
             pos['footer_y'],
-            ('Checksum (energy): %d' % checksum),
+            '',
             fontsize='small',
             va='bottom',
             ha='left',
         )
-        fig_d.text(
+        self.fig.text(
             pos['right'],
             pos['footer_y'],
             ('MasVisGtk %s' % (VERSION)),
@@ -204,87 +173,45 @@ def render(
             top=pos['top'],
         )
 
-    # Channels
-    data = track['data']['float']
-    sec = track['duration']
-    rms_dbfs = analysis['rms_dbfs']
-    peak_dbfs = analysis['peak_dbfs']
-    true_peak_dbtp = analysis['true_peak_dbtp']
-    c_max = analysis['c_max']
-    w_max = analysis['w_max']
-    with Timer("Drawing channels...", Steps.draw_ch, callback):
-        ax_ch = []
+        # Channels
+        self.ax_ch = []
+        self.ch_lines = []
+        self.ch_titles = []
         c = 0
         while c < nc and c < nc_max:
             if c == 0:
-                ax_ch.append(subplot(gs[c, :]))
+                self.ax_ch.append(subplot(gs[c, :]))
             else:
-                ax_ch.append(subplot(gs[c, :], sharex=ax_ch[0]))
-            new_data, new_ns, new_range = pixelize(
-                data[c], ax_ch[c], which='both', oversample=2
-            )
-            new_fs = new_ns / sec
-            new_range = np.arange(0.0, new_ns, 1) / new_fs
-            plot(new_range, new_data, color=c_color[c], linestyle='-')
-            xlim(0, round(sec))
+                self.ax_ch.append(subplot(gs[c, :], sharex=self.ax_ch[0]))
+            self.ch_lines += plot([], [], color=c_color[c], linestyle='-')
             ylim(-1.0, 1.0)
-            title(
-                (
-                    u"%s: Crest=%0.2f dB, RMS=%0.2f dBFS, Peak=%0.2f dBFS, "
-                    u"True Peak≈%0.2f dBTP"
-                )
-                % (
-                    c_name[c].capitalize(),
-                    crest_db[c],
-                    rms_dbfs[c],
-                    peak_dbfs[c],
-                    true_peak_dbtp[c],
-                ),
-                fontsize='small',
-                loc='left',
-            )
+            self.ch_titles.append(title('', fontsize='small', loc='left'))
             yticks([1, -0.5, 0, 0.5, 1], ('', -0.5, 0, '', ''))
-            if c_max == c:
-                mark_span(ax_ch[c], (w_max[0] / float(fs), w_max[1] / float(fs)))
             if c + 1 == nc or c + 1 == nc_max:
-                ax_ch[c].xaxis.set_major_locator(MaxNLocatorMod(prune='both'))
-                ax_ch[c].xaxis.set_major_formatter(ScalarFormatter(useOffset=False))
+                self.ax_ch[c].xaxis.set_major_locator(MaxNLocatorMod(prune='both'))
+                self.ax_ch[c].xaxis.set_major_formatter(ScalarFormatter(useOffset=False))
                 xlabel('s', fontsize='small')
             else:
-                setp(ax_ch[c].get_xticklabels(), visible=False)
-            axis_defaults(ax_ch[c])
+                setp(self.ax_ch[c].get_xticklabels(), visible=False)
+            axis_defaults(self.ax_ch[c])
             c += 1
-    spi = c - 1
-
-    # Loudest
-    s_max = analysis['s_max']
-    ns_max = analysis['ns_max']
-    with Timer("Drawing loudest...", Steps.draw_loud, callback):
-        ax_max = subplot(gs[spi + 1, :])
-        plot(
-            np.arange(*w_max) / float(fs),
-            data[c_max][np.arange(*w_max)],
-            c_color[c_max],
-        )
+        spi = c - 1
+        self.span = None
+
+        # Loudest
+        self.ax_max = subplot(gs[spi + 1, :])
+        (self.max_line,) = plot([], [])
+        self.max_title = title('', fontsize='small', loc='left')
+        self.max_skipped = not_analyzed(self.ax_max)
         ylim(-1.0, 1.0)
-        xlim(w_max[0] / float(fs), w_max[1] / float(fs))
-        title(
-            ("Loudest part (%s ch, %d samples > 95%% " "during 20 ms at %0.2f s)")
-            % (c_name[c_max], ns_max, s_max / float(fs)),
-            fontsize='small',
-            loc='left',
-        )
         yticks([1, -0.5, 0, 0.5, 1], ('', -0.5, 0, '', ''))
-        ax_max.xaxis.set_major_locator(MaxNLocatorMod(nbins=5, prune='both'))
-        ax_max.xaxis.set_major_formatter(FormatStrFormatter("%0.2f"))
+        self.ax_max.xaxis.set_major_locator(MaxNLocatorMod(nbins=5, prune='both'))
+        self.ax_max.xaxis.set_major_formatter(FormatStrFormatter("%0.2f"))
         xlabel('s', fontsize='small')
-        axis_defaults(ax_max)
+        axis_defaults(self.ax_max)
 
-    # Spectrum
-    norm_spec = analysis['norm_spec']
-    frames = analysis['frames']
-    with Timer("Drawing spectrum...", Steps.draw_spec, callback):
-        ax_norm = subplot(gs[spi + 2, 0])
+        # Spectrum
+        self.ax_norm = subplot(gs[spi + 2, 0])
         semilogx(
             [0.02, 0.06],
             [-80, -90],
@@ -327,29 +254,19 @@ def render(
             'k-',
             base=10,
         )
+        self.norm_skipped = not_analyzed(self.ax_norm)
+        self.norm_lines = []
         for c in range(nc):
-            new_spec, new_n, new_r = pixelize(
-                norm_spec[c],
-                ax_norm,
-                which='max',
-                oversample=1,
-                method='log10',
-                span=(20, int(fs * 0.5)), # Nyquist-Shannon, originally span=(20, 20000)
-            )
-            semilogx(new_r / 1000.0, new_spec, color=c_color[c], linestyle='-', base=10)
+            self.norm_lines += semilogx([], [], color=c_color[c], linestyle='-', base=10)
         ylim(-90, -10)
         xlim(0.02, 20)
-        ax_norm.yaxis.grid(True, which='major', linestyle=':', color='k', linewidth=0.5)
-        ax_norm.xaxis.grid(True, which='both', linestyle='-', color='k', linewidth=0.5)
+        self.ax_norm.yaxis.grid(True, which='major', linestyle=':', color='k', linewidth=0.5)
+        self.ax_norm.xaxis.grid(True, which='both', linestyle='-', color='k', linewidth=0.5)
         ylabel('dB', fontsize='small', verticalalignment='top', rotation=0)
         xlabel('kHz', fontsize='small', horizontalalignment='right')
-        title(
-            "Normalized average spectrum, %d frames" % (frames),
-            fontsize='small',
-            loc='left',
-        )
-        ax_norm.set_xticks([0.05, 0.1, 0.2, 0.5, 1, 2, 3, 4, 5, 7, 10, 20], minor=False)
-        ax_norm.set_xticks(
+        self.norm_title = title('', fontsize='small', loc='left')
+        self.ax_norm.set_xticks([0.05, 0.1, 0.2, 0.5, 1, 2, 3, 4, 5, 7, 10, 20], minor=False)
+        self.ax_norm.set_xticks(
             [
                 0.03,
                 0.04,
@@ -370,31 +287,19 @@ def render(
             ],
             minor=True,
         )
-        ax_norm.set_xticklabels([0.05, 0.1, 0.2, 0.5, 1, 2, 3, 4, 5, 7, 10, 20], minor=False)
-        ax_norm.set_xticklabels([], minor=True)
+        self.ax_norm.set_xticklabels([0.05, 0.1, 0.2, 0.5, 1, 2, 3, 4, 5, 7, 10, 20], minor=False)
+        self.ax_norm.set_xticklabels([], minor=True)
         yticks(np.arange(-90, 0, 10), ('', -80, -70, -60, -50, -40, -30, '', ''))
-        axis_defaults(ax_norm)
+        axis_defaults(self.ax_norm)
 
-    # Allpass
-    ap_freqs = analysis['ap_freqs']
-    ap_crest = analysis['ap_crest']
-    with Timer("Drawing allpass...", Steps.draw_ap, callback):
-        ax_ap = subplot(gs[spi + 2, 1])
+        # Allpass
+        self.ax_ap = subplot(gs[spi + 2, 1])
+        self.ap_skipped = not_analyzed(self.ax_ap)
+        self.ap_crest_lines = []
+        self.ap_lines = []
         for c in range(nc):
-            semilogx(
-                ap_freqs / 1000.0,
-                crest_db[c] * np.ones(len(ap_freqs)),
-                color=c_color[c],
-                linestyle='--',
-                base=10,
-            )
-            semilogx(
-                ap_freqs / 1000.0,
-                ap_crest.swapaxes(0, 1)[c],
-                color=c_color[c],
-                linestyle='-',
-                base=10,
-            )
+            self.ap_crest_lines += semilogx([], [], color=c_color[c], linestyle='--', base=10)
+            self.ap_lines += semilogx([], [], color=c_color[c], linestyle='-', base=10)
         ylim(0, 30)
         xlim(0.02, 20)
         title("Allpassed crest factor", fontsize='small', loc='left')
@@ -402,29 +307,21 @@ def render(
         xticks([0.1, 1, 2], (0.1, 1, 2))
         xlabel('kHz', fontsize='small')
         ylabel('dB', fontsize='small', rotation=0)
-        axis_defaults(ax_ap)
+        axis_defaults(self.ax_ap)
 
-    # Histogram
-    hist = analysis['hist']
-    hist_bits = analysis['hist_bits']
-    hist_title_bits = []
-    with Timer("Drawing histogram...", Steps.draw_hist, callback):
-        ax_hist = subplot(gs[spi + 3, 0])
+        # Histogram
+        self.ax_hist = subplot(gs[spi + 3, 0])
+        self.hist_skipped = not_analyzed(self.ax_hist)
+        self.hist_lines = []
         for c in range(nc):
-            new_hist, new_n, new_range = pixelize(
-                hist[c], ax_hist, which='max', oversample=2
-            )
-            new_hist[(new_hist == 1.0)] = 1.3
-            new_hist[(new_hist < 1.0)] = 1.0
-            semilogy(
-                np.arange(new_n) * 2.0 / new_n - 1.0,
-                new_hist,
+            self.hist_lines += semilogy(
+                [],
+                [],
                 color=c_color[c],
                 linestyle='-',
                 base=10,
                 drawstyle='steps',
             )
-            hist_title_bits.append('%0.1f' % hist_bits[c])
         xlim(-1.1, 1.1)
         ylim(1, 50000)
         xticks(
@@ -432,16 +329,12 @@ def render(
             (-1, -0.8, -0.6, -0.4, -0.2, 0, 0.2, 0.4, 0.6, 0.8, 1),
         )
         yticks([10, 100, 1000], (10, 100, 1000))
-        hist_title = 'Histogram, "bits": %s' % '/'.join(hist_title_bits)
-        title(hist_title, fontsize='small', loc='left')
+        self.hist_title = title('', fontsize='small', loc='left')
         ylabel('n', fontsize='small', rotation=0)
-        axis_defaults(ax_hist)
+        axis_defaults(self.ax_hist)
 
-    # Peak vs RMS
-    rms_1s_dbfs = analysis['rms_1s_dbfs']
-    peak_1s_dbfs = analysis['peak_1s_dbfs']
-    with Timer("Drawing peak vs RMS...", Steps.draw_pvsr, callback):
-        ax_pr = subplot(gs[spi + 3, 1])
+        # Peak vs RMS
+        self.ax_pr = subplot(gs[spi + 3, 1])
         plot(
             [-50, 0],
             [-50, 0],
@@ -470,10 +363,12 @@ def render(
         text(-48, -25, '20', **text_style)
         text(-48, -15, '30', **text_style)
         text(-48, -5, '40', **text_style)
+        self.pr_skipped = not_analyzed(self.ax_pr)
+        self.pr_lines = []
         for c in range(nc):
-            plot(
-                rms_1s_dbfs[c],
-                peak_1s_dbfs[c],
+            self.pr_lines += plot(
+                [],
+                [],
                 linestyle='',
                 marker='o',
                 markerfacecolor='w',
@@ -487,17 +382,16 @@ def render(
         ylabel('dBFS', fontsize='small', rotation=0)
         xticks([-50, -40, -30, -20, -10, 0], ('', -40, -30, -20, '', ''))
         yticks([-50, -40, -30, -20, -10, 0], ('', -40, -30, -20, -10, ''))
-        axis_defaults(ax_pr)
+        axis_defaults(self.ax_pr)
 
-    # Shortterm crest
-    crest_1s_db = analysis['crest_1s_db']
-    n_1s = analysis['n_1s']
-    with Timer("Drawing short term crest...", Steps.draw_stc, callback):
-        ax_1s = subplot(gs[spi + 4, :])
+        # Shortterm crest
+        self.ax_1s = subplot(gs[spi + 4, :])
+        self.stc_skipped = not_analyzed(self.ax_1s)
+        self.stc_lines = []
         for c in range(nc):
-            plot(
-                np.arange(n_1s) + 0.5,
-                crest_1s_db[c],
+            self.stc_lines += plot(
+                [],
+                [],
                 linestyle='',
                 marker='o',
                 markerfacecolor='w',
@@ -505,31 +399,27 @@ def render(
                 markeredgewidth=0.7,
             )
         ylim(0, 30)
-        xlim(0, n_1s)
         yticks([10, 20], (10, ''))
-        ax_1s.yaxis.grid(True, which='major', linestyle=':', color='k', linewidth=0.5)
+        self.ax_1s.yaxis.grid(True, which='major', linestyle=':', color='k', linewidth=0.5)
         title("Short term (1 s) crest factor", fontsize='small', loc='left')
         xlabel('s', fontsize='small')
         ylabel('dB', fontsize='small', rotation=0)
-        ax_1s.xaxis.set_major_locator(MaxNLocatorMod(prune='both'))
-        ax_1s.xaxis.set_major_formatter(ScalarFormatter(useOffset=False))
-        axis_defaults(ax_1s)
-
-    # EBU R 128
-    stl = analysis['stl']
-    stplr = analysis['stplr_lu']
-    with Timer("Drawing EBU R 128 loudness...", Steps.draw_ebur128, callback):
-        ax_ebur128 = subplot(gs[spi + 5, :])
-        plot(
-            np.arange(stl.size) + 1.5,
-            stl + r128_offset,
+        self.ax_1s.xaxis.set_major_locator(MaxNLocatorMod(prune='both'))
+        self.ax_1s.xaxis.set_major_formatter(ScalarFormatter(useOffset=False))
+        axis_defaults(self.ax_1s)
+
+        # EBU R 128
+        self.ax_ebur128 = subplot(gs[spi + 5, :])
+        (self.stl_line,) = plot(
+            [],
+            [],
             'ko',
             markerfacecolor='w',
             markeredgecolor='k',
             markeredgewidth=0.7,
         )
+        self.ebur128_skipped = not_analyzed(self.ax_ebur128)
         ylim(-41 + r128_offset, -5 + r128_offset)
-        xlim(0, n_1s)
         yticks(
             [-33 + r128_offset, -23 + r128_offset, -13 + r128_offset],
             (-33 + r128_offset, -23 + r128_offset, ''),
@@ -538,107 +428,323 @@ def render(
         title("Short term PLR", fontsize='small', loc='right', color='grey')
         xlabel('s', fontsize='small')
         ylabel('%s' % r128_unit, fontsize='small', rotation=0)
-        ax_ebur128.yaxis.grid(
+        self.ax_ebur128.yaxis.grid(
             True, which='major', linestyle=':', color='k', linewidth=0.5
         )
-        ax_ebur128_stplr = ax_ebur128.twinx()
-        plot(
-            np.arange(stplr.size) + 1.5,
-            stplr,
+        ax_ebur128_stplr = self.ax_ebur128.twinx()
+        (self.stplr_line,) = plot(
+            [],
+            [],
             'o',
             markerfacecolor='w',
             markeredgecolor='grey',
             markeredgewidth=0.7,
         )
-        xlim(0, n_1s)
         ylim(0, 36)
         yticks([0, 18], (0, 18))
         for tl in ax_ebur128_stplr.get_yticklabels():
             tl.set_color('grey')
-        ax_ebur128.xaxis.set_major_locator(MaxNLocatorMod(prune='both'))
-        ax_ebur128.xaxis.set_major_formatter(ScalarFormatter(useOffset=False))
-        axis_defaults(ax_ebur128)
+        self.ax_ebur128.xaxis.set_major_locator(MaxNLocatorMod(prune='both'))
+        self.ax_ebur128.xaxis.set_major_formatter(ScalarFormatter(useOffset=False))
+        axis_defaults(self.ax_ebur128)
         axis_defaults(ax_ebur128_stplr)
         ax_ebur128_stplr.tick_params(
             axis='y', which='major', labelsize='xx-small', length=0
         )
 
+
+class OverviewTemplate:
+    '''
+    The overview figure, an image with a title and the key values
+    '''
+
+    def __init__(self):
+        w_o = 606.0
+        h_o = 64.0
+        self.fig = plt.figure(
+            'overview', figsize=(w_o / DPI, h_o / DPI), facecolor='white', dpi=DPI
+        )
+        self.ax = self.fig.add_subplot(111)
+        self.ax.set_position([12 / w_o, 8 / h_o, 464 / w_o, 40 / h_o])
+        self.ax.set_xticks([])
+        self.ax.set_yticks([])
+        self.title = self.ax.set_title('', fontsize='small', loc='left')
+        self.w = round(self.ax.bbox.bounds[2])
+        self.h = round(self.ax.bbox.bounds[3])
+        self.info = self.fig.text(
+            482 / w_o,
+            28 / h_o,
+            '',
+            fontsize='small',
+            verticalalignment='center',
+            snap=False,
+        )
+        self.image = self.ax.imshow(
+            np.zeros((self.h, self.w, 4), np.uint8), aspect='auto', interpolation='none'
+        )
+
+
+# Templates by channel count and loudness unit, and the overview one.
+TEMPLATES = {}
+
+
+def template(key):
+    if key not in TEMPLATES:
+        if key == 'overview':
+            TEMPLATES[key] = OverviewTemplate()
+        else:
+            TEMPLATES[key] = DetailedTemplate(*key)
+    return TEMPLATES[key]
+
+
+def render(
+    track, analysis, header, r128_unit='LUFS', render_overview=False, callback=None
+):
+    # Drawn from the waveform pyramid, decoded tracks are reduced first.
+    track = compact(track, analysis)
+
+    #
+    # Plot
+    #
+    nc = track['channels']
+    fs = track['samplerate']
+    crest_db = analysis['crest_db']
+    crest_total_db = analysis['crest_total_db']
+    dr = analysis['dr']
+    l_kg = analysis['l_kg']
+    lra = analysis['lra']
+    plr = analysis['plr_lu']
+    checksum = analysis['checksum']
+    lufs_to_lu = 23.0
+    if r128_unit == 'LUFS':
+        r128_offset = 0
+    else:
+        r128_offset = R128_OFFSET
+    c_name = ['left', 'right', 'center', 'LFE', 'surr left', 'surr right']
+    with Timer("Drawing plot...", Steps.draw_plot, callback):
+        subtitle_analysis = (
+            'Crest: %s dB,  DR: %s,  L$_K$: %s %s,  ' 'LRA: %s LU,  PLR: %s LU'
+        ) % (
+            value('%.2f', crest_total_db),
+            dr if dr is not None and dr > 0 else "??.?",
+            value('%.1f', None if l_kg is None else l_kg + r128_offset),
+            r128_unit,
+            value('%.1f', lra),
+            value('%.1f', plr),
+        )
+        subtitle_source = (
+            'Encoding: %s,  Channels: %d,  Bits: %d,  '
+            'Sample rate: %d Hz,  Bitrate: %s kbps,  '
+            'Duration: %s, Size: %.2f MB'
+        ) % (
+            track['metadata']['encoding'],
+            track['channels'],
+            track['bitdepth'],
+            fs,
+            int(round(track['metadata']['bps'] / 1000.0)),
+            time.strftime('%M:%S', time.gmtime(track['duration'])),
+            track['metadata']['size'] / (1024 * 1024), # MB file size
+        )
+        subtitle_meta = []
+        if track['metadata']['album']:
+            subtitle_meta.append('Album: %.*s' % (50, track['metadata']['album']))
+        if track['metadata']['track']:
+            subtitle_meta.append('Track: %s' % track['metadata']['track'])
+        if track['metadata']['date']:
+            subtitle_meta.append('Date: %s' % track['metadata']['date'])
+        subtitle_meta = ',  '.join(subtitle_meta)
+        subtitle = '\n'.join([subtitle_analysis, subtitle_source, subtitle_meta])
+        t = template((nc, r128_unit))
+        t.header.set_text(header)
+        t.subtitle.set_text(subtitle)
+        t.checksum.set_text('Checksum (energy): %s' % value('%d', checksum))
+
+    # Channels
+    waveform = track['waveform']
+    sec = track['duration']
+    rms_dbfs = analysis['rms_dbfs']
+    peak_dbfs = analysis['peak_dbfs']
+    true_peak_dbtp = analysis['true_peak_dbtp']
+    c_max = analysis['c_max']
+    w_max = analysis['w_max']
+    with Timer("Drawing channels...", Steps.draw_ch, callback):
+        for c, ax in enumerate(t.ax_ch):
+            new_data = waveform.columns(c, int(xpixels(ax) * 2))
+            new_ns = len(new_data)
+            new_fs = new_ns / sec
+            new_range = np.arange(0.0, new_ns, 1) / new_fs
+            t.ch_lines[c].set_data(new_range, new_data)
+            t.ch_titles[c].set_text(
+                (
+                    u"%s: Crest=%s dB, RMS=%s dBFS, Peak=%s dBFS, "
+                    u"True Peak≈%s dBTP"
+                )
+                % (
+                    c_name[c].capitalize(),
+                    value('%0.2f', crest_db, c),
+                    value('%0.2f', rms_dbfs, c),
+                    value('%0.2f', peak_dbfs, c),
+                    value('%0.2f', true_peak_dbtp, c),
+                )
+            )
+        t.ax_ch[0].set_xlim(0, round(sec))
+        if t.span:
+            t.span.remove()
+            t.span = None
+        if c_max is not None and c_max < len(t.ax_ch):
+            t.span = mark_span(t.ax_ch[c_max], (w_max[0] / float(fs), w_max[1] / float(fs)))
+
+    # Loudest
+    s_max = analysis['s_max']
+    ns_max = analysis['ns_max']
+    with Timer("Drawing loudest...", Steps.draw_loud, callback):
+        t.max_line.set_visible(c_max is not None)
+        t.max_skipped.set_visible(c_max is None)
+        if c_max is not None:
+            t.max_line.set_data(np.arange(*w_max) / float(fs), track['loudest'])
+            t.max_line.set_color(c_color[c_max])
+            t.ax_max.set_xlim(w_max[0] / float(fs), w_max[1] / float(fs))
+            t.max_title.set_text(
+                ("Loudest part (%s ch, %d samples > 95%% " "during 20 ms at %0.2f s)")
+                % (c_name[c_max], ns_max, s_max / float(fs))
+            )
+        else:
+            t.ax_max.set_xlim(0, 1)
+            t.max_title.set_text("Loudest part")
+
+    # Spectrum
+    norm_spec = analysis['norm_spec']
+    frames = analysis['frames']
+    with Timer("Drawing spectrum...", Steps.draw_spec, callback):
+        t.norm_skipped.set_visible(norm_spec is None)
+        for c in range(nc):
+            t.norm_lines[c].set_visible(norm_spec is not None)
+            if norm_spec is None:
+                continue
+            new_spec, new_n, new_r = pixelize(
+                norm_spec[c],
+                t.ax_norm,
+                which='max',
+                oversample=1,
+                method='log10',
+                span=(20, int(fs * 0.5)), # Nyquist-Shannon, originally span=(20, 20000)
+            )
+            t.norm_lines[c].set_data(new_r / 1000.0, new_spec)
+        t.norm_title.set_text("Normalized average spectrum, %d frames" % (frames))
+
+    # Allpass
+    ap_freqs = analysis['ap_freqs']
+    ap_crest = analysis['ap_crest']
+    with Timer("Drawing allpass...", Steps.draw_ap, callback):
+        t.ap_skipped.set_visible(ap_crest is None)
+        for c in range(nc):
+            t.ap_lines[c].set_visible(ap_crest is not None)
+            t.ap_crest_lines[c].set_visible(ap_crest is not None and crest_db is not None)
+            if ap_crest is None:
+                continue
+            if crest_db is not None:
+                t.ap_crest_lines[c].set_data(
+                    ap_freqs / 1000.0, crest_db[c] * np.ones(len(ap_freqs))
+                )
+            t.ap_lines[c].set_data(ap_freqs / 1000.0, ap_crest.swapaxes(0, 1)[c])
+
+    # Histogram
+    hist = analysis['hist']
+    hist_bits = analysis['hist_bits']
+    hist_title_bits = []
+    with Timer("Drawing histogram...", Steps.draw_hist, callback):
+        t.hist_skipped.set_visible(hist is None)
+        for c in range(nc):
+            t.hist_lines[c].set_visible(hist is not None)
+            if hist is None:
+                continue
+            new_hist, new_n, new_range = pixelize(
+                hist[c], t.ax_hist, which='max', oversample=2
+            )
+            new_hist[(new_hist == 1.0)] = 1.3
+            new_hist[(new_hist < 1.0)] = 1.0
+            t.hist_lines[c].set_data(np.arange(new_n) * 2.0 / new_n - 1.0, new_hist)
+            hist_title_bits.append('%0.1f' % hist_bits[c])
+        t.hist_title.set_text('Histogram, "bits": %s' % '/'.join(hist_title_bits))
+
+    # Peak vs RMS
+    rms_1s_dbfs = analysis['rms_1s_dbfs']
+    peak_1s_dbfs = analysis['peak_1s_dbfs']
+    with Timer("Drawing peak vs RMS...", Steps.draw_pvsr, callback):
+        t.pr_skipped.set_visible(peak_1s_dbfs is None)
+        for c in range(nc):
+            t.pr_lines[c].set_visible(peak_1s_dbfs is not None)
+            if peak_1s_dbfs is not None:
+                t.pr_lines[c].set_data(rms_1s_dbfs[c], peak_1s_dbfs[c])
+
+    # Shortterm crest
+    crest_1s_db = analysis['crest_1s_db']
+    n_1s = analysis['n_1s']
+    with Timer("Drawing short term crest...", Steps.draw_stc, callback):
+        t.stc_skipped.set_visible(crest_1s_db is None)
+        for c in range(nc):
+            t.stc_lines[c].set_visible(crest_1s_db is not None)
+            if crest_1s_db is not None:
+                t.stc_lines[c].set_data(np.arange(n_1s) + 0.5, crest_1s_db[c])
+        t.ax_1s.set_xlim(0, n_1s)
+
+    # EBU R 128
+    stl = analysis['stl']
+    stplr = analysis['stplr_lu']
+    with Timer("Drawing EBU R 128 loudness...", Steps.draw_ebur128, callback):
+        t.ebur128_skipped.set_visible(stl is None)
+        t.stl_line.set_visible(stl is not None)
+        if stl is not None:
+            t.stl_line.set_data(np.arange(stl.size) + 1.5, stl + r128_offset)
+        t.stplr_line.set_visible(stplr is not None)
+        if stplr is not None:
+            t.stplr_line.set_data(np.arange(stplr.size) + 1.5, stplr)
+        t.ax_ebur128.set_xlim(0, n_1s)
+
     # Overview
     with Timer("Drawing overview...", Steps.draw_overview, callback):
         if render_overview:
-            w_o = 606.0
-            h_o = 64.0
-            fig_o = plt.figure(
-                'overview', figsize=(w_o / DPI, h_o / DPI), facecolor='white', dpi=DPI
-            )
-            ax_o = fig_o.add_subplot(111)
-            ax_o.set_position([12 / w_o, 8 / h_o, 464 / w_o, 40 / h_o])
-            ax_o.set_xticks([])
-            ax_o.set_yticks([])
-            header_o = "%s  [%s, %d ch, %d bits, %d Hz, %d kbps]" % (
-                header,
-                track['metadata']['encoding'],
-                track['channels'],
-                track['bitdepth'],
-                fs,
-                int(round(track['metadata']['bps'] / 1000.0)),
-            )
-            ax_o.set_title(header_o, fontsize='small', loc='left')
-            w_buf = round(ax_o.bbox.bounds[2])
-            h_buf = round(ax_o.bbox.bounds[3])
-            info_o = (
-                u"Crest = %0.1f dB\nPeak = %0.1f dBFS\nDR = %s,  " u"L$_k$ = %.1f LU"
-            ) % (crest_total_db, peak_dbfs.max(), dr, l_kg + lufs_to_lu)
-            fig_o.text(
-                482 / w_o,
-                28 / h_o,
-                info_o,
-                fontsize='small',
-                verticalalignment='center',
-                snap=False,
+            o = template('overview')
+            o.title.set_text(
+                "%s  [%s, %d ch, %d bits, %d Hz, %d kbps]"
+                % (
+                    header,
+                    track['metadata']['encoding'],
+                    track['channels'],
+                    track['bitdepth'],
+                    fs,
+                    int(round(track['metadata']['bps'] / 1000.0)),
+                )
             )
-            fig_buf = plt.figure(
-                'buffer', figsize=(w_buf / DPI, h_buf / DPI), facecolor='white', dpi=DPI
+            o.info.set_text(
+                (u"Crest = %s dB\nPeak = %s dBFS\nDR = %s,  " u"L$_k$ = %s LU")
+                % (
+                    value('%0.1f', crest_total_db),
+                    value('%0.1f', None if peak_dbfs is None else peak_dbfs.max()),
+                    value('%s', dr),
+                    value('%.1f', None if l_kg is None else l_kg + lufs_to_lu),
+                )
             )
-            w, h = fig_buf.canvas.get_width_height()
-            fig_buf.patch.set_visible(False)
-            ax_buf = plt.gca()
-            img_buf = np.zeros((h, w, 4), np.uint8)
-            img_buf[:, :, 0:3] = 255
-            for i, ch in enumerate(data):
-                ax_buf.clear()
-                ax_buf.axis('off')
-                ax_buf.set_position([0, 0, 1, 1])
-                ax_buf.set_ylim(-1, 1)
-                ax_buf.set_xticks([])
-                ax_buf.set_yticks([])
-                new_ch, new_n, new_r = pixelize(ch, ax_buf, which='both', oversample=2)
-                ax_buf.plot(range(len(new_ch)), new_ch, color=c_color[i])
-                ax_buf.set_xlim(0, len(new_ch))
-                fig_buf.canvas.draw()
-                img = np.frombuffer(fig_buf.canvas.buffer_rgba(), np.uint8).reshape(
-                    h, w, -1
+            # Rasterized directly, one column per pixel of the axes.
+            o.image.set_data(
+                rasterize(
+                    waveform,
+                    o.w,
+                    o.h,
+                    c_color[:nc],
+                    plt.rcParams['lines.linewidth'] * DPI / 72.0,
                 )
-                img_buf[:, :, 0:3] = img[:, :, 0:3] * (img_buf[:, :, 0:3] / 255.0)
-                img_buf[:, :, -1] = np.maximum(img[:, :, -1], img_buf[:, :, -1])
-            img_buf[:, :, 0:3] = (img_buf[:, :, 3:4] / 255.0) * img_buf[:, :, 0:3] + (
-                255 - img_buf[:, :, 3:4]
             )
-            img_buf[:, :, -1] = 255
-            plt.figure('overview')
-            plt.imshow(img_buf, aspect='auto', interpolation='none')
             overview = io.BytesIO()
-            plt.savefig(overview, format='png', dpi=DPI, transparent=False)
-            plt.close(fig_o)
+            o.fig.savefig(overview, format='png', dpi=DPI, transparent=False)
         else:
             overview = None
 
     # Save
     with Timer("Saving...", Steps.save, callback):
-        plt.figure('detailed')
-        detailed = io.BytesIO()
-        plt.savefig(detailed, format='png', dpi=DPI, transparent=False)
-        plt.close(fig_d)
+        # Taken from the Agg buffer at DPI, encoded by the caller.
+        t.fig.canvas.draw()
+        detailed = Image.fromarray(np.array(t.fig.canvas.buffer_rgba()))
 
     return detailed, overview
 
@@ -648,6 +754,13 @@ def xpixels(ax):
 
 
 def pixelize(x, ax, method='linear', which='both', oversample=1, span=None):
+    '''
+    Max and/or min of x in oversample bins per pixel of ax
+
+    The bin edges are spaced evenly over span, linear or on a log10 scale,
+    and reduced with one reduceat() each. Returns (y, n, r), the values,
+    interleaved max and min with 'both', their count and the bin ends.
+    '''
     if not span:
         span = (0, len(x))
         if method == 'log10':
@@ -657,35 +770,62 @@ def pixelize(x, ax, method='linear', which='both', oversample=1, span=None):
     if which == 'both':
         minmax = 2
     nw = int(pixels * oversample)
-    w = (span[1] - span[0]) / (pixels * oversample)
     n = nw * minmax
+    if method == 'linear':
+        edges = np.round(np.linspace(span[0], span[1], nw + 1)).astype(np.intp)
+        starts = edges[:-1]
+    elif method == 'log10':
+        edges = np.round(np.logspace(np.log10(span[0]), np.log10(span[1]), nw + 1)).astype(np.intp)
+        # 1-based edges, each bin also takes the value at the previous end.
+        starts = edges[:-1] - 1
+    edges[-1] = span[1]
+    x = np.asarray(x)[: span[1]]
+    starts = np.minimum(starts, len(x) - 1)
+
+    def reduce(f):
+        # reduceat() ends a bin before the next start, log10 bins at their end.
+        y = f.reduceat(x, starts)
+        if method == 'log10':
+            y = f(y, x[np.minimum(edges[1:], len(x)) - 1])
+        return y
+
     y = np.zeros(n)
     r = np.zeros(n)
-    for i in range(nw):
-        if method == 'linear':
-            j = int(np.round(i * w + span[0]))
-            k = int(np.round(j + w + span[0]))
-        elif method == 'log10':
-            a = np.log10(span[1]) - np.log10(span[0])
-            b = np.log10(span[0])
-            j = int(np.round(10 ** (i / float(nw) * a + b)) - 1)
-            k = int(np.round(10 ** ((i + 1) / float(nw) * a + b)))
-        if i == nw - 1 and k != span[1]:
-            log.debug('pixelize tweak k')
-            k = span[1]
-        r[i] = k
-        if which == 'max':
-            y[i] = x[j:k].max()
-        elif which == 'min':
-            y[i] = x[j:k].min()
-        elif which == 'both':
-            y[i * minmax] = x[j:k].max()
-            y[i * minmax + 1] = x[j:k].min()
+    r[:nw] = edges[1:]
+    if which == 'max':
+        y[:] = reduce(np.maximum)
+    elif which == 'min':
+        y[:] = reduce(np.minimum)
+    elif which == 'both':
+        y[0::2] = reduce(np.maximum)
+        y[1::2] = reduce(np.minimum)
     return (y, n, r)
 
 
+def value(fmt, x, i=None):
+    '''
+    Format an analysis value, or item i of it, with a dash for skipped ones
+    '''
+    if x is None:
+        return '-'
+    return fmt % ((x if i is None else x[i]),)
+
+
+def not_analyzed(ax):
+    return ax.text(
+        0.5,
+        0.5,
+        'Not analyzed',
+        transform=ax.transAxes,
+        fontsize='small',
+        color='grey',
+        horizontalalignment='center',
+        verticalalignment='center',
+    )
+
+
 def mark_span(ax, span):
-    ax.axvspan(
+    return ax.axvspan(
         *span,
         edgecolor='0.2',
         facecolor='0.98',
@@ -16,14 +16,19 @@ You should have received a copy of the GNU General Public License
 along with this program.  If not, see <http://www.gnu.org/licenses/>.
 '''
 
+import collections
+import contextlib
+import io
 import logging
+import re
 import time
 
 import gi
 gi.require_version('Gtk', '4.0')
-from gi.repository import Gtk, Gio, GLib, Pango, Gdk
+from gi.repository import Gtk, Gio, GLib, GObject, Pango, Gdk
 
 import numpy as np
+from PIL import Image
 import matplotlib
 matplotlib.use('Agg') # non-GUI
 #matplotlib.use('GTK4Agg') # interactive
@@ -49,7 +54,8 @@ from matplotlib.pyplot import (
 from matplotlib.ticker import FormatStrFormatter, MaxNLocator, ScalarFormatter
 
 from . import __version__
-from .utils import Steps, Timer
+from .artifact import compact, rasterize
+from .utils import Steps, Timer, save_image
 from .params import c_color
 from .params import channel_layouts_names
 from .params import channel_layouts_params
@@ -66,6 +72,15 @@ FONT_LARGE_SIZE = 14.4 # 'large'
 # Displays time format MM:SS
 TIME_FMT = matplotlib.ticker.FuncFormatter(lambda sec, x: time.strftime('%M:%S', time.gmtime(sec)))
 
+# Saved from an RGBA image by PIL, the others by savefig.
+RASTER_FORMATS = ('png', 'jpeg', 'webp', 'tiff')
+
+# Overview rows, in pixels, and strips kept rasterized.
+OVERVIEW_W = 1212 # originally 606
+OVERVIEW_H = 128 # originally 64
+OVERVIEW_LABELS_H = 64
+STRIP_TEXTURES = 64
+
 matplotlib.rcParams['legend.fontsize'] = 'medium' # medium = 12.0
 matplotlib.rcParams['figure.titlesize'] = 'large'
 matplotlib.rcParams['lines.linewidth'] = 1.0
@@ -118,8 +133,11 @@ def positions(nc=1):
     }
 
 def render(
-    track, analysis, header, r128_unit='LUFS', overview_mode=None, callback=None, tab_page=None, win=None,
+    track, analysis, header, r128_unit='LUFS', overview_mode=None, callback=None, win=None, cancelled=None,
 ):
+    # Stops when true, the app's open operation by default.
+    cancelled = cancelled or win.app.check_cancellations
+
     # Set matplotlib style.
     global STYLE
     if not STYLE:
@@ -210,11 +228,13 @@ def render(
     else:
         r128_offset = R128_OFFSET
     nc_max = len(c_color)
-    data = track['data']['float']
+    # Drawn from the waveform pyramid, decoded tracks are reduced first.
+    track = compact(track, analysis)
+    waveform = track['waveform']
     pos = positions(nc)
     peak_dbfs = analysis['peak_dbfs']
 
-    if win.app.check_cancellations():
+    if cancelled():
         return
 
     if overview_mode == None:# Detailed one track plot.
@@ -296,11 +316,10 @@ def render(
             fig_d.dict_fontsizes['checksum'] = (f_checksum, 10.0, 'text')
             fig_d.dict_fontsizes['version'] = (f_version, 10.0, 'text')
 
-        if win.app.check_cancellations():
+        if cancelled():
             return
 
         # Channels
-        data = track['data']['float']
         sec = track['duration']
         rms_dbfs = analysis['rms_dbfs']
         true_peak_dbtp = analysis['true_peak_dbtp']
@@ -308,18 +327,21 @@ def render(
         w_max = analysis['w_max']
         with Timer('Drawing channels...', Steps.draw_ch, callback):
             ax_ch = []
+            # Drawn again from the pyramid at every canvas width, see repixelize().
+            fig_d.waveform = waveform
+            fig_d.waveform_lines = []
+            fig_d.duration = sec
             c = 0
             while c < nc and c < nc_max:
                 if c == 0:
                     ax_ch.append(subplot(gs[c, :]))
                 else:
                     ax_ch.append(subplot(gs[c, :], sharex=ax_ch[0]))
-                new_data, new_ns, new_range = pixelize(
-                    data[c], ax_ch[c], which='both', oversample=2
-                )
+                new_data = waveform.columns(c, int(xpixels(ax_ch[c]) * 2))
+                new_ns = len(new_data)
                 new_fs = new_ns / sec
                 new_range = np.arange(0.0, new_ns, 1) / new_fs
-                plot(new_range, new_data, color=c_color[c], linestyle='-')
+                fig_d.waveform_lines += plot(new_range, new_data, color=c_color[c], linestyle='-')
                 xlim(0, round(sec))
                 ylim(-1.0, 1.0)
                 f_channel_title = title(
@@ -349,7 +371,7 @@ def render(
                 axia.yaxis.grid(True, which='major', linestyle=':', color='k', linewidth=0.5)
         spi = c - 1
 
-        if win.app.check_cancellations():
+        if cancelled():
             return
 
         # Loudest
@@ -361,7 +383,7 @@ def render(
                 ax_max.set_facecolor((subplot_background_color)) # plot background
             plot(
                 np.arange(*w_max) / float(fs),
-                data[c_max][np.arange(*w_max)],
+                track['loudest'],
                 c_color[c_max],
             )
             ylim(-1.0, 1.0)
@@ -382,7 +404,7 @@ def render(
             fig_d.dict_fontsizes[f'loudness_xlabel'] = (f_loudness_xlabel, 10.0, 'text')
             axis_defaults(ax_max)
 
-        if win.app.check_cancellations():
+        if cancelled():
             return
 
         # Spectrum
@@ -485,7 +507,7 @@ def render(
             yticks(np.arange(-90, 0, 10), ('', -80, -70, -60, -50, -40, -30, '', ''))
             axis_defaults(ax_norm)
 
-        if win.app.check_cancellations():
+        if cancelled():
             return
 
         # Allpass
@@ -526,7 +548,7 @@ def render(
             fig_d.dict_fontsizes['f_allpass_ylabel'] = (f_allpass_ylabel, 10.0, 'text')
             axis_defaults(ax_ap)
 
-        if win.app.check_cancellations():
+        if cancelled():
             return
 
         # Histogram
@@ -569,7 +591,7 @@ def render(
             fig_d.dict_fontsizes['histogram_ylabel'] = (f_histogram_ylabel, 10.0, 'text')
             axis_defaults(ax_hist)
 
-        if win.app.check_cancellations():
+        if cancelled():
             return
 
         # Peak vs RMS
@@ -633,7 +655,7 @@ def render(
             yticks([-50, -40, -30, -20, -10, 0], ('', -40, -30, -20, -10, ''))
             axis_defaults(ax_pr)
 
-        if win.app.check_cancellations():
+        if cancelled():
             return
 
         # Shortterm crest
@@ -672,7 +694,7 @@ def render(
             ax_1s.xaxis.set_major_formatter(TIME_FMT)
             axis_defaults(ax_1s)
 
-        if win.app.check_cancellations():
+        if cancelled():
             return
 
         # EBU R 128
@@ -739,186 +761,342 @@ def render(
                 axis='y', which='major', labelsize=FONT_SMALL_SIZE, length=0
             )
 
-        #
-        # Plot/Paint/Draw detailed track analysis on GTK canvas.
-        #
+        plot = {
+            'figure': fig_d,
+            'aspect_ratio': pos['w']/pos['h'],
+            'dr': dr,
+            'dr_channels': dr_channels,
+            'c_layout': c_layout,
+        }
+    else:# Overview plot.
+        # Set Y-axis label, to display audio info.
+        info_o = _('DR = {}\nPeak = {:0.1f} dBFS\nCrest = {:0.1f} dB\nL$_k$ = {:0.1f} LU').format(
+            dr, float(peak_dbfs.max()), float(crest_total_db), l_kg + lufs_to_lu
+        )
+        header_o = _('{} [{}, {} channels, {} bits, {:0.1f} kHz, {} kbps]').format(
+            header, track['metadata']['encoding'], track['channels'], track['bitdepth'],
+            fs/1000, int(round(track['metadata']['bps'] / 1000.0))
+        )
+
+        if cancelled():
+            return
+
+        # Rasterized once shown, one column per pixel.
+        strip = Strip(
+            waveform,
+            OVERVIEW_W,
+            OVERVIEW_H,
+            c_color[:nc],
+            plt.rcParams['lines.linewidth'] * DPI / 72.0,
+        )
+
+        plot = {
+            'strip': strip,
+            'info': info_o,
+            'title': header_o,
+        }
+
+    return plot
+
+# Attach a plot from render() to its tab, on the main loop only.
+# A generator, every yield ends one idle callback slice.
+def attach(plot, tab_page, win, cancelled=None):
+    cancelled = cancelled or win.app.check_cancellations
+    if cancelled():
+        return
+    fig_d = plot['figure']
+
+    if 'strip' not in plot:# Detailed one track plot.
         canvas = FigureCanvasGTK4(fig_d)
         canvas.set_hexpand(True)
         canvas.set_vexpand(True)
 
+        # Move canvas on scroll event.
+        canvas.mpl_connect('scroll_event', win.on_scroll_over_canvas)
+
+        # Zoom keeps the waveforms at one column per pixel.
+        canvas.mpl_connect('resize_event', lambda event: repixelize(event.canvas.figure))
+
         # Keep pyplot canvas works best with a fixed aspect ratio.
         aspect_frame = Gtk.AspectFrame()
-        aspect_ratio = pos['w']/pos['h']
+        aspect_ratio = plot['aspect_ratio']
         aspect_frame.set_ratio(aspect_ratio)
         aspect_frame.set_child(canvas)
+        yield
+
+        if cancelled():
+            return
 
         tab_page.get_child().scrolled.set_child(aspect_frame)
 
         tab_page.tabbox.aspect_ratio = aspect_ratio
         tab_page.tabbox.canvas = canvas
 
-        if win.app.check_cancellations():
-            return
-
         # Set initial canvas size to be window width.
         new_canvas_width = 1080
         canvas.set_size_request(new_canvas_width, new_canvas_width//aspect_ratio)
         tab_page.tabbox.canvas_width = 1080
 
         # Style DR Meter widget.
+        dr = plot['dr']
         if dr < 0:
             tab_page.tabbox.int_dr = -1
             tab_page.tabbox.dr_val = '??.?'
         else:
             tab_page.tabbox.int_dr = int(dr)
             tab_page.tabbox.dr_val = str(dr) if dr > 10 else f'0{str(dr)}' # padding
-            tab_page.tabbox.dr_channels = dr_channels
-            tab_page.tabbox.c_layout = c_layout
+            tab_page.tabbox.dr_channels = plot['dr_channels']
+            tab_page.tabbox.c_layout = plot['c_layout']
 
         win.dr_change(tab_page.tabbox)
+
+        # Drawn when GTK paints the next frame.
+        canvas.draw_idle()
     else:# Overview plot.
-        w_o = 1212 # originally 606
-        h_o = 128 # originally 64
+        tabbox = tab_page.tabbox
 
         # Overview started?
-        overview_not_started = tab_page.get_child().scrolled.get_child() == None
-
-        n_axes = 1
-
-        box_as_frame = None
-        canvas = None
-        fig_d = None
-        ax_o = None
-        if overview_not_started:
-            win.n_figures += 1
-            fig_d = plt.figure(win.n_figures)
-            fig_d.dict_fontsizes = dict()
-            fig_d.dpi = DPI
-            fig_d.figsize = (w_o / DPI, h_o / DPI)
-
-            # Make subplot for current file.
-            ax_o = fig_d.add_subplot(111)
-            canvas = FigureCanvasGTK4(fig_d)
-            canvas.set_hexpand(True)
-
-            # Hold canvas.
-            box_as_frame = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
-            box_as_frame.append(canvas)
-
-            # Feature, not bug. Prevents expansion in width.
-            box_as_frame.set_halign(Gtk.Align.CENTER)
-            tab_page.get_child().scrolled.set_child(box_as_frame)
-        else:
-            # Find canvas. backend_gtk4agg.FigureCanvasGTK4Agg
-            canvas = tab_page.get_child().scrolled.get_child().get_child().get_last_child()
-
-            fig_d = canvas.figure
-
-            # Update figure size.
-            n_axes = len(fig_d.get_axes())
-            n_axes += 1
-
-        if win.app.check_cancellations():
-            return
-
-        # Set new canvas height.
-        new_height = (64 + 128) * n_axes
-
-        if not box_as_frame:
-            box_as_frame = canvas.get_parent()
-
-        # Resize figure's canvas.
-        fig_d.figsize = (w_o / DPI, new_height / DPI)
-        canvas.set_size_request(1212, new_height)
-        box_as_frame.set_size_request(1212, new_height)
-
-        # Add subplot, refresh grid, which maintains axes spacing.
-        if ax_o == None:
-            gs = gridspec.GridSpec(n_axes, 1)
-            for i, ax in enumerate(fig_d.axes):
-                ax.set_position(gs[i].get_position(fig_d))
-                ax.set_subplotspec(gs[i])
-            ax_o = fig_d.add_subplot(gs[n_axes - 1])
-
-        # Adjust borders, to gain space.
-        plt.subplots_adjust(left=0.04, right=0.82, top=1, bottom=0)
-
-        # Set Y-axis label, to display audio info.
-        info_o = _('DR = {}\nPeak = {:0.1f} dBFS\nCrest = {:0.1f} dB\nL$_k$ = {:0.1f} LU').format(
-            dr, float(peak_dbfs.max()), float(crest_total_db), l_kg + lufs_to_lu
+        if tabbox.overview == None:
+            view = overview_list()
+            tabbox.overview = view.get_model().get_model()
+            tabbox.scrolled.set_child(view)
+
+        # Rows are only drawn while visible, adding one costs the same for any number.
+        tabbox.overview.append(OverviewRow(plot))
+
+class OverviewRow(GObject.GObject):
+    '''
+    One file of an overview list, its strip rasterized only while shown
+    '''
+
+    def __init__(self, plot):
+        super().__init__()
+        self.title = plot['title']
+        self.info = plot['info']
+        self.strip = plot['strip']
+
+# Strips rasterized lately, to scroll back to them at once.
+TEXTURES = collections.OrderedDict() # OverviewRow: Gdk.Texture
+
+def overview_list():
+    '''
+    Scrollable list of overview rows, widgets only made for the visible ones
+    '''
+    store = Gio.ListStore.new(OverviewRow)
+    factory = Gtk.SignalListItemFactory()
+    factory.connect('setup', on_overview_row_setup)
+    factory.connect('bind', on_overview_row_bind)
+    factory.connect('unbind', on_overview_row_unbind)
+    view = Gtk.ListView.new(Gtk.NoSelection.new(store), factory)
+    view.set_vexpand(True)
+    return view
+
+def on_overview_row_setup(factory, list_item):
+    title = Gtk.Label(xalign=0, ellipsize=Pango.EllipsizeMode.END)
+    title.add_css_class('caption')
+    picture = Gtk.Picture(can_shrink=False)
+    picture.set_size_request(OVERVIEW_W, OVERVIEW_H)
+    info = Gtk.Label(xalign=0, valign=Gtk.Align.START)
+    info.add_css_class('caption')
+    strip_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+    strip_box.append(picture)
+    strip_box.append(info)
+    box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=4)
+    box.set_size_request(-1, OVERVIEW_H + OVERVIEW_LABELS_H)
+    box.set_halign(Gtk.Align.CENTER)
+    box.append(title)
+    box.append(strip_box)
+    list_item.set_child(box)
+
+def on_overview_row_bind(factory, list_item):
+    row = list_item.get_item()
+    box = list_item.get_child()
+    title = box.get_first_child()
+    picture = box.get_last_child().get_first_child()
+    info = box.get_last_child().get_last_child()
+    title.set_text(row.title)
+    info.set_markup(markup(row.info))
+    picture.set_paintable(strip_texture(row))
+
+def on_overview_row_unbind(factory, list_item):
+    list_item.get_child().get_last_child().get_first_child().set_paintable(None)
+
+def strip_texture(row):
+    texture = TEXTURES.pop(row, None)
+    if texture == None:
+        rgba = row.strip.image()
+        h, w = rgba.shape[:2]
+        texture = Gdk.MemoryTexture.new(
+            w, h, Gdk.MemoryFormat.R8G8B8A8, GLib.Bytes.new(rgba.tobytes()), w * 4
         )
-
-        ax_o.set_ylabel(info_o, fontsize='small', horizontalalignment='left', rotation=0)
+    TEXTURES[row] = texture
+    while len(TEXTURES) > STRIP_TEXTURES:
+        TEXTURES.popitem(last=False)
+    return texture
+
+def forget_rows(store):
+    for row in store:
+        TEXTURES.pop(row, None)
+    store.remove_all()
+
+def markup(text):
+    '''
+    Pango markup of a mathtext label, subscripts like L$_k$ included
+    '''
+    return re.sub(r'\$_\{?(\w+)\}?\$', r'<sub>\1</sub>', GLib.markup_escape_text(text))
+
+def overview_figure(rows, win):
+    '''
+    All rows of an overview in one figure, as it is saved
+    '''
+    DPI = win.app.pref_dpi_application
+    n_axes = max(1, len(rows))
+    win.n_figures += 1
+    fig_d = plt.figure(
+        win.n_figures,
+        figsize=(OVERVIEW_W / DPI, (OVERVIEW_LABELS_H + OVERVIEW_H) * n_axes / DPI),
+        dpi=DPI,
+    )
+    gs = gridspec.GridSpec(n_axes, 1, figure=fig_d)
+    for i, row in enumerate(rows):
+        ax_o = fig_d.add_subplot(gs[i])
+        ax_o.set_ylabel(row.info, fontsize='small', horizontalalignment='left', rotation=0)
         ax_o.yaxis.set_label_position("right")
         ax_o.yaxis.set_label_coords(1.01, 0.8, transform=None)
         ax_o.set_xticks([])
         ax_o.set_yticks([])
-        header_o = _('{} [{}, {} channels, {} bits, {:0.1f} kHz, {} kbps]').format(
-            header, track['metadata']['encoding'], track['channels'], track['bitdepth'],
-            fs/1000, int(round(track['metadata']['bps'] / 1000.0))
-        )
+        ax_o.set_title(row.title, fontsize='small', loc='left')
+        ax_o.imshow(row.strip.image(), aspect='1', interpolation='none')
 
-        ax_o.set_title(header_o, fontsize='small', loc='left')
-        fig_buf = plt.figure('buffer', figsize=(w_o / DPI, h_o / DPI), dpi=DPI)
-        w, h = fig_buf.canvas.get_width_height()
-        fig_buf.patch.set_visible(False)
-        ax_buf = plt.gca()
-
-        img_buf = np.zeros((h, w, 4), np.uint8)
-        img_buf[:, :, 0:3] = 255
-
-        if win.app.check_cancellations():
-            return
-
-        for i, ch in enumerate(data):
-            ax_buf.clear()
-            ax_buf.axis('off')
-            ax_buf.set_position([0, 0, 1, 1])
-            ax_buf.set_ylim(-1, 1)
-            ax_buf.set_xticks([])
-            ax_buf.set_yticks([])
-            new_ch, new_n, new_r = pixelize(ch, ax_buf, which='both', oversample=2)
-            ax_buf.plot(range(len(new_ch)), new_ch, color=c_color[i])
-            ax_buf.set_xlim(0, len(new_ch))
-            fig_buf.canvas.draw()
-            img = np.frombuffer(fig_buf.canvas.buffer_rgba(), np.uint8).reshape(
-                h, w, -1
-            )
-            img_buf[:, :, 0:3] = img[:, :, 0:3] * (img_buf[:, :, 0:3] / 255.0)
-            img_buf[:, :, -1] = np.maximum(img[:, :, -1], img_buf[:, :, -1])
-        img_buf[:, :, 0:3] = (img_buf[:, :, 3:4] / 255.0) * img_buf[:, :, 0:3] + (255 - img_buf[:, :, 3:4])
-        img_buf[:, :, -1] = 255
-
-        if win.app.check_cancellations():
-            return
-
-        plt.figure(fig_d.number)
-        plt.imshow(img_buf, aspect='1', interpolation='none')
-        plt.close(fig_buf) # close buffer
-
-    # Move canvas on scroll event.
-    canvas.mpl_connect('scroll_event', win.on_scroll_over_canvas)
-
-    canvas.draw()
-    canvas.flush_events()
+    # Adjust borders, to gain space.
+    fig_d.subplots_adjust(left=0.04, right=0.82, top=1, bottom=0)
+    return fig_d
 
 # Save canvas figure to image on disk.
 # Format 0=png, 1=jpeg, 2=svg, 3=webp, 4=tiff, 5=pdf, 6=eps
-def save_figure(fig, path, save_format, dpi):
+def save_figure(fig, path, save_format, dpi, effort='default', size=None):
+    save_format = save_format.lower()
+    if save_format in RASTER_FORMATS:
+        save_image(figure_image(fig, dpi, size), path, save_format, effort)
+        return
+
     # select image source figure
     plt.figure(fig.number)
 
     # If params are different than canvas plot,
     # there will be a flicker, during saving.
-    plt.savefig(path, format=save_format, bbox_inches='tight', dpi=dpi)
+    with offscreen_size(fig, size):
+        plt.savefig(path, format=save_format, bbox_inches='tight', dpi=dpi)
+
+def figure_image(fig, dpi, size=None):
+    '''
+    The figure as a PIL image at dpi, cut like bbox_inches='tight'
+
+    Taken from the canvas buffer if drawn at this DPI, else drawn once.
+    With a size in inches, the figure is drawn at that size offscreen.
+    '''
+    if size is None and dpi == fig.dpi and not fig.stale:
+        rgba = np.asarray(fig.canvas.buffer_rgba())
+    else:
+        with offscreen_size(fig, size, dpi):
+            fig.canvas.draw()
+            w, h = fig.canvas.get_width_height(physical=True)
+            rgba = np.asarray(fig.canvas.buffer_rgba())[:h, :w].copy()
+    # The drawn content, plus the padding of bbox_inches='tight'.
+    h, w = rgba.shape[:2]
+    pad = round(plt.rcParams['savefig.pad_inches'] * dpi)
+    pixels = rgba.view(np.uint32)[:, :, 0]
+    drawn = pixels != pixels[0, 0]
+    rows = np.flatnonzero(drawn.any(1))
+    cols = np.flatnonzero(drawn.any(0))
+    top, bottom, left, right = 0, h, 0, w
+    if rows.size:
+        top, bottom = max(0, rows[0] - pad), min(h, rows[-1] + 1 + pad)
+        left, right = max(0, cols[0] - pad), min(w, cols[-1] + 1 + pad)
+    return Image.fromarray(rgba[top:bottom, left:right])
+
+@contextlib.contextmanager
+def offscreen_size(fig, size, dpi=None):
+    '''
+    Set the figure size in inches, and dpi, for a while, leaving its canvas widget alone
+    '''
+    if size is None and dpi is None:
+        yield
+        return
+    old_size = fig.get_size_inches()
+    old_dpi = fig.dpi
+    if size is not None:
+        fig.set_size_inches(size, forward=False)
+    if dpi is not None:
+        fig.dpi = dpi
+    try:
+        yield
+    finally:
+        fig.dpi = old_dpi
+        fig.set_size_inches(old_size, forward=False)
+
+def snapshot(canvas):
+    '''
+    PNG bytes of what the canvas shows, None if it was never drawn
+    '''
+    try:
+        rgba = np.asarray(canvas.buffer_rgba())
+    except AttributeError:
+        return None # no renderer before the first draw
+    buf = io.BytesIO()
+    save_image(Image.fromarray(rgba), buf, 'png', 'fast')
+    return buf.getvalue()
+
+def release(fig):
+    plt.close(fig)
 
 def list_styles():
     return plt.style.available
 
+def repixelize(fig):
+    '''
+    Redraw the channel waveforms of a detailed figure for its current width
+    '''
+    for c, line in enumerate(fig.waveform_lines):
+        n = int(xpixels(line.axes) * 2)
+        if n == len(line.get_ydata()):
+            continue
+        new_data = fig.waveform.columns(c, n)
+        line.set_data(np.arange(n) * (fig.duration / n), new_data)
+
+
+class Strip:
+    '''
+    Waveform of an overview row, kept as the columns of its w by h image
+
+    A few kilobytes per file, rasterized again whenever the row is shown.
+    '''
+
+    def __init__(self, waveform, w, h, colors, linewidth):
+        self.w = w
+        self.h = h
+        self.colors = colors
+        self.linewidth = linewidth
+        self.y = np.array([waveform.columns(c, w) for c in range(len(colors))], np.float16)
+
+    def columns(self, c, n):
+        return self.y[c].astype(np.float64) # n is always w
+
+    def image(self):
+        return rasterize(self, self.w, self.h, self.colors, self.linewidth)
+
+
 def xpixels(ax):
     return np.round(ax.bbox.bounds[2])
 
 def pixelize(x, ax, method='linear', which='both', oversample=1, span=None):
+    '''
+    Max and/or min of x in oversample bins per pixel of ax
+
+    The bin edges are spaced evenly over span, linear or on a log10 scale,
+    and reduced with one reduceat() each. Returns (y, n, r), the values,
+    interleaved max and min with 'both', their count and the bin ends.
+    '''
     if not span:
         span = (0, len(x))
         if method == 'log10':
@@ -928,30 +1106,35 @@ def pixelize(x, ax, method='linear', which='both', oversample=1, span=None):
     if which == 'both':
         minmax = 2
     nw = int(pixels * oversample)
-    w = (span[1] - span[0]) / (pixels * oversample)
     n = nw * minmax
+    if method == 'linear':
+        edges = np.round(np.linspace(span[0], span[1], nw + 1)).astype(np.intp)
+        starts = edges[:-1]
+    elif method == 'log10':
+        edges = np.round(np.logspace(np.log10(span[0]), np.log10(span[1]), nw + 1)).astype(np.intp)
+        # 1-based edges, each bin also takes the value at the previous end.
+        starts = edges[:-1] - 1
+    edges[-1] = span[1]
+    x = np.asarray(x)[: span[1]]
+    starts = np.minimum(starts, len(x) - 1)
+
+    def reduce(f):
+        # reduceat() ends a bin before the next start, log10 bins at their end.
+        y = f.reduceat(x, starts)
+        if method == 'log10':
+            y = f(y, x[np.minimum(edges[1:], len(x)) - 1])
+        return y
+
     y = np.zeros(n)
     r = np.zeros(n)
-    for i in range(nw):
-        if method == 'linear':
-            j = int(np.round(i * w + span[0]))
-            k = int(np.round(j + w + span[0]))
-        elif method == 'log10':
-            a = np.log10(span[1]) - np.log10(span[0])
-            b = np.log10(span[0])
-            j = int(np.round(10 ** (i / float(nw) * a + b)) - 1)
-            k = int(np.round(10 ** ((i + 1) / float(nw) * a + b)))
-        if i == nw - 1 and k != span[1]:
-            log.debug('pixelize tweak k')
-            k = span[1]
-        r[i] = k
-        if which == 'max':
-            y[i] = x[j:k].max()
-        elif which == 'min':
-            y[i] = x[j:k].min()
-        elif which == 'both':
-            y[i * minmax] = x[j:k].max()
-            y[i * minmax + 1] = x[j:k].min()
+    r[:nw] = edges[1:]
+    if which == 'max':
+        y[:] = reduce(np.maximum)
+    elif which == 'min':
+        y[:] = reduce(np.minimum)
+    elif which == 'both':
+        y[0::2] = reduce(np.maximum)
+        y[1::2] = reduce(np.minimum)
     return (y, n, r)
 
 def mark_span(ax, span):
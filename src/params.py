@@ -78,7 +78,16 @@ def kfilter_coeffs(fs):
     return (b, a)
 
 
-def fir_coeffs():
+def fir_coeffs(oversampling=4):
+    '''
+    Polyphase interpolation filter, one row of 24 taps per phase
+
+    The 4x filter is the one from ITU-R BS.1770. Other factors (2 or more)
+    get a Kaiser windowed sinc with the same number of taps per phase.
+    '''
+    if oversampling != 4:
+        h = signal.firwin(24 * oversampling, 1.0 / oversampling, window=('kaiser', 8.0))
+        return (h * oversampling).reshape(24, oversampling).T
     return np.array(
         [
             [
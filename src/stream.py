@@ -0,0 +1,403 @@
+'''
+Copyright 2024 ITProjects
+
+This program is free software: you can redistribute it and/or modify
+it under the terms of the GNU General Public License as published by
+the Free Software Foundation, either version 2 of the License, or
+(at your option) any later version.
+
+This program is distributed in the hope that it will be useful,
+but WITHOUT ANY WARRANTY; without even the implied warranty of
+MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+GNU General Public License for more details.
+
+You should have received a copy of the GNU General Public License
+along with this program.  If not, see <http://www.gnu.org/licenses/>.
+
+Streaming analysis.
+
+Every metric of analysis.analyze has an accumulator here, which is fed
+fixed-size PCM blocks with update(fixed, data) and carries its filter
+state and partial frames between blocks. Peak memory depends on the
+block size, not on the track length. The results match the whole-buffer
+functions in analysis.py. The waveform pyramid and the loudest samples
+are kept as well, so the track is a compact one afterwards (see
+artifact.py).
+'''
+
+import logging
+import time
+
+import numpy as np
+from scipy.fft import next_fast_len
+
+from .analysis import (
+    FIELDS,
+    METRICS,
+    AllpassBank,
+    Features,
+    LoudnessIndex,
+    TruePeakMeter,
+    bit_usage,
+    block_stats,
+    dynamic_range,
+    effective_bits,
+    frame_stats,
+    energy_checksum,
+    loudest_search,
+    loudest_window,
+    norm_spectrum,
+    peak_and_rms,
+    peak_vs_rms,
+    plr,
+    power_spectrum,
+    resolve_metrics,
+    sample_counts,
+)
+from .artifact import COLUMNS, Waveform, extremes
+from .utils import Steps
+
+log = logging.getLogger(__package__)
+
+
+class Framer:
+    '''
+    Cut incoming blocks into frames of a fixed size, keeping the remainder
+    '''
+
+    def __init__(self, size):
+        self.size = size
+        self.rest = None
+
+    def push(self, x):
+        if self.rest is not None:
+            x = np.concatenate((self.rest, x), 1)
+        n = x.shape[1] - x.shape[1] % self.size
+        self.rest = x[:, n:].copy()
+        return x[:, :n].reshape(x.shape[0], -1, self.size)
+
+
+class Loudest:
+    '''
+    Keep every sample above 95% of the running peak; the final peak can
+    only be higher, so no sample above 95% of it is ever missed.
+    '''
+
+    def __init__(self, fs, nc):
+        self.fs = fs
+        self.peak = 0.0
+        self.n = 0
+        self.blocks = 0
+        self.searched = 0
+        self.index = [[np.zeros(0, dtype=np.intp)] for c in range(nc)]
+        self.value = [[np.zeros(0)] for c in range(nc)]
+
+    def update(self, raw_data, data):
+        a = np.abs(data)
+        peaks = a.max(1)
+        self.peak = max(self.peak, peaks.max())
+        limit = 0.95 * self.peak
+        self.blocks += a.shape[0]
+        for c in np.flatnonzero(peaks > limit):
+            self.searched += 1
+            i = np.flatnonzero(a[c] > limit)
+            self.index[c].append(i + self.n)
+            self.value[c].append(a[c, i])
+            if len(self.index[c]) > 64:
+                self.index[c], self.value[c] = self.candidates(c, limit)
+        self.n += data.shape[1]
+
+    def candidates(self, c, limit):
+        index = np.concatenate(self.index[c])
+        value = np.concatenate(self.value[c])
+        keep = value > limit
+        return [index[keep]], [value[keep]]
+
+    def finish(self, ns):
+        limit = 0.95 * self.peak
+        log.debug('Loudest: searched %d of %d blocks', self.searched, self.blocks)
+        candidates = [self.candidates(c, limit)[0][0] for c in range(len(self.index))]
+        c_max, s_max, ns_max = loudest_search(candidates, self.fs // 50)
+        return c_max, s_max, ns_max, loudest_window(s_max, self.fs, ns)
+
+
+class TruePeaks(TruePeakMeter):
+    def update(self, raw_data, data):
+        super().update(data)
+
+
+class EbuR128(LoudnessIndex):
+    def update(self, raw_data, data):
+        super().update(data)
+
+
+class Spectrum:
+    def __init__(self, fs, nc, workers=None):
+        self.workers = workers
+        self.fs = fs
+        self.n = next_fast_len(fs)
+        self.wfunc = np.blackman(fs)
+        self.framer = Framer(fs)
+        self.spec = np.zeros((nc, self.n // 2 + 1))
+        self.frames = 0
+
+    def update(self, raw_data, data):
+        frames = self.framer.push(data)
+        self.spec += power_spectrum(frames, self.wfunc, self.n, self.workers)
+        self.frames += frames.shape[1]
+
+    def finish(self, data_rms):
+        return norm_spectrum(self.spec, self.frames, self.fs, self.n, data_rms)
+
+
+class Allpass(AllpassBank):
+    def update(self, raw_data, data):
+        super().update(data)
+
+
+class Histogram:
+    def __init__(self, bits, nc):
+        self.bits = bits
+        self.hbits = 18 if bits > 16 else bits
+        self.hist = np.zeros((nc, 2**self.hbits), dtype=np.int64)
+        self.top = [0] * nc
+        self.used = [0] * nc
+
+    def update(self, raw_data, data):
+        for c in range(raw_data.shape[0]):
+            self.hist[c] += sample_counts(raw_data[c], self.bits, self.hbits)
+            top, used = bit_usage(raw_data[c])
+            self.top[c] = max(self.top[c], top)
+            self.used[c] |= used
+
+    def finish(self):
+        hist_bits = np.array([effective_bits(t, u) for t, u in zip(self.top, self.used)])
+        return self.hist, hist_bits
+
+
+class Seconds:
+    '''
+    Per second block_stats, shared by peak and RMS, peak vs RMS and DR
+    '''
+
+    def __init__(self, fs):
+        self.fs = fs
+        self.framer = Framer(fs)
+        self.stats = []
+
+    def update(self, raw_data, data):
+        self.stats.append(frame_stats(self.framer.push(data)))
+
+    def finish(self):
+        b_max, b_min, b_sumsq = (np.concatenate([x[i] for x in self.stats], 1) for i in range(3))
+        tail = block_stats(self.framer.rest, self.fs)
+        return (
+            np.append(b_max, tail[0], 1),
+            np.append(b_min, tail[1], 1),
+            np.append(b_sumsq, tail[2], 1),
+            np.append(np.full(b_max.shape[1], self.fs), tail[3]),
+        )
+
+
+class Pyramid:
+    '''
+    Finest level of the waveform pyramid, the coarser ones made at the end
+
+    Blocks start at one sample and double whenever the samples seen reach
+    twice COLUMNS blocks, so the finest level is that of finest_block()
+    for the samples decoded, whatever the length probed.
+    '''
+
+    def __init__(self):
+        self.block = 1
+        self.framer = Framer(1)
+        self.maxs = []
+        self.mins = []
+        self.n = 0
+
+    def update(self, raw_data, data):
+        while data.shape[1]:
+            # Up to the next doubling, where no partial block is left.
+            k = min(data.shape[1], 2 * COLUMNS * self.block - self.n)
+            frames = self.framer.push(data[:, :k])
+            self.maxs.append(frames.max(2).astype(np.float32))
+            self.mins.append(frames.min(2).astype(np.float32))
+            self.n += k
+            data = data[:, k:]
+            if self.n == 2 * COLUMNS * self.block:
+                mx, mn = extremes(np.concatenate(self.maxs, 1), np.concatenate(self.mins, 1), 2)
+                self.maxs, self.mins = [mx], [mn]
+                self.block *= 2
+                self.framer = Framer(self.block)
+
+    def finish(self, ns):
+        mx = np.concatenate(self.maxs, 1)
+        mn = np.concatenate(self.mins, 1)
+        rest = self.framer.rest
+        if rest is not None and rest.shape[1]:
+            tail = extremes(rest, rest, rest.shape[1])
+            mx = np.append(mx, tail[0], 1)
+            mn = np.append(mn, tail[1], 1)
+        return Waveform.from_extremes(self.block, mx, mn, ns)
+
+
+class Checksum:
+    def __init__(self):
+        self.checksum = np.uint64(0)
+
+    def update(self, raw_data, data):
+        self.checksum += energy_checksum(raw_data)
+
+    def finish(self):
+        return self.checksum
+
+
+def analyze_stream(track, callback=None, metrics=None, workers=None):
+    '''
+    Analyze a track from input.open_file or stream_file, block by block
+
+    Returns the same dict as analysis.analyze, metrics and workers alike.
+    The track is made compact: 'stream' is replaced by the 'waveform'
+    pyramid and the 'loudest' samples, decoded again from a seek, and
+    'samples' and 'duration' are corrected, as they are only known once
+    the stream ends.
+    '''
+    fs = track['samplerate']
+    nc = track['channels']
+    bits = track['bitdepth']
+    cl = track['channel_layout']
+    needed = resolve_metrics(metrics)
+
+    log.info("Processing %s", track['metadata']['filename'])
+
+    descs = {
+        Steps.calc_pr: 'Calculating peak and RMS...',
+        Steps.calc_loud: 'Calculating loudest...',
+        Steps.calc_tp: 'Calculating true peaks...',
+        Steps.calc_ebur128: 'Calculating EBU R 128...',
+        Steps.calc_plr: 'Calculating PLR...',
+        Steps.calc_spec: 'Calculating spectrum...',
+        Steps.calc_ap: 'Calculating allpass...',
+        Steps.calc_hist: 'Calculating histogram...',
+        Steps.calc_pvsr: 'Calculating peak vs RMS...',
+        Steps.calc_dr: 'Calculating DR...',
+        Steps.calc_csum: 'Calculating checksum...',
+    }
+    # Accumulators of the metrics asked for, per second stats are shared.
+    accumulators = {
+        Steps.calc_pr: (('peak', 'pvsr', 'dr'), lambda: Seconds(fs)),
+        Steps.calc_loud: (('loudest',), lambda: Loudest(fs, nc)),
+        Steps.calc_tp: (('true_peak',), lambda: TruePeaks(fs, nc)),
+        Steps.calc_ebur128: (('ebur128',), lambda: EbuR128(fs, nc, cl)),
+        Steps.calc_spec: (('spectrum',), lambda: Spectrum(fs, nc, workers)),
+        Steps.calc_ap: (('allpass',), lambda: Allpass(fs, nc, workers)),
+        Steps.calc_hist: (('histogram',), lambda: Histogram(bits, nc)),
+        Steps.calc_csum: (('checksum',), lambda: Checksum()),
+    }
+    acc = {tid: make() for tid, (ms, make) in accumulators.items() if needed.intersection(ms)}
+    secs = dict.fromkeys(descs, 0.0)
+    pyramid = Pyramid()
+
+    ns = 0
+    for raw_data, data in track.pop('stream'):
+        for tid, a in acc.items():
+            start = time.time()
+            a.update(raw_data, data)
+            secs[tid] += time.time() - start
+        pyramid.update(raw_data, data)
+        ns += data.shape[1]
+    track['samples'] = ns
+    track['duration'] = ns / float(fs)
+
+    # Report the time spent per step, blocks included.
+    def finish(tid, func, *args):
+        if callback:
+            callback('start', tid, desc=descs[tid])
+        else:
+            log.info(descs[tid])
+        start = time.time()
+        result = func(*args)
+        secs[tid] += time.time() - start
+        if callback:
+            callback('stop', tid, secs=secs[tid])
+        else:
+            log.debug('%7.1f ms', secs[tid] * 1000)
+        return result
+
+    # Analysis Product
+    result = {
+        'frames': ns // fs,
+        'n_1s': ns // fs,
+        'skipped': [],
+    }
+    for m in METRICS:
+        result.update(dict.fromkeys(FIELDS[m]))
+        if m not in needed:
+            result['skipped'].extend(FIELDS[m])
+
+    if Steps.calc_pr in acc:
+        features = Features(None, fs, acc[Steps.calc_pr].finish())
+    if 'peak' in needed:
+        (
+            data_peak,
+            data_rms,
+            result['peak_dbfs'],
+            result['rms_dbfs'],
+            result['crest_db'],
+            result['crest_total_db'],
+        ) = finish(Steps.calc_pr, peak_and_rms, None, features.stats())
+    if 'loudest' in needed:
+        (
+            result['c_max'],
+            result['s_max'],
+            result['ns_max'],
+            result['w_max'],
+        ) = finish(Steps.calc_loud, acc[Steps.calc_loud].finish, ns)
+    if 'true_peak' in needed:
+        sttp, result['true_peak_dbtp'] = finish(Steps.calc_tp, acc[Steps.calc_tp].finish, ns, data_peak)
+    if 'ebur128' in needed:
+        (
+            result['l_kg'],
+            result['stl'],
+            result['lra'],
+            result['mtl'],
+        ) = finish(Steps.calc_ebur128, acc[Steps.calc_ebur128].finish, ns)
+    if 'plr' in needed:
+        result['plr_lu'], result['stplr_lu'] = finish(
+            Steps.calc_plr, plr, result['true_peak_dbtp'], result['l_kg'], sttp, result['stl']
+        )
+    if 'spectrum' in needed:
+        result['norm_spec'] = finish(Steps.calc_spec, acc[Steps.calc_spec].finish, data_rms)
+    if 'allpass' in needed:
+        result['ap_freqs'], result['ap_crest'] = finish(Steps.calc_ap, acc[Steps.calc_ap].finish)
+    if 'histogram' in needed:
+        result['hist'], result['hist_bits'] = finish(Steps.calc_hist, acc[Steps.calc_hist].finish)
+    if 'pvsr' in needed:
+        (
+            result['peak_1s_dbfs'],
+            result['rms_1s_dbfs'],
+            result['crest_1s_db'],
+        ) = finish(Steps.calc_pvsr, peak_vs_rms, None, fs, ns, nc, features.stats())
+    if 'dr' in needed:
+        dr, dr_channels = finish(Steps.calc_dr, dynamic_range, None, fs, ns, nc, features.stats(3))
+        if dr == 0:
+            dr = -1
+            dr_channels = None
+        result['dr'], result['dr_channels'] = dr, dr_channels
+    if 'checksum' in needed:
+        result['checksum'] = finish(Steps.calc_csum, acc[Steps.calc_csum].finish)
+
+    # What artifact.compact keeps of a decoded track.
+    track['waveform'] = pyramid.finish(ns)
+    track['loudest'] = None
+    window = track.pop('window', None)
+    if result['c_max'] is not None and window:
+        start, stop = result['w_max']
+        loudest = window(start, stop)
+        if loudest is not None:
+            # Sized by the samples seen, a seek may not reach as far.
+            samples = loudest[result['c_max'], : stop - start]
+            track['loudest'] = np.zeros(stop - start, samples.dtype)
+            track['loudest'][: samples.size] = samples
+
+    return result
@@ -23,9 +23,34 @@ import sys
 import time
 
 import numpy as np
+from PIL import Image
 
 log = logging.getLogger(__package__)
 
+# PIL options of raster formats by save effort. Only 'small' quantises
+# PNG to 256 colours, the others keep every colour of the figure.
+SAVE_EFFORTS = ('fast', 'default', 'small')
+ENCODER_OPTIONS = {
+    'fast': {
+        'PNG': {'compress_level': 1},
+        'JPEG': {'quality': 90},
+        'WEBP': {'quality': 90, 'method': 0},
+        'TIFF': {},
+    },
+    'default': {
+        'PNG': {'compress_level': 6},
+        'JPEG': {'quality': 90, 'optimize': True},
+        'WEBP': {'quality': 90, 'method': 4},
+        'TIFF': {},
+    },
+    'small': {
+        'PNG': {'optimize': True},
+        'JPEG': {'quality': 80, 'optimize': True},
+        'WEBP': {'quality': 80, 'method': 6},
+        'TIFF': {'compression': 'tiff_adobe_deflate'},
+    },
+}
+
 
 class Timer:
     def __init__(self, description=None, tid=None, callback=None):
@@ -80,6 +105,7 @@ class Steps:
     ) = range(steps)
     times = [0] * steps
     descs = [''] * steps
+    critical_path = ('', 0)
 
     @classmethod
     def callback(cls, event, tid, desc=None, secs=None):
@@ -87,6 +113,8 @@ class Steps:
             cls.start(tid, desc)
         elif event == 'stop':
             cls.stop(tid, secs)
+        elif event == 'path':
+            cls.critical_path = (desc, secs)
 
     @classmethod
     def start(cls, tid, desc=None):
@@ -103,12 +131,27 @@ class Steps:
     def report(cls):
         for desc, t in zip(cls.descs, cls.times):
             log.info("%s took %5.1f %%", desc, 100 * t / cls.times[0])
+        desc, secs = cls.critical_path
+        if desc:
+            log.info("Critical path %s took %5.1f %%", desc, 100 * secs / cls.times[0])
 
 
 class Supervisor(object):
     pass
 
 
+def save_image(img, path, fmt, effort='default'):
+    '''
+    Encode a PIL image as png, jpg/jpeg, webp or tiff with the options of an effort
+    '''
+    fmt = {'jpg': 'JPEG'}.get(fmt.lower(), fmt.upper())
+    if fmt == 'JPEG':
+        img = img.convert('RGB')
+    elif fmt == 'PNG' and effort == 'small':
+        img = img.convert(mode='P', palette=Image.Palette.ADAPTIVE, colors=256)
+    img.save(path, fmt, **ENCODER_OPTIONS[effort][fmt])
+
+
 def aid(x):
     # This function returns the memory
     # block address of an array.
@@ -0,0 +1,86 @@
+import copy
+
+import numpy as np
+import pytest
+
+from masvisgtk.analysis import analyze
+from masvisgtk.artifact import MAGIC, Waveform, compact, load, save
+
+from conftest import make_track
+
+
+@pytest.fixture(scope='module')
+def analyzed(track):
+    analysis = analyze(copy.deepcopy(track))
+    return compact(track, analysis), analysis
+
+
+@pytest.mark.parametrize('mmap', [True, False])
+def test_save_load_round_trip(tmp_path, analyzed, mmap):
+    track, analysis = analyzed
+    path = str(tmp_path / 'x.masvis')
+    save(path, track, analysis)
+    loaded_track, loaded_analysis = load(path, mmap)
+
+    assert loaded_analysis.keys() == analysis.keys()
+    for key, value in analysis.items():
+        loaded = loaded_analysis[key]
+        if isinstance(value, np.ndarray):
+            assert loaded.dtype == value.dtype
+            assert loaded.flags.writeable != mmap
+            np.testing.assert_array_equal(loaded, value)
+        else:
+            assert type(loaded) is type(value) or np.isscalar(value)
+            assert loaded == value or (loaded is None and value is None), key
+
+    assert loaded_track.keys() == track.keys()
+    for key in track.keys() - {'waveform', 'loudest'}:
+        assert loaded_track[key] == track[key]
+    np.testing.assert_array_equal(loaded_track['loudest'], track['loudest'])
+    waveform = loaded_track['waveform']
+    assert waveform.blocks == track['waveform'].blocks
+    assert waveform.samples == track['waveform'].samples
+    for a, b in zip(waveform.maxs + waveform.mins, track['waveform'].maxs + track['waveform'].mins):
+        np.testing.assert_array_equal(a, b)
+
+
+def test_save_decoded_track_is_compacted(tmp_path, track, analyzed):
+    compacted, analysis = analyzed
+    path = str(tmp_path / 'x.masvis')
+    save(path, track, analysis)
+    loaded_track, _ = load(path)
+    assert 'data' not in loaded_track
+    np.testing.assert_array_equal(loaded_track['loudest'], compacted['loudest'])
+
+
+def test_load_rejects_other_files(tmp_path):
+    path = tmp_path / 'x.masvis'
+    path.write_bytes(MAGIC[:-1] + b'\x00' + bytes(64))
+    with pytest.raises(ValueError):
+        load(str(path))
+
+
+def test_compact_track_returned_as_is(analyzed):
+    track, analysis = analyzed
+    assert compact(track, analysis) is track
+
+
+@pytest.mark.parametrize('ns', [1000, 2**16 + 7, 10**6 + 3])
+def test_waveform_columns(ns):
+    data = make_track(ns / 8000, 8000, 2)['data']['float']
+    waveform = Waveform.from_data(data)
+    for n in (100, 1212, 5000):
+        # The coarsest level with 8 blocks per column, or the finest one,
+        # column edges rounded down to its blocks and the last column
+        # running to the end.
+        block = max([b for b in waveform.blocks if b * 8 <= ns / n], default=waveform.blocks[0])
+        nblocks = -(-ns // block)
+        starts = np.minimum(np.round(np.linspace(0, ns, n + 1)).astype(np.intp) // block, nblocks - 1)
+        starts[-1] = nblocks
+        for c in range(2):
+            y = waveform.columns(c, n)
+            assert y.shape == (2 * n,)
+            for i in range(n):
+                x = data[c, starts[i] * block : max(starts[i + 1], starts[i] + 1) * block]
+                assert y[2 * i] == np.float32(x.max())
+                assert y[2 * i + 1] == np.float32(x.min())
@@ -0,0 +1,124 @@
+import copy
+import os
+import sqlite3
+import threading
+
+import numpy as np
+import pytest
+
+from masvisgtk.analysis import analyze
+from masvisgtk.artifact import compact
+from masvisgtk.cache import AnalysisCache
+
+
+@pytest.fixture(scope='module')
+def analyzed(track):
+    analysis = analyze(copy.deepcopy(track))
+    return compact(track, analysis), analysis
+
+
+@pytest.fixture
+def infiles(tmp_path):
+    paths = []
+    for i in range(4):
+        path = tmp_path / ('%d.wav' % i)
+        path.write_bytes(b'audio %d' % i)
+        paths.append(str(path))
+    return paths
+
+
+def new_cache(tmp_path, **kwargs):
+    return AnalysisCache(str(tmp_path / 'cache' / 'index.sqlite'), **kwargs)
+
+
+def rows(cache):
+    db = sqlite3.connect(cache.path)
+    try:
+        return db.execute('SELECT path, version FROM artifacts ORDER BY used').fetchall()
+    finally:
+        db.close()
+
+
+def entry_bytes(cache, infile, analyzed):
+    cache.put(infile, *analyzed)
+    size = os.path.getsize(cache.artifact(os.path.realpath(infile)))
+    cache.clear()
+    return size
+
+
+def test_put_get(tmp_path, infiles, analyzed):
+    cache = new_cache(tmp_path)
+    assert cache.get(infiles[0]) is None
+    cache.put(infiles[0], *analyzed)
+    track, analysis = cache.get(infiles[0])
+    assert analysis['dr'] == analyzed[1]['dr']
+    np.testing.assert_array_equal(track['loudest'], analyzed[0]['loudest'])
+    assert cache.get(infiles[1]) is None
+    assert not [f for f in os.listdir(os.path.dirname(cache.path)) if f.endswith('.part')]
+
+
+def test_changed_file_is_no_hit(tmp_path, infiles, analyzed):
+    cache = new_cache(tmp_path)
+    cache.put(infiles[0], *analyzed)
+    with open(infiles[0], 'ab') as f:
+        f.write(b'more')
+    assert cache.get(infiles[0]) is None
+
+
+def test_verify_checks_content(tmp_path, infiles, analyzed):
+    cache = new_cache(tmp_path, verify=True)
+    cache.put(infiles[0], *analyzed)
+    assert cache.get(infiles[0]) is not None
+    st = os.stat(infiles[0])
+    with open(infiles[0], 'r+b') as f:
+        f.write(b'AUDIO')
+    os.utime(infiles[0], ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert cache.get(infiles[0]) is None
+
+
+def test_limited_analysis_is_not_stored(tmp_path, infiles, track, analyzed):
+    cache = new_cache(tmp_path)
+    cache.put(infiles[0], *analyzed)
+    limited = analyze(copy.deepcopy(track), metrics=['dr'])
+    cache.put(infiles[0], compact(track, limited), limited)
+    cache.put(infiles[1], compact(track, limited), limited)
+    assert cache.get(infiles[0])[1]['skipped'] == []
+    assert cache.get(infiles[0], ['dr']) is not None
+    assert cache.get(infiles[1], ['dr']) is None
+
+
+def test_evict_least_recently_used(tmp_path, infiles, analyzed):
+    size = entry_bytes(new_cache(tmp_path), infiles[0], analyzed)
+    cache = new_cache(tmp_path, max_bytes=int(2.5 * size))
+    cache.put(infiles[0], *analyzed)
+    cache.put(infiles[1], *analyzed)
+    cache.get(infiles[0]) # now used after infiles[1]
+    cache.put(infiles[2], *analyzed)
+    assert [os.path.basename(p) for p, v in rows(cache)] == ['0.wav', '2.wav']
+    assert cache.get(infiles[1]) is None
+    assert len([f for f in os.listdir(os.path.dirname(cache.path)) if f.endswith('.masvis')]) == 2
+
+
+def test_evict_other_versions_first(tmp_path, infiles, analyzed):
+    size = entry_bytes(new_cache(tmp_path), infiles[0], analyzed)
+    cache = new_cache(tmp_path, max_bytes=int(1.5 * size))
+    cache.put(infiles[0], *analyzed)
+    db = sqlite3.connect(cache.path)
+    with db:
+        db.execute("UPDATE artifacts SET version = 'old', used = used + 1000")
+    db.close()
+    # The stale entry, however recent, neither counts nor stays.
+    cache.put(infiles[1], *analyzed)
+    assert [(os.path.basename(p), v) for p, v in rows(cache)] == [('1.wav', cache.version)]
+
+
+def test_concurrent_put(tmp_path, infiles, analyzed):
+    cache = new_cache(tmp_path)
+    threads = [threading.Thread(target=cache.put, args=(infiles[0], *analyzed)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    track, analysis = cache.get(infiles[0])
+    assert analysis['checksum'] == analyzed[1]['checksum']
+    assert [f for f in os.listdir(os.path.dirname(cache.path)) if f.endswith('.part')] == []
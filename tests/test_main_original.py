@@ -0,0 +1,17 @@
+from masvisgtk import main_original
+
+
+def test_run_batch_jobs_with_memory_limit(tmp_path, monkeypatch):
+    # Inputs that do not exist are only logged, each yields no overview.
+    infiles = [str(tmp_path / ('%d.wav' % i)) for i in range(5)]
+    options = {'dtype': 'float', 'accuracy': False, 'stream': None, 'destdir': ''}
+    estimated = []
+
+    def memory_estimate(infile, dtype='float', stream=None):
+        estimated.append(infile)
+        return 40
+
+    monkeypatch.setattr(main_original, 'memory_estimate', memory_estimate)
+    results = list(main_original.run_batch(infiles, options, jobs=2, memory=100))
+    assert results == [{}] * len(infiles)
+    assert sorted(estimated) == sorted(set(estimated))
@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from masvisgtk.artifact import Waveform, rasterize
+from masvisgtk.output import pixelize
+
+from conftest import make_track
+
+
+def axes(pixels):
+    return SimpleNamespace(bbox=SimpleNamespace(bounds=(0, 0, pixels, 100)))
+
+
+def pixelize_log10(x, pixels, which, oversample, span):
+    '''
+    The per pixel loop pixelize() replaced, for log10 bins
+    '''
+    minmax = 2 if which == 'both' else 1
+    nw = int(pixels * oversample)
+    y = np.zeros(nw * minmax)
+    r = np.zeros(nw * minmax)
+    a = np.log10(span[1]) - np.log10(span[0])
+    b = np.log10(span[0])
+    for i in range(nw):
+        j = int(np.round(10 ** (i / float(nw) * a + b)) - 1)
+        k = int(np.round(10 ** ((i + 1) / float(nw) * a + b)))
+        if i == nw - 1:
+            k = span[1]
+        r[i] = k
+        if which == 'max':
+            y[i] = x[j:k].max()
+        elif which == 'min':
+            y[i] = x[j:k].min()
+        else:
+            y[2 * i] = x[j:k].max()
+            y[2 * i + 1] = x[j:k].min()
+    return y, nw * minmax, r
+
+
+@pytest.mark.parametrize('which', ['max', 'min', 'both'])
+@pytest.mark.parametrize('pixels, span', [(300, (20, 22050)), (1000, (20, 24000)), (200, None)])
+def test_pixelize_log10_as_before(which, pixels, span):
+    x = np.random.default_rng(1).normal(size=24001)
+    expected = pixelize_log10(x, pixels, which, 1, span or (1, len(x) + 1))
+    y, n, r = pixelize(x, axes(pixels), method='log10', which=which, span=span)
+    assert n == expected[1]
+    np.testing.assert_array_equal(y, expected[0])
+    np.testing.assert_array_equal(r, expected[2])
+
+
+@pytest.mark.parametrize('which', ['max', 'min', 'both'])
+@pytest.mark.parametrize('size, pixels, oversample', [(65536, 300, 2), (1000, 777, 1), (2**18, 1000, 2)])
+def test_pixelize_linear_partition(which, size, pixels, oversample):
+    x = np.random.default_rng(2).normal(size=size)
+    y, n, r = pixelize(x, axes(pixels), which=which, oversample=oversample)
+    nw = pixels * oversample
+    edges = np.round(np.linspace(0, size, nw + 1)).astype(int)
+    assert n == nw * (2 if which == 'both' else 1)
+    np.testing.assert_array_equal(r[:nw], edges[1:])
+    for i in range(nw):
+        # Bins cover every value once, an empty one repeats its start.
+        part = x[edges[i] : max(edges[i + 1], edges[i] + 1)]
+        if which == 'max':
+            assert y[i] == part.max()
+        elif which == 'min':
+            assert y[i] == part.min()
+        else:
+            assert (y[2 * i], y[2 * i + 1]) == (part.max(), part.min())
+
+
+def test_rasterize():
+    data = make_track(10, 8000, 2)['data']['float']
+    data[0] *= 0.8
+    data[1] *= 0.25
+    waveform = Waveform.from_data(data)
+    img = rasterize(waveform, 300, 64, ['#ff0000', '#0000ff'], 1.0)
+    assert img.shape == (64, 300, 4) and img.dtype == np.uint8
+    assert np.all(img[:, :, 3] == 255)
+    rgb = img[:, :, :3]
+    # White beyond both channels, where they overlap the inks multiply
+    # to black, red alone beyond the quiet channel.
+    assert np.all(rgb[0] == 255) and np.all(rgb[-1] == 255)
+    assert np.all(rgb[32] == 0)
+    # Red ink takes green and blue off white, blue ink red and green.
+    red_only = (rgb[:, :, 2] < 255).any(1) & ~(rgb[:, :, 0] < 255).any(1)
+    assert red_only.any()
+    for row in np.flatnonzero(red_only):
+        assert np.all(rgb[row, :, 1] == rgb[row, :, 2])
+    # Every column reaches the extremes of the loud channel, within a pixel.
+    y = waveform.columns(0, 300)
+    top = (1.0 - y[0::2]) * 32
+    bottom = (1.0 - y[1::2]) * 32
+    for col in range(300):
+        inked = np.flatnonzero(rgb[:, col, 1] < 255)
+        assert inked[0] <= top[col] + 1 and inked[-1] >= bottom[col] - 1
@@ -0,0 +1,82 @@
+import copy
+
+import numpy as np
+import pytest
+
+from masvisgtk.analysis import analyze
+from masvisgtk.artifact import compact
+from masvisgtk.stream import analyze_stream
+
+from conftest import make_track
+
+
+def streamed(track, block_size=65536, samples=None, reach=None):
+    '''
+    The track as input.stream_file returns it, probed as samples long
+
+    The window decodes at most reach samples, like a seek near the end.
+    '''
+    result = {k: v for k, v in track.items() if k != 'data'}
+    raw, data = track['data']['fixed'], track['data']['float']
+    ns = data.shape[1]
+    result['stream'] = ((raw[:, i : i + block_size], data[:, i : i + block_size]) for i in range(0, ns, block_size))
+    result['window'] = lambda start, stop: data[:, start : min(stop, start + (reach or ns))]
+    result['samples'] = samples
+    result['duration'] = (samples or 0) / track['samplerate']
+    return result
+
+
+def assert_same(expected, actual):
+    assert expected.keys() == actual.keys()
+    for key, value in expected.items():
+        if key == 'skipped':
+            assert sorted(value) == sorted(actual[key])
+        elif value is None or isinstance(value, (str, tuple)):
+            assert value == actual[key], key
+        else:
+            np.testing.assert_allclose(np.asarray(actual[key], float), np.asarray(value, float), 1e-6, 1e-6, err_msg=key)
+
+
+def assert_same_waveform(expected, actual):
+    assert expected.blocks == actual.blocks
+    assert expected.samples == actual.samples
+    for a, b in zip(expected.maxs + expected.mins, actual.maxs + actual.mins):
+        np.testing.assert_array_equal(a, b)
+
+
+@pytest.mark.parametrize(
+    'seconds, fs, nc, bits, samples',
+    [
+        (20, 44100, 2, 16, None),
+        (7.0001, 48000, 1, 24, 2**17), # probed far too short
+        (3.5, 8000, 2, 16, 10**8), # probed far too long
+    ],
+)
+def test_analyze_stream_matches_analyze(seconds, fs, nc, bits, samples):
+    track = make_track(seconds, fs, nc, bits)
+    expected = analyze(copy.deepcopy(track))
+    compacted = compact(track, expected)
+    stream = streamed(track, samples=samples)
+    actual = analyze_stream(stream, workers=2)
+    assert_same(expected, actual)
+    assert stream.keys() == compacted.keys()
+    assert stream['samples'] == track['samples']
+    assert_same_waveform(compacted['waveform'], stream['waveform'])
+    np.testing.assert_array_equal(compacted['loudest'], stream['loudest'])
+
+
+def test_analyze_stream_metrics(track):
+    expected = analyze(copy.deepcopy(track), metrics=['dr', 'plr'])
+    stream = streamed(track, block_size=10000)
+    actual = analyze_stream(stream, metrics=['dr', 'plr'])
+    assert_same(expected, actual)
+    assert stream['loudest'] is None
+
+
+def test_analyze_stream_short_window(track):
+    analysis = analyze(copy.deepcopy(track))
+    stream = streamed(track, reach=100)
+    analyze_stream(stream)
+    start, stop = analysis['w_max']
+    assert stream['loudest'].shape == (stop - start,)
+    np.testing.assert_array_equal(stream['loudest'][:100], track['data']['float'][analysis['c_max'], start : start + 100])